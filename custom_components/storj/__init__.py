@@ -3,20 +3,73 @@
 from __future__ import annotations
 
 from collections.abc import Callable
+from datetime import datetime, time, timedelta
+import logging
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.helpers import instance_id
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
 from homeassistant.util.hass_dict import HassKey
 
 from .api import StorjClient
-from .const import DOMAIN, CONF_BUCKET_NAME
+from .breaker import CircuitBreaker, CircuitBreakerTransport
+from .cache import BackupMetadataCache
+from .checkpoint import UploadCheckpoints
+from .deadline import DeadlineTransport
+from .dedup import ChunkIndex
+from .libuplink import LibUplinkTransport
+from .s3 import S3Transport
+from .scheduler import ScheduledTransport, UplinkScheduler
+from .throttle import BandwidthSchedule, BandwidthThrottle
+from .tracing import TraceBuffer, TracingTransport
+from .transport import StorjTransport, UplinkCliTransport, UplinkError
+from .const import (
+    DOMAIN,
+    CONF_ACCESS_GRANT,
+    CONF_BUCKET_INDEX,
+    CONF_COMPRESSION,
+    CONF_COMPRESSION_LEVEL,
+    CONF_DEDUPLICATION,
+    CONF_DOWNLOAD_LIMIT,
+    CONF_HEDGED_READS,
+    CONF_LIMIT_END,
+    CONF_LIMIT_START,
+    CONF_BUCKET_NAME,
+    CONF_MAX_CONCURRENT_PIECES,
+    CONF_METADATA_CONCURRENCY,
+    CONF_RESUMABLE_UPLOADS,
+    CONF_S3_ACCESS_KEY_ID,
+    CONF_S3_ENDPOINT,
+    CONF_S3_SECRET_ACCESS_KEY,
+    CONF_STALE_UPLOAD_HOURS,
+    CONF_TIMING_SPANS,
+    CONF_TRANSPORT,
+    CONF_UPLOAD_LIMIT,
+    CONF_UPLOAD_PARALLELISM,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_METADATA_CONCURRENCY,
+    DEFAULT_S3_ENDPOINT,
+    DEFAULT_STALE_UPLOAD_HOURS,
+    METADATA_MIGRATION_DELAY,
+    TRANSPORT_LIBUPLINK,
+    TRANSPORT_S3,
+)
+
+_LOGGER = logging.getLogger(__name__)
 
 type StorjConfigEntry = ConfigEntry[StorjClient]
 
+PLATFORMS: list[Platform] = [Platform.SENSOR]
+
 DATA_BACKUP_AGENT_LISTENERS: HassKey[list[Callable[[], None]]] = HassKey(
     f"{DOMAIN}.backup_agent_listeners"
 )
+DATA_SCHEDULER: HassKey[UplinkScheduler] = HassKey(f"{DOMAIN}.scheduler")
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: StorjConfigEntry) -> bool:
@@ -26,19 +79,154 @@ async def async_setup_entry(hass: HomeAssistant, entry: StorjConfigEntry) -> boo
     # TODO 2. Validate the API connection (and authentication)
     # TODO 3. Store an API object for your platforms to access
 
+    cache = BackupMetadataCache(hass, entry.entry_id)
+    await cache.async_load()
+    checkpoints = UploadCheckpoints(hass, entry.entry_id)
+    await checkpoints.async_load()
+    chunk_index = ChunkIndex(hass, entry.entry_id)
+    await chunk_index.async_load()
+
+    transport: StorjTransport
+    if entry.options.get(CONF_TRANSPORT) == TRANSPORT_S3:
+        transport = S3Transport(
+            async_get_clientsession(hass),
+            entry.options.get(CONF_S3_ENDPOINT, DEFAULT_S3_ENDPOINT),
+            entry.options[CONF_S3_ACCESS_KEY_ID],
+            entry.options[CONF_S3_SECRET_ACCESS_KEY],
+            entry.data[CONF_BUCKET_NAME],
+        )
+    elif entry.options.get(CONF_TRANSPORT) == TRANSPORT_LIBUPLINK:
+        transport = LibUplinkTransport(
+            hass, entry.data[CONF_ACCESS_GRANT], entry.data[CONF_BUCKET_NAME]
+        )
+        try:
+            await transport.async_connect()
+        except UplinkError as err:
+            raise ConfigEntryNotReady(str(err)) from err
+    else:
+        transport = UplinkCliTransport(entry.data[CONF_BUCKET_NAME])
+    # A libuplink call can't be cancelled, so the loser of a hedge would keep
+    # an executor thread busy until it returned.
+    hedge = entry.options.get(CONF_HEDGED_READS, False) and not isinstance(
+        transport, LibUplinkTransport
+    )
+    # One scheduler bounds the operations of every entry together.
+    if DATA_SCHEDULER not in hass.data:
+        hass.data[DATA_SCHEDULER] = UplinkScheduler()
+    scheduler = hass.data[DATA_SCHEDULER]
+    # Traces time the operations themselves, not their wait for the scheduler.
+    traces = TraceBuffer()
+    transport = TracingTransport(transport, traces)
+    # Deadlines, like traces, leave out the wait for the scheduler.
+    deadlines = DeadlineTransport(transport, hedge=hedge, scheduler=scheduler)
+    transport = deadlines
+    transport = ScheduledTransport(transport, scheduler)
+    # While Storj is unreachable, operations fail before they queue.
+    breaker = CircuitBreaker()
+    transport = CircuitBreakerTransport(transport, breaker)
+
+    throttle: BandwidthThrottle | None = None
+    if entry.options.get(CONF_UPLOAD_LIMIT) or entry.options.get(CONF_DOWNLOAD_LIMIT):
+        throttle = BandwidthThrottle(
+            BandwidthSchedule(
+                upload=_bytes_per_second(entry.options.get(CONF_UPLOAD_LIMIT)),
+                download=_bytes_per_second(entry.options.get(CONF_DOWNLOAD_LIMIT)),
+                start=_time(entry.options.get(CONF_LIMIT_START)),
+                end=_time(entry.options.get(CONF_LIMIT_END)),
+            )
+        )
+
     entry.runtime_data = StorjClient(
-        await instance_id.async_get(hass), entry.data[CONF_BUCKET_NAME]
+        await instance_id.async_get(hass),
+        entry.data[CONF_BUCKET_NAME],
+        metadata_concurrency=entry.options.get(
+            CONF_METADATA_CONCURRENCY, DEFAULT_METADATA_CONCURRENCY
+        ),
+        cache=cache,
+        use_index=entry.options.get(CONF_BUCKET_INDEX, False),
+        upload_parallelism=entry.options.get(CONF_UPLOAD_PARALLELISM, 0),
+        max_concurrent_pieces=entry.options.get(CONF_MAX_CONCURRENT_PIECES, 0),
+        checkpoints=checkpoints,
+        resumable_uploads=entry.options.get(CONF_RESUMABLE_UPLOADS, False),
+        stale_upload_age=timedelta(
+            hours=entry.options.get(CONF_STALE_UPLOAD_HOURS, DEFAULT_STALE_UPLOAD_HOURS)
+        ),
+        transport=transport,
+        compression_level=(
+            entry.options.get(CONF_COMPRESSION_LEVEL, DEFAULT_COMPRESSION_LEVEL)
+            if entry.options.get(CONF_COMPRESSION, False)
+            else 0
+        ),
+        chunk_index=chunk_index,
+        deduplicate=entry.options.get(CONF_DEDUPLICATION, False),
+        throttle=throttle,
+        traces=traces,
+        deadlines=deadlines,
+        breaker=breaker,
+        timing_spans=entry.options.get(CONF_TIMING_SPANS, False),
     )
 
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+    entry.async_create_background_task(
+        hass,
+        entry.runtime_data.async_abort_stale_uploads(),
+        "storj_abort_stale_uploads",
+    )
+
+    @callback
+    def _async_migrate_metadata(_: datetime) -> None:
+        entry.async_create_background_task(
+            hass,
+            entry.runtime_data.async_migrate_metadata(),
+            "storj_migrate_metadata",
+        )
+
+    if transport.replaces_metadata_in_place:
+        # Left until after startup, so it doesn't hold up the first listings.
+        entry.async_on_unload(
+            async_call_later(hass, METADATA_MIGRATION_DELAY, _async_migrate_metadata)
+        )
+    else:
+        _LOGGER.debug(
+            "Backup metadata in '%s' stays in the old format, as this transport"
+            " can't replace metadata in place",
+            entry.data[CONF_BUCKET_NAME],
+        )
+
     return True
 
 
+async def _async_update_listener(hass: HomeAssistant, entry: StorjConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: StorjConfigEntry) -> bool:
     """Unload a config entry."""
+    if not await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        return False
+    await entry.runtime_data.async_close()
     hass.loop.call_soon(_notify_backup_listeners, hass)
     return True
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: StorjConfigEntry) -> None:
+    """Remove the cached data of a config entry."""
+    await BackupMetadataCache(hass, entry.entry_id).async_remove_store()
+    await UploadCheckpoints(hass, entry.entry_id).async_remove_store()
+    await ChunkIndex(hass, entry.entry_id).async_remove_store()
+
+
+def _bytes_per_second(mbit: float | None) -> int:
+    """Convert a limit in Mbit/s from the options to bytes per second."""
+    return int((mbit or 0) * 125_000)
+
+
+def _time(value: str | None) -> time | None:
+    return dt_util.parse_time(value) if value else None
+
+
 def _notify_backup_listeners(hass: HomeAssistant) -> None:
     for listener in hass.data.get(DATA_BACKUP_AGENT_LISTENERS, []):
         listener()
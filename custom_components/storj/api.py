@@ -3,46 +3,208 @@
 from __future__ import annotations
 
 import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Coroutine
+import contextlib
+from datetime import timedelta
+import hashlib
 import logging
 import json
+import time
+from typing import Any
 
-from homeassistant.components.backup import AgentBackup, suggested_filename
+from homeassistant.components.backup import (
+    AgentBackup,
+    BackupNotFound,
+    suggested_filename,
+)
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
 
-from json_flatten import flatten, unflatten
+from .breaker import CircuitBreaker
+from .cache import BackupMetadataCache
+from .checkpoint import UploadCheckpoints
+from .compression import (
+    async_compress,
+    async_compress_chunk,
+    async_decompress,
+    async_decompress_chunk,
+)
+from .const import (
+    BACKUP_HEADER_SIZE,
+    CHUNKS_DIRECTORY,
+    CHUNKS_MANIFEST_VERSION,
+    CHUNKS_SUFFIX,
+    CODEC_ZSTD,
+    DEDUP_CHUNK_SIZE,
+    DEDUP_UPLOAD_CONCURRENCY,
+    DEFAULT_METADATA_CONCURRENCY,
+    DEFAULT_STALE_UPLOAD_HOURS,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_RETRY_DELAY,
+    INDEX_FILENAME,
+    INDEX_VERSION,
+    LARGE_BACKUP_MAX_CONCURRENT_PIECES,
+    LARGE_BACKUP_PARALLELISM,
+    LARGE_BACKUP_SIZE,
+    MEDIUM_BACKUP_PARALLELISM,
+    METADATA_CHECKSUM,
+    METADATA_CODEC,
+    PARTS_DIRECTORY,
+    PARTS_MANIFEST_VERSION,
+    PARTS_SUFFIX,
+    PRUNE_CONCURRENCY,
+    RESUMABLE_PART_SIZE,
+    SMALL_BACKUP_SIZE,
+)
+from .deadline import DeadlineTransport
+from .dedup import COMPRESSED_SUFFIX, ChunkIndex, async_chunks, chunk_name
+from .integrity import async_checksum, async_verify
+from .metadata import decode_backup, encode_backup, is_flattened, reencode
+from .retention import PruneReport, RetentionPolicy, select_backups_to_prune
+from .stats import DELETE, LIST, ClientStats
+from .throttle import DOWNLOAD, UPLOAD, BandwidthThrottle
+from .tracing import TraceBuffer
+from .transport import (
+    ChunkReader,
+    CorruptMetadataError,
+    StorjObject,
+    StorjTransport,
+    UplinkCliTransport,
+    UplinkError,
+    UploadTuning,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class StorjClient:
-    """Client for Storj uplink CLI tool."""
+    """Client for the Home Assistant backups in a Storj bucket."""
 
     def __init__(
         self,
         ha_instance_id: str,
         bucket_name: str,
+        metadata_concurrency: int = DEFAULT_METADATA_CONCURRENCY,
+        cache: BackupMetadataCache | None = None,
+        use_index: bool = False,
+        upload_parallelism: int = 0,
+        max_concurrent_pieces: int = 0,
+        checkpoints: UploadCheckpoints | None = None,
+        resumable_uploads: bool = False,
+        part_size: int = RESUMABLE_PART_SIZE,
+        stale_upload_age: timedelta = timedelta(hours=DEFAULT_STALE_UPLOAD_HOURS),
+        transport: StorjTransport | None = None,
+        compression_level: int = 0,
+        chunk_index: ChunkIndex | None = None,
+        deduplicate: bool = False,
+        chunk_size: int = DEDUP_CHUNK_SIZE,
+        throttle: BandwidthThrottle | None = None,
+        traces: TraceBuffer | None = None,
+        deadlines: DeadlineTransport | None = None,
+        breaker: CircuitBreaker | None = None,
+        timing_spans: bool = False,
     ) -> None:
         """Initialize."""
         self._ha_instance_id = ha_instance_id
         self.bucket_name = bucket_name
+        self._transport = transport or UplinkCliTransport(bucket_name)
+        # zstd level for new uploads; 0 uploads backups uncompressed.
+        self._compression_level = compression_level
+        self._metadata_concurrency = metadata_concurrency
+        self._cache = cache
+        self._use_index = use_index
+        self._upload_parallelism = upload_parallelism
+        self._max_concurrent_pieces = max_concurrent_pieces
+        self._checkpoints = checkpoints
+        self._resumable_uploads = resumable_uploads
+        self._part_size = part_size
+        self._stale_upload_age = stale_upload_age
+        self._chunk_index = chunk_index
+        self._deduplicate = deduplicate
+        self._chunk_size = chunk_size
+        # Held while deduplicated chunks are uploaded or collected, so a chunk
+        # an upload relies on can't be collected under it.
+        self._chunk_lock = asyncio.Lock()
+        self.throttle = throttle
+        self.stats = ClientStats()
+        self.traces = traces
+        # The deadline wrapper of the transport, for the diagnostics.
+        self.deadlines = deadlines
+        self.breaker = breaker
+        self._timing_spans = timing_spans
+        self._backup_keys: dict[str, str] = {}
+        # Metadata of the objects seen so far, for their codec and checksum.
+        self._object_metadata: dict[str, dict[str, str]] = {}
+        # Objects whose metadata couldn't be read, warned about once.
+        self._unreadable_keys: set[str] = set()
         # self.satellite = satellite
 
     async def authenticate(self, access_grant: str) -> bool:
         """Test if we can authenticate with the host."""
-        result = await asyncio.create_subprocess_exec(
-            "uplink", "access", "import", "ha2", access_grant
-        )
-        await result.communicate()
-        return result.returncode == 0
+        return await self._transport.async_authenticate(access_grant)
+
+    async def async_close(self) -> None:
+        """Release the connections held by the transport."""
+        await self._transport.async_close()
+
+    def _span(self, name: str) -> contextlib.AbstractContextManager[None]:
+        """Time a phase of a call, if timing spans are enabled."""
+        if self._timing_spans and self.traces:
+            return self.traces.span(name)
+        return contextlib.nullcontext()
 
     async def async_upload_backup(
         self,
-        backup_dir: str,
+        open_stream: Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]],
         backup: AgentBackup,
     ) -> None:
-        """Upload a backup."""
+        """Upload a backup.
+
+        The stream is handed to the transport chunk by chunk, so memory use
+        stays flat regardless of backup size.
+        """
 
-        backup_metadata = flatten(backup.as_dict())
+        start = time.monotonic()
+        try:
+            filename = await self._upload_backup(open_stream, backup)
+        except UplinkError:
+            self.stats.async_record_error(UPLOAD)
+            raise
+        self.stats.async_record_upload(filename, backup.size, time.monotonic() - start)
+
+    async def _upload_backup(
+        self,
+        open_stream: Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]],
+        backup: AgentBackup,
+    ) -> str:
+        """Upload a backup and return its object key."""
+        with self._span("upload_backup.encode"):
+            backup_metadata = encode_backup(backup)
+        deduplicate = self._deduplicate and self._chunk_index is not None
+        resumable = self._resumable_uploads and self._checkpoints is not None
+        # The checksum is added to the metadata once the stream is exhausted.
+        # Manifests are written after the data they describe; a plain object
+        # only gets it if the transport writes metadata last or can replace
+        # it afterwards, and otherwise isn't hashed for nothing.
+        checksummed = (
+            deduplicate
+            or resumable
+            or self._transport.writes_metadata_last
+            or self._transport.replaces_metadata_in_place
+        )
+        if checksummed:
+            open_stream = _checksumming(open_stream, backup_metadata)
+        else:
+            _LOGGER.debug(
+                "Not checksumming backup: %s, the transport stores its metadata"
+                " before its data",
+                backup.backup_id,
+            )
+        # Deduplicated backups compress each chunk on its own instead.
+        if self._compression_level and not deduplicate:
+            backup_metadata[METADATA_CODEC] = CODEC_ZSTD
+            open_stream = self._compressing(open_stream)
         _LOGGER.debug(
             "Uploading backup: %s as %s with metadata: %s",
             backup.backup_id,
@@ -50,76 +212,909 @@ class StorjClient:
             backup_metadata,
         )
 
-        backup_location = f"{backup_dir}/{suggested_filename(backup)}"
-        result = await asyncio.create_subprocess_exec(
-            "uplink",
-            "cp",
-            backup_location,
-            f"sj://{self.bucket_name}/backups/",
-            "--metadata",
-            json.dumps(backup_metadata),
-        )
-        await result.communicate()
-        if result.returncode != 0:
-            raise UplinkError("Unable to complete upload")
+        with self._span("upload_backup.transfer"):
+            if deduplicate:
+                filename, stored_size = await self._upload_deduplicated(
+                    open_stream, backup, backup_metadata
+                )
+            elif resumable:
+                filename, stored_size = await self._upload_resumable(
+                    open_stream, backup, backup_metadata
+                )
+            else:
+                tuning = upload_tuning(
+                    backup.size, self._upload_parallelism, self._max_concurrent_pieces
+                )
+                _LOGGER.debug(
+                    "Uploading backup: %s (%s bytes) with parallelism %s and maximum concurrent pieces %s",
+                    backup.backup_id,
+                    backup.size,
+                    tuning.parallelism,
+                    tuning.maximum_concurrent_pieces or "default",
+                )
+                filename = suggested_filename(backup)
+                stored_size = await self._upload_object(
+                    filename, await open_stream(), backup_metadata, tuning
+                )
+                if checksummed and not self._transport.wrote_metadata_last(stored_size):
+                    await self._store_checksum(filename, backup_metadata)
 
         _LOGGER.debug("Uploaded backup: %s to '%s'", backup.backup_id, self.bucket_name)
+        self._backup_keys[backup.backup_id] = filename
+        self._object_metadata[filename] = backup_metadata
+        if self._cache:
+            self._cache.async_set(filename, backup, stored_size)
+        if self._use_index:
+            with self._span("upload_backup.index"):
+                await self._update_index({filename: _index_entry(stored_size, backup)})
+        return filename
 
-    async def _get_metadata(self, filename: str) -> dict[str, str]:
-        result = await asyncio.create_subprocess_exec(
-            "uplink",
-            "meta",
-            "get",
-            f"sj://{self.bucket_name}/backups/{filename}",
-            stdout=asyncio.subprocess.PIPE,
+    async def _store_checksum(self, filename: str, metadata: dict[str, str]) -> None:
+        """Replace an uploaded backup's metadata with the one holding its checksum.
+
+        The backup is complete without it, so a failure only costs the check
+        on download.
+        """
+        try:
+            await self._transport.async_replace_metadata(
+                f"backups/{filename}", metadata
+            )
+        except UplinkError as err:
+            _LOGGER.warning("Unable to store the checksum of %s: %s", filename, err)
+            del metadata[METADATA_CHECKSUM]
+
+    def _compressing(
+        self, open_stream: Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]]
+    ) -> Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]]:
+        """Wrap open_stream so every stream it opens is compressed."""
+
+        async def _open_stream() -> AsyncIterator[bytes]:
+            return async_compress(await open_stream(), self._compression_level)
+
+        return _open_stream
+
+    async def _upload_object(
+        self,
+        filename: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream to backups/ and return the number of bytes written."""
+        if self.throttle:
+            stream = self.throttle.async_throttle(stream, UPLOAD)
+        return await self._transport.async_write(
+            f"backups/{filename}", stream, metadata, tuning
+        )
+
+    async def _upload_resumable(
+        self,
+        open_stream: Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]],
+        backup: AgentBackup,
+        backup_metadata: dict[str, str],
+    ) -> tuple[str, int]:
+        """Upload a backup as part objects tied together by a manifest.
+
+        The uplink CLI can't upload the parts of a multipart upload one at a
+        time, so each part is its own object under backups/.parts/. Completed
+        parts are checkpointed, and a retry of the same backup_id only uploads
+        the parts that are missing. The manifest carries the backup metadata
+        and is written last, so an unfinished upload is never listed.
+        """
+        assert self._checkpoints
+        await self.async_abort_stale_uploads()
+
+        filename = f"{suggested_filename(backup)}{PARTS_SUFFIX}"
+        prefix = _parts_prefix(backup.backup_id)
+        checkpoint = self._checkpoints.get(backup.backup_id)
+        if (
+            checkpoint is None
+            or checkpoint["filename"] != filename
+            or checkpoint["part_size"] != self._part_size
+        ):
+            checkpoint = await self._checkpoints.async_start(
+                backup.backup_id, filename, self._part_size
+            )
+
+        reader = ChunkReader(await open_stream())
+        part = checkpoint["parts"]
+        if part:
+            _LOGGER.debug(
+                "Resuming upload of backup: %s after %s parts", backup.backup_id, part
+            )
+            # Only the local stream is re-read; the skipped parts aren't sent.
+            if await reader.skip(part * self._part_size) != part * self._part_size:
+                await self._checkpoints.async_remove(backup.backup_id)
+                raise UplinkError("Backup is shorter than the uploaded parts")
+
+        size = part * self._part_size
+        while not await reader.at_eof():
+            size += await self._upload_object(
+                f"{prefix}{part:05d}",
+                reader.iter_part(self._part_size),
+                None,
+                UploadTuning(parallelism=1),
+            )
+            part += 1
+            await self._checkpoints.async_set_parts(backup.backup_id, part)
+
+        manifest = json.dumps(
+            {
+                "version": PARTS_MANIFEST_VERSION,
+                "prefix": prefix,
+                "part_size": self._part_size,
+                "parts": part,
+                "size": size,
+            }
+        ).encode()
+        stored_size = await self._upload_object(
+            filename,
+            _iter_bytes(manifest),
+            backup_metadata,
+            UploadTuning(parallelism=1),
         )
-        stdout, stderr = await result.communicate()
+        await self._checkpoints.async_remove(backup.backup_id)
+        return filename, stored_size
+
+    async def _upload_deduplicated(
+        self,
+        open_stream: Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]],
+        backup: AgentBackup,
+        backup_metadata: dict[str, str],
+    ) -> tuple[str, int]:
+        """Upload a backup as content-defined chunks tied together by a manifest.
 
-        return json.loads(stdout.decode())
+        Only chunks the chunk index doesn't know are uploaded, a bounded
+        number at a time. The manifest lists the chunks in order, carries the
+        backup metadata and is written last, so an unfinished upload is never
+        listed; its chunks are collected with the next deleted backup.
+        """
+        assert self._chunk_index
+        filename = f"{suggested_filename(backup)}{CHUNKS_SUFFIX}"
+        compressed = bool(self._compression_level)
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(DEDUP_UPLOAD_CONCURRENCY)
+        uploads: set[asyncio.Task[None]] = set()
+        chunks: list[tuple[str, int]] = []
+        pending: set[str] = set()
+        size = 0
+
+        async with self._chunk_lock:
+            if not self._chunk_index.synced:
+                await self._sync_chunk_index()
+            try:
+                async for chunk in async_chunks(await open_stream(), self._chunk_size):
+                    name = await loop.run_in_executor(
+                        None, chunk_name, chunk, compressed
+                    )
+                    chunks.append((name, len(chunk)))
+                    size += len(chunk)
+                    if self._chunk_index.has(name) or name in pending:
+                        continue
+                    pending.add(name)
+                    # Waiting for a slot bounds the chunks held in memory.
+                    await semaphore.acquire()
+                    for task in [task for task in uploads if task.done()]:
+                        uploads.discard(task)
+                        task.result()
+                    uploads.add(
+                        asyncio.create_task(self._upload_chunk(name, chunk, semaphore))
+                    )
+                await asyncio.gather(*uploads)
+            finally:
+                for task in uploads:
+                    task.cancel()
+                await asyncio.gather(*uploads, return_exceptions=True)
+
+            _LOGGER.debug(
+                "Uploaded %s of %s chunks of backup: %s",
+                len(pending),
+                len(chunks),
+                backup.backup_id,
+            )
+            manifest = json.dumps(
+                {
+                    "version": CHUNKS_MANIFEST_VERSION,
+                    "size": size,
+                    "chunks": chunks,
+                }
+            ).encode()
+            stored_size = await self._upload_object(
+                filename,
+                _iter_bytes(manifest),
+                backup_metadata,
+                UploadTuning(parallelism=1),
+            )
+            self._chunk_index.async_set_manifest(filename, [name for name, _ in chunks])
+        return filename, stored_size
+
+    async def _upload_chunk(
+        self, name: str, chunk: bytes, semaphore: asyncio.Semaphore
+    ) -> None:
+        """Upload one chunk, then release its slot."""
+        assert self._chunk_index
+        try:
+            if name.endswith(COMPRESSED_SUFFIX):
+                chunk = await async_compress_chunk(chunk, self._compression_level)
+            if self.throttle:
+                await self.throttle.async_consume(UPLOAD, len(chunk))
+            await self._transport.async_put(f"{CHUNKS_DIRECTORY}/{name}", chunk)
+            self._chunk_index.async_add_chunk(name, len(chunk))
+        finally:
+            semaphore.release()
+
+    async def _sync_chunk_index(self) -> None:
+        """Rebuild the chunk index from a listing of the bucket."""
+        assert self._chunk_index
+        try:
+            stored = await self._transport.async_list(f"{CHUNKS_DIRECTORY}/")
+        except UplinkError as err:
+            raise UplinkError("Unable to list the stored chunks") from err
+        self._chunk_index.async_set_chunks({ob.key: ob.size for ob in stored})
+
+    async def _collect_chunks(self) -> None:
+        """Delete the chunks that no manifest in the bucket refers to.
+
+        Collection is best effort: if any manifest can't be read, nothing is
+        deleted, and a chunk that fails to delete is left for the next run.
+        """
+        assert self._chunk_index
+        async with self._chunk_lock:
+            try:
+                filenames = [
+                    ob.key
+                    for ob in await self._list_objects()
+                    if ob.key.endswith(CHUNKS_SUFFIX)
+                ]
+                referenced: set[str] = set()
+                for names in await asyncio.gather(
+                    *(self._manifest_chunks(filename) for filename in filenames)
+                ):
+                    referenced.update(names)
+                stored = await self._transport.async_list(f"{CHUNKS_DIRECTORY}/")
+            except UplinkError:
+                _LOGGER.warning(
+                    "Unable to collect unused chunks in '%s'", self.bucket_name
+                )
+                return
+            self._chunk_index.async_retain_manifests(set(filenames))
+
+            semaphore = asyncio.Semaphore(DEDUP_UPLOAD_CONCURRENCY)
+
+            async def _delete(name: str) -> bool:
+                async with semaphore:
+                    try:
+                        await self._transport.async_delete(f"{CHUNKS_DIRECTORY}/{name}")
+                    except UplinkError:
+                        return False
+                    return True
+
+            unreferenced = [ob for ob in stored if ob.key not in referenced]
+            deleted = await asyncio.gather(*(_delete(ob.key) for ob in unreferenced))
+            _LOGGER.debug(
+                "Collected %s of %s unused chunks in '%s'",
+                sum(deleted),
+                len(unreferenced),
+                self.bucket_name,
+            )
+            removed = {ob.key for ob, ok in zip(unreferenced, deleted) if ok}
+            self._chunk_index.async_set_chunks(
+                {ob.key: ob.size for ob in stored if ob.key not in removed}
+            )
+
+    async def _manifest_chunks(self, filename: str) -> list[str]:
+        """Return the chunks a manifest refers to, reading it if it isn't indexed."""
+        assert self._chunk_index
+        if (names := self._chunk_index.manifest(filename)) is None:
+            names = [
+                name for name, _ in (await self._read_manifest(filename))["chunks"]
+            ]
+            self._chunk_index.async_set_manifest(filename, names)
+        return names
+
+    async def _read_manifest(self, filename: str) -> dict[str, Any]:
+        """Download and parse a resumable or deduplicated upload's manifest."""
+        try:
+            return json.loads(await self._read_object(filename))
+        except ValueError as err:
+            raise UplinkError(f"Unable to read manifest {filename}") from err
+
+    async def async_abort_stale_uploads(self) -> None:
+        """Remove the parts of resumable uploads that stopped making progress."""
+        if not self._checkpoints:
+            return
+        cutoff = dt_util.utcnow() - self._stale_upload_age
+        for backup_id in self._checkpoints.stale(cutoff):
+            _LOGGER.debug("Aborting stale upload of backup: %s", backup_id)
+            if await self._remove_prefix(_parts_prefix(backup_id)):
+                await self._checkpoints.async_remove(backup_id)
+
+    async def async_migrate_metadata(self) -> None:
+        """Rewrite the metadata of backups stored in the flattened format.
+
+        Only transports that replace metadata in place can migrate it, as
+        rewriting a backup by uploading it again isn't worth it; on the others
+        this does nothing and the old format is still read. Once every backup
+        is rewritten, later runs return straight away.
+        """
+        if not self._transport.replaces_metadata_in_place:
+            return
+        if self._cache and self._cache.metadata_migrated:
+            return
+        rewritten = 0
+        try:
+            for ob in await self._list_objects():
+                metadata = ob.metadata
+                if metadata is None:
+                    metadata = await self._get_metadata(ob.key)
+                if not is_flattened(metadata):
+                    continue
+                metadata = reencode(metadata)
+                await self._transport.async_replace_metadata(
+                    f"backups/{ob.key}", metadata
+                )
+                self._object_metadata[ob.key] = metadata
+                rewritten += 1
+        except UplinkError as err:
+            _LOGGER.warning(
+                "Unable to migrate the backup metadata in '%s': %s",
+                self.bucket_name,
+                err,
+            )
+            return
+        if rewritten:
+            _LOGGER.info(
+                "Rewrote the metadata of %s backups in '%s'",
+                rewritten,
+                self.bucket_name,
+            )
+        if self._cache:
+            self._cache.async_set_metadata_migrated()
+
+    async def _remove_prefix(self, prefix: str) -> bool:
+        """Remove every object under a prefix of backups/."""
+        try:
+            await self._transport.async_delete_prefix(f"backups/{prefix}")
+        except UplinkError:
+            _LOGGER.warning("Unable to remove '%s' from '%s'", prefix, self.bucket_name)
+            return False
+        return True
+
+    async def _get_metadata(self, filename: str) -> dict[str, str]:
+        return await self._transport.async_get_metadata(f"backups/{filename}")
+
+    async def _list_objects(self) -> list[StorjObject]:
+        """Return the objects under backups/."""
+        try:
+            storj_objs = await self._transport.async_list(
+                "backups/", include_metadata=True
+            )
+        except UplinkError as err:
+            raise UplinkError("Unable to fetch backup data") from err
+        return [ob for ob in storj_objs if ob.key != INDEX_FILENAME]
 
     async def async_list_backups(self) -> list[AgentBackup]:
         """List the backups currently in the bucket."""
 
-        result = await asyncio.create_subprocess_exec(
-            "uplink",
-            "ls",
-            f"sj://{self.bucket_name}/backups/",
-            "--o",
-            "json",
-            stdout=asyncio.subprocess.PIPE,
+        return [backup for _, backup in await self._list_backup_objects_by_id()]
+
+    async def _list_backup_objects(self) -> list[tuple[str, AgentBackup]]:
+        """Return the object key and backup of every backup in the bucket."""
+
+        start = time.monotonic()
+        try:
+            listed = await self._scan_bucket()
+        except UplinkError:
+            self.stats.async_record_error(LIST)
+            raise
+        self.stats.async_record_listing(
+            {key: backup.size for key, backup in listed}, time.monotonic() - start
+        )
+        return listed
+
+    async def _scan_bucket(self) -> list[tuple[str, AgentBackup]]:
+        """List the bucket and read the backup stored in each object."""
+
+        with self._span("list_backups.list"):
+            storj_objs = await self._list_objects()
+
+        if self._use_index:
+            with self._span("list_backups.read_index"):
+                index = await self._read_index()
+            if index is not None and _index_matches(index, storj_objs):
+                entries = index["backups"]
+                return [
+                    (ob.key, AgentBackup.from_dict(entries[ob.key]["backup"]))
+                    for ob in storj_objs
+                    if entries[ob.key]["backup"] is not None
+                ]
+            _LOGGER.debug("Rebuilding the backup index for '%s'", self.bucket_name)
+
+        results = await self._scan_objects(storj_objs)
+
+        if self._use_index:
+            with self._span("list_backups.write_index"):
+                await self._write_index(
+                    {
+                        ob.key: _index_entry(ob.size, backup)
+                        for ob, backup in zip(storj_objs, results)
+                    }
+                )
+
+        return [
+            (ob.key, backup)
+            for ob, backup in zip(storj_objs, results)
+            if backup is not None
+        ]
+
+    async def _scan_objects(
+        self, storj_objs: list[StorjObject]
+    ) -> list[AgentBackup | None]:
+        """Return the backup stored in each object, or None for other objects."""
+
+        # A backup's metadata never changes after upload, so only objects the
+        # cache hasn't seen at this size and creation time need parsing.
+        results: list[AgentBackup | None] = [None] * len(storj_objs)
+        to_fetch: list[tuple[int, StorjObject]] = []
+        if self._cache:
+            # First, so the cap allows for every object about to be cached.
+            self._cache.async_evict({ob.key for ob in storj_objs})
+        for index, ob in enumerate(storj_objs):
+            entry = (
+                self._cache.lookup(ob.key, ob.size, ob.created) if self._cache else None
+            )
+            if entry is None:
+                to_fetch.append((index, ob))
+            else:
+                results[index] = self._cache.backup_from_entry(entry)
+
+        # The listing normally carries the metadata. Where it doesn't, each
+        # fetch is its own round trip, so run a bounded number of them at once
+        # rather than paying for every one back to back.
+        semaphore = asyncio.Semaphore(self._metadata_concurrency)
+
+        async def _fetch_metadata(ob: StorjObject) -> dict[str, str] | None:
+            if ob.metadata is not None:
+                return ob.metadata
+            async with semaphore:
+                try:
+                    return await self._get_metadata(ob.key)
+                except CorruptMetadataError as err:
+                    self._skip_unreadable(ob.key, err)
+                    return None
+
+        tasks = [asyncio.create_task(_fetch_metadata(ob)) for _, ob in to_fetch]
+        try:
+            with self._span("list_backups.metadata"):
+                all_metadata = await asyncio.gather(*tasks)
+        except UplinkError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        with self._span("list_backups.parse"):
+            for (index, ob), metadata in zip(to_fetch, all_metadata):
+                if metadata is None:
+                    continue
+                self._object_metadata[ob.key] = metadata
+                try:
+                    backup = decode_backup(metadata)
+                except UplinkError as err:
+                    self._skip_unreadable(ob.key, err)
+                    continue
+                results[index] = backup
+                if self._cache:
+                    self._cache.async_set(ob.key, backup, ob.size, ob.created)
+
+        return results
+
+    def _skip_unreadable(self, key: str, err: UplinkError) -> None:
+        """Warn, once per object, that a backup is left out of listings.
+
+        It is also left out of the cache, so a version that can read it will.
+        """
+        if key not in self._unreadable_keys:
+            self._unreadable_keys.add(key)
+            _LOGGER.warning("Skipping %s in '%s': %s", key, self.bucket_name, err)
+
+    async def _read_index(self) -> dict[str, Any] | None:
+        """Download the bucket index, or return None if it is missing or invalid."""
+        try:
+            index = json.loads(await self._read_object(INDEX_FILENAME))
+        except (UplinkError, ValueError):
+            return None
+        if (
+            not isinstance(index, dict)
+            or index.get("version") != INDEX_VERSION
+            or not isinstance(index.get("backups"), dict)
+        ):
+            return None
+        return index
+
+    async def _write_index(self, entries: dict[str, dict[str, Any]]) -> None:
+        """Upload the bucket index.
+
+        A failed write is not fatal: the next listing will find the index out
+        of date and rebuild it.
+        """
+        index = {"version": INDEX_VERSION, "backups": entries}
+        try:
+            await self._transport.async_put(
+                f"backups/{INDEX_FILENAME}", json.dumps(index).encode()
+            )
+        except UplinkError:
+            _LOGGER.warning(
+                "Unable to update the backup index for '%s'", self.bucket_name
+            )
+
+    async def _update_index(self, changes: dict[str, dict[str, Any] | None]) -> None:
+        """Add, replace or (with an entry of None) remove index entries."""
+        index = await self._read_index()
+        if index is None:
+            # Leave it to the next listing to rebuild from a full scan.
+            return
+        entries = index["backups"]
+        for filename, entry in changes.items():
+            if entry is None:
+                entries.pop(filename, None)
+            else:
+                entries[filename] = entry
+        await self._write_index(entries)
+
+    async def async_get_backup(self, backup_id: str) -> AgentBackup | None:
+        """Return a backup, or None if it is not in the bucket."""
+
+        if filename := self._find_backup_key(backup_id):
+            # One `meta get` confirms the object is still there.
+            try:
+                metadata = await self._get_metadata(filename)
+            except UplinkError:
+                backup = None
+            else:
+                self._object_metadata[filename] = metadata
+                try:
+                    backup = decode_backup(metadata)
+                except UplinkError:
+                    backup = None
+            if backup is not None and backup.backup_id == backup_id:
+                return backup
+            self._backup_keys.pop(backup_id, None)
+
+        for _, backup in await self._list_backup_objects_by_id():
+            if backup.backup_id == backup_id:
+                return backup
+        return None
+
+    async def async_delete_backup(self, backup_id: str) -> None:
+        """Delete a backup from the bucket, if it exists."""
+
+        filename = await self._async_resolve_key(backup_id)
+        if filename is None:
+            return
+
+        await self._delete_backup_objects(backup_id, filename)
+        if filename.endswith(CHUNKS_SUFFIX) and self._chunk_index:
+            await self._collect_chunks()
+        if self._use_index:
+            await self._update_index({filename: None})
+
+    async def async_prune(self, policy: RetentionPolicy) -> PruneReport:
+        """Delete the backups a retention policy doesn't keep.
+
+        The deletion set comes from a single listing. Backups are deleted a
+        bounded number at a time, and the chunk collection and index update
+        that follow a delete run once for the whole batch. A backup that fails
+        to delete is reported rather than raised.
+        """
+        start = time.monotonic()
+        listed = await self._list_backup_objects_by_id()
+        filenames = {backup.backup_id: key for key, backup in listed}
+        to_delete = select_backups_to_prune([backup for _, backup in listed], policy)
+        semaphore = asyncio.Semaphore(PRUNE_CONCURRENCY)
+
+        async def _delete(backup: AgentBackup) -> bool:
+            async with semaphore:
+                try:
+                    await self._delete_backup_objects(
+                        backup.backup_id, filenames[backup.backup_id]
+                    )
+                except UplinkError:
+                    _LOGGER.warning("Unable to prune backup: %s", backup.backup_id)
+                    return False
+                return True
+
+        results = await asyncio.gather(*(_delete(backup) for backup in to_delete))
+        deleted = [backup for backup, ok in zip(to_delete, results) if ok]
+        removed = [filenames[backup.backup_id] for backup in deleted]
+        if self._chunk_index and any(key.endswith(CHUNKS_SUFFIX) for key in removed):
+            await self._collect_chunks()
+        if self._use_index and removed:
+            await self._update_index(dict.fromkeys(removed))
+
+        report = PruneReport(
+            deleted=deleted,
+            failed=[backup for backup, ok in zip(to_delete, results) if not ok],
+            bytes_reclaimed=sum(backup.size for backup in deleted),
+            duration=time.monotonic() - start,
+        )
+        _LOGGER.debug(
+            "Pruned %s of %s backups from '%s', reclaiming %s bytes in %.1fs",
+            len(report.deleted),
+            len(listed),
+            self.bucket_name,
+            report.bytes_reclaimed,
+            report.duration,
         )
-        stdout, stderr = await result.communicate()
-        if result.returncode != 0:
-            raise UplinkError("Unable to fetch backup data")
+        return report
+
+    async def _delete_backup_objects(self, backup_id: str, filename: str) -> None:
+        """Delete the objects of a backup and forget it locally."""
+        try:
+            await self._transport.async_delete(f"backups/{filename}")
+        except UplinkError as err:
+            self.stats.async_record_error(DELETE)
+            raise UplinkError("Unable to delete backup") from err
+        self.stats.async_record_delete(filename)
+        if filename.endswith(PARTS_SUFFIX):
+            await self._remove_prefix(_parts_prefix(backup_id))
+        self._backup_keys.pop(backup_id, None)
+        self._object_metadata.pop(filename, None)
+        if self._cache:
+            self._cache.async_remove(filename)
+
+    def _find_backup_key(self, backup_id: str) -> str | None:
+        """Return the object key of a backup without calling uplink."""
+        if filename := self._backup_keys.get(backup_id):
+            return filename
+        if self._cache and (filename := self._cache.find_key(backup_id)):
+            self._backup_keys[backup_id] = filename
+            return filename
+        return None
+
+    async def _async_resolve_key(self, backup_id: str) -> str | None:
+        """Return the object key of a backup, listing the bucket on a miss."""
+        if filename := self._find_backup_key(backup_id):
+            return filename
+        await self._list_backup_objects_by_id()
+        return self._backup_keys.get(backup_id)
 
-        storj_objs = [json.loads(ob) for ob in stdout.decode().split("\n") if ob]
+    async def _list_backup_objects_by_id(self) -> list[tuple[str, AgentBackup]]:
+        """List the bucket and refresh the backup_id to object key index."""
+        listed = await self._list_backup_objects()
+        self._backup_keys = {backup.backup_id: key for key, backup in listed}
+        return listed
 
-        backups: list[AgentBackup] = []
-        for ob in storj_objs:
-            metadata = await self._get_metadata(ob["key"])
-            metadata_dict = unflatten(metadata)
-            if "homeassistant_version" in metadata_dict.keys():
-                backup = AgentBackup.from_dict(metadata_dict)
-                backups.append(backup)
+    async def async_download_backup(
+        self, backup_id: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Download a backup, or a byte range of it, as a stream of chunks.
 
-        return backups
+        An interrupted transfer is retried from the last byte delivered, so
+        the stream only fails once the retries are used up. A compressed
+        backup is decompressed on the way, and the range applies to the
+        original bytes. A full download is checked against the backup's
+        checksum, if it has one, when the stream ends.
+        """
 
-    async def async_delete_backup(self, backup: AgentBackup) -> None:
-        """Delete a specified backup from the bucket."""
+        start = time.monotonic()
+        filename = await self._async_resolve_key(backup_id)
+        if filename is None:
+            raise BackupNotFound(f"Backup {backup_id} not found")
 
-        result = await asyncio.create_subprocess_exec(
-            "uplink",
-            "rm",
-            f"sj://{self.bucket_name}/backups/{suggested_filename(backup)}",
+        if (metadata := self._object_metadata.get(filename)) is None:
+            metadata = await self._get_metadata(filename)
+            self._object_metadata[filename] = metadata
+        codec = metadata.get(METADATA_CODEC)
+        checksum = metadata.get(METADATA_CHECKSUM)
+
+        _LOGGER.debug(
+            "Downloading backup: %s from %s at offset %s", backup_id, filename, offset
+        )
+        if codec is None:
+            stream = self._stream_stored(filename, offset, length)
+        elif codec == CODEC_ZSTD:
+            stream = async_decompress(self._stream_stored(filename), offset, length)
+        else:
+            raise UplinkError(f"Backup {backup_id} uses unknown codec {codec}")
+        # Only a download of the whole backup can be checked or timed.
+        whole = not offset and length is None
+        if checksum is not None and whole:
+            stream = async_verify(stream, checksum, backup_id)
+        return self._measured(stream, start if whole else None)
+
+    async def _measured(
+        self, stream: AsyncGenerator[bytes], start: float | None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a download unchanged, counting failures and timing it from start."""
+        size = 0
+        try:
+            async with contextlib.aclosing(stream):
+                async for chunk in stream:
+                    size += len(chunk)
+                    yield chunk
+        except HomeAssistantError:
+            self.stats.async_record_error(DOWNLOAD)
+            raise
+        if start is not None:
+            self.stats.async_record_download(size, time.monotonic() - start)
+
+    def _stream_stored(
+        self, filename: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Stream a byte range of a backup as it is stored in the bucket."""
+        if filename.endswith(PARTS_SUFFIX):
+            return self._stream_parts(filename, offset, length)
+        if filename.endswith(CHUNKS_SUFFIX):
+            return self._stream_chunks(filename, offset, length)
+        return self._stream_with_retry(f"backups/{filename}", offset, length)
+
+    async def async_read_backup_header(
+        self, backup_id: str, size: int = BACKUP_HEADER_SIZE
+    ) -> bytes:
+        """Return the start of a backup's tar, enough to read backup.json."""
+        stream = await self.async_download_backup(backup_id, length=size)
+        async with contextlib.aclosing(stream):
+            return b"".join([chunk async for chunk in stream])
+
+    async def _stream_parts(
+        self, filename: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of a resumable upload from its parts, in order."""
+        manifest = await self._read_manifest(filename)
+
+        part_size = manifest["part_size"]
+        end = (
+            manifest["size"]
+            if length is None
+            else min(offset + length, manifest["size"])
+        )
+        for part in range(offset // part_size, manifest["parts"]):
+            part_start = part * part_size
+            if part_start >= end:
+                break
+            part_offset = max(offset - part_start, 0)
+            async with contextlib.aclosing(
+                self._stream_with_retry(
+                    f"backups/{manifest['prefix']}{part:05d}",
+                    part_offset,
+                    min(end - part_start, part_size) - part_offset,
+                )
+            ) as stream:
+                async for chunk in stream:
+                    yield chunk
+
+    async def _stream_chunks(
+        self, filename: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of a deduplicated backup from its chunks, in order.
+
+        Chunks are downloaded one at a time and checked against their name, so
+        at most one chunk is held in memory.
+        """
+        manifest = await self._read_manifest(filename)
+        end = (
+            manifest["size"]
+            if length is None
+            else min(offset + length, manifest["size"])
+        )
+        position = 0
+        for name, size in manifest["chunks"]:
+            start, position = position, position + size
+            if position <= offset:
+                continue
+            if start >= end:
+                break
+            data = await self._read_chunk(name, size)
+            data = data[max(offset - start, 0) : end - start]
+            for piece in range(0, len(data), DOWNLOAD_CHUNK_SIZE):
+                yield data[piece : piece + DOWNLOAD_CHUNK_SIZE]
+
+    async def _read_chunk(self, name: str, size: int) -> bytes:
+        """Download a chunk and check it is the one its name describes."""
+        async with contextlib.aclosing(
+            self._stream_with_retry(f"{CHUNKS_DIRECTORY}/{name}")
+        ) as stream:
+            data = b"".join([chunk async for chunk in stream])
+        if name.endswith(COMPRESSED_SUFFIX):
+            data = await async_decompress_chunk(data, size)
+        digest = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: hashlib.sha256(data).hexdigest()
+        )
+        if len(data) != size or digest != name.removesuffix(COMPRESSED_SUFFIX):
+            raise UplinkError(f"Chunk {name} is corrupt")
+        return data
+
+    async def _stream_with_retry(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Stream an object, restarting from the last byte after a failure."""
+        delivered = 0
+        attempt = 0
+        while length is None or delivered < length:
+            resumed_at = delivered
+            try:
+                async with contextlib.aclosing(
+                    self._transport.async_stream(
+                        key,
+                        offset + delivered,
+                        None if length is None else length - delivered,
+                    )
+                ) as stream:
+                    async for chunk in stream:
+                        if self.throttle:
+                            await self.throttle.async_consume(DOWNLOAD, len(chunk))
+                        delivered += len(chunk)
+                        yield chunk
+                return
+            except UplinkError:
+                # Only count consecutive attempts that made no progress.
+                attempt = attempt + 1 if delivered == resumed_at else 1
+                if attempt > DOWNLOAD_RETRIES:
+                    raise
+                _LOGGER.debug(
+                    "Retrying download of %s from byte %s",
+                    key,
+                    offset + delivered,
+                )
+                await asyncio.sleep(DOWNLOAD_RETRY_DELAY * attempt)
+
+    async def _read_object(self, filename: str) -> bytes:
+        """Download a small object from backups/ into memory."""
+        return await self._transport.async_read(f"backups/{filename}")
+
+
+async def _iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+def _checksumming(
+    open_stream: Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]],
+    metadata: dict[str, str],
+) -> Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]]:
+    """Wrap open_stream so every stream it opens adds its checksum to metadata."""
+
+    async def _open_stream() -> AsyncIterator[bytes]:
+        return async_checksum(await open_stream(), metadata)
+
+    return _open_stream
+
+
+def _parts_prefix(backup_id: str) -> str:
+    return f"{PARTS_DIRECTORY}/{backup_id}/"
+
+
+def upload_tuning(
+    size: int, parallelism: int = 0, max_concurrent_pieces: int = 0
+) -> UploadTuning:
+    """Choose upload settings for a backup of the given size.
+
+    A configured value (anything above 0) always wins over the automatic one.
+    """
+    if size < SMALL_BACKUP_SIZE:
+        tuning = UploadTuning(parallelism=1)
+    elif size < LARGE_BACKUP_SIZE:
+        tuning = UploadTuning(parallelism=MEDIUM_BACKUP_PARALLELISM)
+    else:
+        tuning = UploadTuning(
+            parallelism=LARGE_BACKUP_PARALLELISM,
+            maximum_concurrent_pieces=LARGE_BACKUP_MAX_CONCURRENT_PIECES,
         )
-        await result.communicate()
-        if result.returncode != 0:
-            raise UplinkError("Unable to delete backup")
+    return UploadTuning(
+        parallelism=parallelism or tuning.parallelism,
+        maximum_concurrent_pieces=(
+            max_concurrent_pieces or tuning.maximum_concurrent_pieces
+        ),
+    )
+
 
-    async def async_download_backup(self) -> None:
-        """Download a backup to the local system."""
-        _LOGGER.debug("TODO")
+def _index_entry(size: int, backup: AgentBackup | None) -> dict[str, Any]:
+    return {"size": size, "backup": backup.as_dict() if backup else None}
 
 
-class UplinkError(HomeAssistantError):
-    """Error to indicate there is a problem calling uplink."""
+def _index_matches(index: dict[str, Any], storj_objs: list[StorjObject]) -> bool:
+    """Return whether the index describes exactly the objects in the bucket."""
+    entries = index["backups"]
+    return len(entries) == len(storj_objs) and all(
+        ob.key in entries and entries[ob.key].get("size") == ob.size
+        for ob in storj_objs
+    )
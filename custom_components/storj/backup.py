@@ -2,12 +2,17 @@
 
 from __future__ import annotations
 
-from collections.abc import AsyncIterator, Callable
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Coroutine
+import contextlib
 import logging
 from typing import Any
-from pathlib import Path
 
-from homeassistant.components.backup import AgentBackup, BackupAgent, BackupAgentError
+from homeassistant.components.backup import (
+    AgentBackup,
+    BackupAgent,
+    BackupAgentError,
+    BackupNotFound,
+)
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
 
@@ -49,6 +54,20 @@ def async_register_backup_agents_listener(
     return remove_listener
 
 
+async def _translate_errors(
+    stream: AsyncGenerator[bytes], backup_id: str
+) -> AsyncIterator[bytes]:
+    """Raise errors from a download stream as BackupAgentError."""
+    async with contextlib.aclosing(stream):
+        try:
+            async for chunk in stream:
+                yield chunk
+        except (UplinkError, HomeAssistantError, TimeoutError) as err:
+            raise BackupAgentError(
+                f"Failed to download backup {backup_id}: {err}"
+            ) from err
+
+
 class StorjBackupAgent(BackupAgent):
     """Storj backup agent."""
 
@@ -61,20 +80,21 @@ class StorjBackupAgent(BackupAgent):
         self.hass = hass
         self.name = config_entry.title
         self.unique_id = config_entry.unique_id
-        self._backup_dir = Path(hass.config.path("backups"))
         self._client = config_entry.runtime_data
 
     async def async_upload_backup(
         self,
         *,
+        open_stream: Callable[[], Coroutine[Any, Any, AsyncIterator[bytes]]],
         backup: AgentBackup,
         **kwargs: Any,
     ) -> None:
         """Upload a backup.
+        :param open_stream: A function returning an async iterator that yields bytes.
         :param backup: Metadata about the backup that should be uploaded.
         """
         try:
-            await self._client.async_upload_backup(self._backup_dir, backup)
+            await self._client.async_upload_backup(open_stream, backup)
         except (UplinkError, HomeAssistantError, TimeoutError) as err:
             raise BackupAgentError(f"Failed to upload backup: {err}") from err
 
@@ -91,11 +111,10 @@ class StorjBackupAgent(BackupAgent):
         **kwargs: Any,
     ) -> AgentBackup | None:
         """Return a backup."""
-        backups = await self.async_list_backups()
-        for backup in backups:
-            if backup.backup_id == backup_id:
-                return backup
-        return None
+        try:
+            return await self._client.async_get_backup(backup_id)
+        except (UplinkError, HomeAssistantError, TimeoutError) as err:
+            raise BackupAgentError(f"Failed to get backup {backup_id}: {err}") from err
 
     async def async_download_backup(
         self,
@@ -107,8 +126,15 @@ class StorjBackupAgent(BackupAgent):
         :return: An async iterator that yields bytes.
         """
         _LOGGER.debug("Downloading backup_id: %s", backup_id)
-        # try:
-        #     file_id = await self._client.async_get_backup_file_id(backup_id)
+        try:
+            stream = await self._client.async_download_backup(backup_id)
+        except BackupNotFound:
+            raise
+        except (UplinkError, HomeAssistantError, TimeoutError) as err:
+            raise BackupAgentError(
+                f"Failed to download backup {backup_id}: {err}"
+            ) from err
+        return _translate_errors(stream, backup_id)
 
     async def async_delete_backup(
         self,
@@ -120,10 +146,7 @@ class StorjBackupAgent(BackupAgent):
         """
         _LOGGER.debug("Deleting backup_id: %s", backup_id)
         try:
-            backup = await self.async_get_backup(backup_id)
-
-            if backup:
-                await self._client.async_delete_backup(backup)
+            await self._client.async_delete_backup(backup_id)
         except (UplinkError, HomeAssistantError, TimeoutError) as err:
             raise BackupAgentError(
                 f"Failed to delete backup {backup_id}: {err}"
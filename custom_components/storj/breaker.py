@@ -0,0 +1,225 @@
+"""Circuit breaker that stops calling Storj while it is unreachable."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
+import contextlib
+from datetime import datetime
+import logging
+import time
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+from .const import BREAKER_COOL_DOWN, BREAKER_FAILURE_THRESHOLD
+from .transport import (
+    CorruptMetadataError,
+    ObjectNotFoundError,
+    StorjObject,
+    StorjTransport,
+    UplinkError,
+    UploadTuning,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(UplinkError):
+    """Error to indicate a call was refused because Storj is unreachable."""
+
+
+class CircuitBreaker:
+    """Tracks whether calls to Storj are worth making.
+
+    The breaker opens after a number of failures in a row, and calls fail
+    straight away until the cool-down has passed. Then one call at a time is
+    let through as a probe: its success closes the breaker and its failure
+    opens it for another cool-down.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        cool_down: float = BREAKER_COOL_DOWN,
+    ) -> None:
+        """Initialize."""
+        self._failure_threshold = failure_threshold
+        self._cool_down = cool_down
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.last_error: str | None = None
+        self.opened_at: datetime | None = None
+        self._opened = 0.0
+        self._probing = False
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may be made now."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened < self._cool_down:
+                self._reject()
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self._reject()
+            self._probing = True
+
+    def _reject(self) -> None:
+        self.rejected += 1
+        raise CircuitOpenError(f"Storj is unreachable: {self.last_error}")
+
+    def record_success(self) -> None:
+        """Close the breaker after a call succeeded."""
+        if self.state != CLOSED:
+            _LOGGER.info("Storj is reachable again")
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self, err: UplinkError) -> None:
+        """Count a failed call, opening the breaker if there were too many."""
+        self.failures += 1
+        self.last_error = str(err)
+        self._probing = False
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED and self.failures >= self._failure_threshold
+        ):
+            if self.state == CLOSED:
+                self.trips += 1
+                _LOGGER.warning(
+                    "Storj is unreachable after %d failed calls, the last one: %s",
+                    self.failures,
+                    err,
+                )
+            self.state = OPEN
+            self.opened_at = dt_util.utcnow()
+            self._opened = time.monotonic()
+
+    def release(self) -> None:
+        """Let another probe through after one ended without an answer."""
+        self._probing = False
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the state of the breaker."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "opened_at": self.opened_at and self.opened_at.isoformat(),
+        }
+
+
+class CircuitBreakerTransport(StorjTransport):
+    """Fails the operations of another transport fast while Storj is down.
+
+    Every UplinkError counts as a failure, except an object that isn't
+    there or whose metadata is corrupt: like a stream closed early, that
+    still got an answer from Storj and counts as a success.
+    """
+
+    def __init__(self, transport: StorjTransport, breaker: CircuitBreaker) -> None:
+        """Initialize."""
+        super().__init__(transport.bucket_name)
+        self.transport = transport
+        self.replaces_metadata_in_place = transport.replaces_metadata_in_place
+        self.writes_metadata_last = transport.writes_metadata_last
+        self.breaker = breaker
+
+    @contextlib.contextmanager
+    def _guard(self) -> Iterator[None]:
+        """Run the block if the breaker allows it, and record how it ended."""
+        self.breaker.before_call()
+        try:
+            yield
+        except (ObjectNotFoundError, CorruptMetadataError):
+            self.breaker.record_success()
+            raise
+        except UplinkError as err:
+            self.breaker.record_failure(err)
+            raise
+        except GeneratorExit:
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Return whether the access grant can be used."""
+        with self._guard():
+            return await self.transport.async_authenticate(access_grant)
+
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects directly under a prefix."""
+        with self._guard():
+            return await self.transport.async_list(prefix, include_metadata)
+
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the custom metadata of an object."""
+        with self._guard():
+            return await self.transport.async_get_metadata(key)
+
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+        with self._guard():
+            return await self.transport.async_read(key)
+
+    async def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of an object."""
+        with self._guard():
+            async with contextlib.aclosing(
+                self.transport.async_stream(key, offset, length)
+            ) as stream:
+                async for chunk in stream:
+                    yield chunk
+
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload an object without metadata."""
+        with self._guard():
+            await self.transport.async_put(key, data)
+
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream."""
+        with self._guard():
+            return await self.transport.async_write(key, stream, metadata, tuning)
+
+    def wrote_metadata_last(self, size: int) -> bool:
+        """Return whether a write of this many bytes stored metadata last."""
+        return self.transport.wrote_metadata_last(size)
+
+    async def async_delete(self, key: str) -> None:
+        """Delete an object."""
+        with self._guard():
+            await self.transport.async_delete(key)
+
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix."""
+        with self._guard():
+            await self.transport.async_delete_prefix(prefix)
+
+    async def async_replace_metadata(self, key: str, metadata: dict[str, str]) -> None:
+        """Replace the custom metadata of an object."""
+        with self._guard():
+            await self.transport.async_replace_metadata(key, metadata)
+
+    async def async_close(self) -> None:
+        """Close the wrapped transport."""
+        await self.transport.async_close()
@@ -0,0 +1,151 @@
+"""Persistent cache of backup metadata for the Storj integration."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.backup import AgentBackup
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DEFAULT_CACHE_MAX_ENTRIES, DOMAIN, METADATA_VERSION
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+
+
+class BackupMetadataCache:
+    """Parsed backup metadata keyed by object key.
+
+    An entry is only trusted while the size and creation time reported by
+    `uplink ls` still match, so a replaced object is fetched again.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry_id: str,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+    ) -> None:
+        """Initialize."""
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.metadata"
+        )
+        self._max_entries = max_entries
+        # Objects in the bucket at the last listing; the cap never drops below.
+        self._bucket_size = 0
+        self._entries: dict[str, dict[str, Any]] = {}
+        # The metadata version every backup in the bucket has been rewritten to.
+        self._metadata_version: int | None = None
+
+    async def async_load(self) -> None:
+        """Load the cache from storage."""
+        if data := await self._store.async_load():
+            self._entries = data["entries"]
+            self._metadata_version = data.get("metadata_version")
+
+    @property
+    def metadata_migrated(self) -> bool:
+        """Return whether no backup in the bucket uses an older metadata format."""
+        return self._metadata_version == METADATA_VERSION
+
+    @callback
+    def async_set_metadata_migrated(self) -> None:
+        """Record that every backup in the bucket uses the current format."""
+        self._metadata_version = METADATA_VERSION
+        self._async_schedule_save()
+
+    async def async_remove_store(self) -> None:
+        """Remove the cache from storage."""
+        await self._store.async_remove()
+
+    def lookup(self, key: str, size: int, created: str) -> dict[str, Any] | None:
+        """Return the cached entry for an object, or None if it is stale."""
+        entry = self._entries.get(key)
+        if entry is None or entry["size"] != size:
+            return None
+        if entry["created"] is None:
+            # Written by an upload before `uplink ls` reported the object.
+            entry["created"] = created
+            self._async_schedule_save()
+        elif entry["created"] != created:
+            return None
+        return entry
+
+    @staticmethod
+    def backup_from_entry(entry: dict[str, Any]) -> AgentBackup | None:
+        """Return the backup held by an entry, if the object is a backup."""
+        if entry["backup"] is None:
+            return None
+        return AgentBackup.from_dict(entry["backup"])
+
+    def find_key(self, backup_id: str) -> str | None:
+        """Return the key of the cached object holding a backup, if any."""
+        for key, entry in self._entries.items():
+            if (
+                entry["backup"] is not None
+                and entry["backup"]["backup_id"] == backup_id
+            ):
+                return key
+        return None
+
+    @callback
+    def async_set(
+        self,
+        key: str,
+        backup: AgentBackup | None,
+        size: int,
+        created: str | None = None,
+    ) -> None:
+        """Cache the metadata of an object.
+
+        A backup of None records an object that is not a Home Assistant backup.
+        """
+        self._entries[key] = {
+            "size": size,
+            "created": created,
+            "backup": backup.as_dict() if backup else None,
+        }
+        overflow = len(self._entries) - max(self._max_entries, self._bucket_size)
+        if overflow > 0:
+            oldest = sorted(
+                self._entries,
+                key=lambda key: (
+                    self._entries[key]["created"] is None,
+                    self._entries[key]["created"] or "",
+                ),
+            )
+            for key in oldest[:overflow]:
+                del self._entries[key]
+        self._async_schedule_save()
+
+    @callback
+    def async_remove(self, key: str) -> None:
+        """Remove an object from the cache."""
+        if self._entries.pop(key, None) is not None:
+            self._async_schedule_save()
+
+    @callback
+    def async_evict(self, existing_keys: set[str]) -> None:
+        """Drop entries for objects that no longer exist.
+
+        The size cap, enforced as entries are set, grows with the bucket:
+        evicting an object that is still there would only have the next
+        listing fetch and parse it again.
+        """
+        self._bucket_size = len(existing_keys)
+        stale = self._entries.keys() - existing_keys
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self._async_schedule_save()
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        self._store.async_delay_save(
+            lambda: {
+                "entries": self._entries,
+                "metadata_version": self._metadata_version,
+            },
+            STORAGE_SAVE_DELAY,
+        )
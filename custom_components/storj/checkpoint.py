@@ -0,0 +1,78 @@
+"""Persistent checkpoints for resumable Storj uploads."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+
+
+class UploadCheckpoints:
+    """Progress of unfinished resumable uploads, keyed by backup_id.
+
+    Every completed part is saved straight away so a restart of Home
+    Assistant loses at most the part that was in flight.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize."""
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.uploads"
+        )
+        self._uploads: dict[str, dict[str, Any]] = {}
+
+    async def async_load(self) -> None:
+        """Load the checkpoints from storage."""
+        if data := await self._store.async_load():
+            self._uploads = data["uploads"]
+
+    async def async_remove_store(self) -> None:
+        """Remove the checkpoints from storage."""
+        await self._store.async_remove()
+
+    def get(self, backup_id: str) -> dict[str, Any] | None:
+        """Return the checkpoint of an unfinished upload."""
+        return self._uploads.get(backup_id)
+
+    def stale(self, cutoff: datetime) -> list[str]:
+        """Return the backup_ids of uploads with no progress since cutoff."""
+        return [
+            backup_id
+            for backup_id, upload in self._uploads.items()
+            if dt_util.parse_datetime(upload["updated"]) < cutoff
+        ]
+
+    async def async_start(
+        self, backup_id: str, filename: str, part_size: int
+    ) -> dict[str, Any]:
+        """Record the start of an upload and return its checkpoint."""
+        self._uploads[backup_id] = {
+            "filename": filename,
+            "part_size": part_size,
+            "parts": 0,
+            "updated": dt_util.utcnow().isoformat(),
+        }
+        await self._async_save()
+        return self._uploads[backup_id]
+
+    async def async_set_parts(self, backup_id: str, parts: int) -> None:
+        """Record the number of parts uploaded so far."""
+        upload = self._uploads[backup_id]
+        upload["parts"] = parts
+        upload["updated"] = dt_util.utcnow().isoformat()
+        await self._async_save()
+
+    async def async_remove(self, backup_id: str) -> None:
+        """Forget an upload that finished or was aborted."""
+        if self._uploads.pop(backup_id, None) is not None:
+            await self._async_save()
+
+    async def _async_save(self) -> None:
+        await self._store.async_save({"uploads": self._uploads})
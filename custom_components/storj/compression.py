@@ -0,0 +1,91 @@
+"""Streaming compression of backups for the Storj integration."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator
+import contextlib
+
+from homeassistant.exceptions import HomeAssistantError
+import zstandard
+
+from .const import COMPRESSION_INPUT_SIZE, DOWNLOAD_CHUNK_SIZE
+
+
+async def async_compress(
+    stream: AsyncIterator[bytes], level: int
+) -> AsyncGenerator[bytes]:
+    """Compress a stream with zstd.
+
+    Each chunk is compressed in the executor. The compressor runs single
+    threaded, so the same input always gives the same output, which lets a
+    resumable upload skip the parts it already sent.
+    """
+    loop = asyncio.get_running_loop()
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    async for chunk in stream:
+        if data := await loop.run_in_executor(None, compressor.compress, chunk):
+            yield data
+    yield await loop.run_in_executor(None, compressor.flush)
+
+
+async def async_decompress(
+    stream: AsyncGenerator[bytes], offset: int = 0, length: int | None = None
+) -> AsyncGenerator[bytes]:
+    """Decompress a zstd stream and yield a byte range of the original.
+
+    Compressed input is fed in small slices so one call can't expand into
+    an unbounded amount of memory, and output is yielded in chunks of at
+    most DOWNLOAD_CHUNK_SIZE. A compressed stream can't be seeked, so the
+    bytes before offset are decompressed and dropped.
+    """
+    loop = asyncio.get_running_loop()
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    skip = offset
+    remaining = length
+    async with contextlib.aclosing(stream):
+        async for chunk in stream:
+            for start in range(0, len(chunk), COMPRESSION_INPUT_SIZE):
+                try:
+                    data = await loop.run_in_executor(
+                        None,
+                        decompressor.decompress,
+                        chunk[start : start + COMPRESSION_INPUT_SIZE],
+                    )
+                except zstandard.ZstdError as err:
+                    raise CompressionError(
+                        f"Unable to decompress backup: {err}"
+                    ) from err
+                if skip:
+                    dropped = min(skip, len(data))
+                    data, skip = data[dropped:], skip - dropped
+                if remaining is not None:
+                    data = data[:remaining]
+                    remaining -= len(data)
+                for piece in range(0, len(data), DOWNLOAD_CHUNK_SIZE):
+                    yield data[piece : piece + DOWNLOAD_CHUNK_SIZE]
+                if remaining == 0:
+                    return
+        if not decompressor.eof:
+            raise CompressionError("Unable to decompress backup: stream ended early")
+
+
+async def async_compress_chunk(data: bytes, level: int) -> bytes:
+    """Compress one chunk of bounded size in the executor."""
+    return await asyncio.get_running_loop().run_in_executor(
+        None, zstandard.ZstdCompressor(level=level).compress, data
+    )
+
+
+async def async_decompress_chunk(data: bytes, size: int) -> bytes:
+    """Decompress one chunk in the executor, given its decompressed size."""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, zstandard.ZstdDecompressor().decompress, data, size
+        )
+    except zstandard.ZstdError as err:
+        raise CompressionError(f"Unable to decompress chunk: {err}") from err
+
+
+class CompressionError(HomeAssistantError):
+    """Error to indicate a compressed backup can't be read."""
@@ -7,13 +7,48 @@ from typing import Any
 
 import voluptuous as vol
 
-from homeassistant.config_entries import ConfigFlow, ConfigFlowResult
-from homeassistant.core import HomeAssistant
+from homeassistant.config_entries import (
+    ConfigEntry,
+    ConfigFlow,
+    ConfigFlowResult,
+    OptionsFlow,
+)
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
-from homeassistant.helpers import instance_id
+from homeassistant.helpers import instance_id, selector
 
 from .api import StorjClient
-from .const import CONF_ACCESS_GRANT, CONF_BUCKET_NAME, DOMAIN
+from .const import (
+    CONF_ACCESS_GRANT,
+    CONF_BUCKET_INDEX,
+    CONF_COMPRESSION,
+    CONF_COMPRESSION_LEVEL,
+    CONF_DEDUPLICATION,
+    CONF_DOWNLOAD_LIMIT,
+    CONF_HEDGED_READS,
+    CONF_LIMIT_END,
+    CONF_LIMIT_START,
+    CONF_BUCKET_NAME,
+    CONF_MAX_CONCURRENT_PIECES,
+    CONF_METADATA_CONCURRENCY,
+    CONF_RESUMABLE_UPLOADS,
+    CONF_S3_ACCESS_KEY_ID,
+    CONF_S3_ENDPOINT,
+    CONF_S3_SECRET_ACCESS_KEY,
+    CONF_STALE_UPLOAD_HOURS,
+    CONF_TIMING_SPANS,
+    CONF_TRANSPORT,
+    CONF_UPLOAD_LIMIT,
+    CONF_UPLOAD_PARALLELISM,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_METADATA_CONCURRENCY,
+    DEFAULT_S3_ENDPOINT,
+    DEFAULT_STALE_UPLOAD_HOURS,
+    DOMAIN,
+    TRANSPORT_CLI,
+    TRANSPORT_S3,
+    TRANSPORTS,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +60,46 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
     }
 )
 
+OPTIONS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(
+            CONF_METADATA_CONCURRENCY, default=DEFAULT_METADATA_CONCURRENCY
+        ): vol.All(vol.Coerce(int), vol.Range(min=1, max=64)),
+        vol.Optional(CONF_BUCKET_INDEX, default=False): bool,
+        vol.Optional(CONF_UPLOAD_PARALLELISM, default=0): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=64)
+        ),
+        vol.Optional(CONF_MAX_CONCURRENT_PIECES, default=0): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=10000)
+        ),
+        vol.Optional(CONF_RESUMABLE_UPLOADS, default=False): bool,
+        vol.Optional(
+            CONF_STALE_UPLOAD_HOURS, default=DEFAULT_STALE_UPLOAD_HOURS
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(CONF_TRANSPORT, default=TRANSPORT_CLI): vol.In(TRANSPORTS),
+        vol.Optional(CONF_S3_ENDPOINT, default=DEFAULT_S3_ENDPOINT): str,
+        vol.Optional(CONF_S3_ACCESS_KEY_ID): str,
+        vol.Optional(CONF_S3_SECRET_ACCESS_KEY): selector.TextSelector(
+            selector.TextSelectorConfig(type=selector.TextSelectorType.PASSWORD)
+        ),
+        vol.Optional(CONF_COMPRESSION, default=False): bool,
+        vol.Optional(
+            CONF_COMPRESSION_LEVEL, default=DEFAULT_COMPRESSION_LEVEL
+        ): vol.All(vol.Coerce(int), vol.Range(min=1, max=22)),
+        vol.Optional(CONF_DEDUPLICATION, default=False): bool,
+        vol.Optional(CONF_UPLOAD_LIMIT, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_DOWNLOAD_LIMIT, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_LIMIT_START): selector.TimeSelector(),
+        vol.Optional(CONF_LIMIT_END): selector.TimeSelector(),
+        vol.Optional(CONF_HEDGED_READS, default=False): bool,
+        vol.Optional(CONF_TIMING_SPANS, default=False): bool,
+    }
+)
+
 
 async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str, Any]:
     """Validate the user input allows us to connect.
@@ -49,6 +124,12 @@ class StorjConfigFlow(ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> StorjOptionsFlow:
+        """Get the options flow for this handler."""
+        return StorjOptionsFlow()
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
@@ -73,6 +154,42 @@ class StorjConfigFlow(ConfigFlow, domain=DOMAIN):
         )
 
 
+class StorjOptionsFlow(OptionsFlow):
+    """Handle Storj options."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Manage the options."""
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            # The stored secret isn't shown again, so leaving it empty keeps it.
+            if not user_input.get(CONF_S3_SECRET_ACCESS_KEY) and (
+                secret := self.config_entry.options.get(CONF_S3_SECRET_ACCESS_KEY)
+            ):
+                user_input[CONF_S3_SECRET_ACCESS_KEY] = secret
+            if user_input[CONF_TRANSPORT] == TRANSPORT_S3 and not (
+                user_input.get(CONF_S3_ACCESS_KEY_ID)
+                and user_input.get(CONF_S3_SECRET_ACCESS_KEY)
+            ):
+                errors["base"] = "s3_credentials_required"
+            else:
+                return self.async_create_entry(data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=self.add_suggested_values_to_schema(
+                OPTIONS_SCHEMA,
+                {
+                    key: value
+                    for key, value in (user_input or self.config_entry.options).items()
+                    if key != CONF_S3_SECRET_ACCESS_KEY
+                },
+            ),
+            errors=errors,
+        )
+
+
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
 
@@ -3,3 +3,139 @@
 DOMAIN = "storj"
 CONF_ACCESS_GRANT = "access_grant"
 CONF_BUCKET_NAME = "bucket_name"
+
+CONF_METADATA_CONCURRENCY = "metadata_concurrency"
+CONF_BUCKET_INDEX = "bucket_index"
+CONF_UPLOAD_PARALLELISM = "upload_parallelism"
+CONF_MAX_CONCURRENT_PIECES = "maximum_concurrent_pieces"
+CONF_RESUMABLE_UPLOADS = "resumable_uploads"
+CONF_STALE_UPLOAD_HOURS = "stale_upload_hours"
+CONF_TRANSPORT = "transport"
+CONF_COMPRESSION = "compression"
+CONF_COMPRESSION_LEVEL = "compression_level"
+CONF_DEDUPLICATION = "deduplication"
+CONF_UPLOAD_LIMIT = "upload_limit"
+CONF_DOWNLOAD_LIMIT = "download_limit"
+CONF_LIMIT_START = "limit_start"
+CONF_LIMIT_END = "limit_end"
+CONF_TIMING_SPANS = "timing_spans"
+CONF_HEDGED_READS = "hedged_reads"
+CONF_S3_ENDPOINT = "s3_endpoint"
+CONF_S3_ACCESS_KEY_ID = "s3_access_key_id"
+CONF_S3_SECRET_ACCESS_KEY = "s3_secret_access_key"
+DEFAULT_METADATA_CONCURRENCY = 8
+
+DEFAULT_CACHE_MAX_ENTRIES = 1000
+
+INDEX_FILENAME = ".index.json"
+INDEX_VERSION = 1
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_RETRY_DELAY = 2
+# Home Assistant backups start with backup.json, well inside this many bytes.
+BACKUP_HEADER_SIZE = 64 * 1024
+
+# Automatic upload tuning by backup size. Parallelism splits the upload into
+# concurrently uploaded parts, which only pays off once a backup spans several
+# 64 MiB segments.
+SMALL_BACKUP_SIZE = 64 * 1024 * 1024
+LARGE_BACKUP_SIZE = 1024 * 1024 * 1024
+MEDIUM_BACKUP_PARALLELISM = 4
+LARGE_BACKUP_PARALLELISM = 8
+LARGE_BACKUP_MAX_CONCURRENT_PIECES = 500
+
+# Resumable uploads store each part as its own object under backups/.parts/
+# and a manifest named after the backup with this suffix.
+RESUMABLE_PART_SIZE = 64 * 1024 * 1024
+PARTS_DIRECTORY = ".parts"
+PARTS_SUFFIX = ".parts"
+PARTS_MANIFEST_VERSION = 1
+DEFAULT_STALE_UPLOAD_HOURS = 24
+
+# Backups deleted at once when pruning by a retention policy.
+PRUNE_CONCURRENCY = 4
+
+# Operations other than streams and uploads are cut short once they take
+# DEADLINE_MULTIPLIER times the p99 of their last DEADLINE_SAMPLES calls, but
+# never sooner than DEADLINE_MINIMUM seconds; until DEADLINE_MIN_SAMPLES calls
+# have completed, and at the most, the deadline is DEADLINE_INITIAL seconds.
+DEADLINE_SAMPLES = 100
+DEADLINE_MIN_SAMPLES = 20
+DEADLINE_MULTIPLIER = 4
+DEADLINE_MINIMUM = 10
+DEADLINE_INITIAL = 120
+
+# After this many failed operations in a row, an entry stops calling Storj
+# for BREAKER_COOL_DOWN seconds, then lets one operation through at a time
+# to see whether it is back.
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOL_DOWN = 60
+
+# uplink operations running at once across every config entry. Listings,
+# metadata and small objects (up to SMALL_OBJECT_SIZE) are interactive and
+# don't queue behind transfers.
+SCHEDULER_INTERACTIVE_SLOTS = 8
+SCHEDULER_TRANSFER_SLOTS = 2
+SMALL_OBJECT_SIZE = 1024 * 1024
+
+# The uplink CLI is run for every operation; libuplink keeps a project open
+# in-process through the uplink-python bindings, which must be installed
+# separately; s3 signs requests to the S3-compatible gateway.
+TRANSPORT_CLI = "cli"
+TRANSPORT_LIBUPLINK = "libuplink"
+TRANSPORT_S3 = "s3"
+TRANSPORTS = [TRANSPORT_CLI, TRANSPORT_LIBUPLINK, TRANSPORT_S3]
+
+# Backup metadata is packed into one compressed, base64 encoded value under
+# this key wherever keys are restricted to header names (the S3 gateway).
+PACKED_METADATA_KEY = "ha-metadata"
+
+DEFAULT_S3_ENDPOINT = "https://gateway.storjshare.io"
+DEFAULT_S3_REGION = "us-1"
+# Multipart uploads hold parallelism parts of this size in memory.
+S3_PART_SIZE = 16 * 1024 * 1024
+
+# A backup is stored in its object's metadata as one compressed, base64
+# encoded JSON value, with its ID, date and size repeated for reading without
+# it. Backups uploaded before METADATA_VERSION_KEY was added store one key per
+# field, flattened by json_flatten; they are rewritten in the background where
+# the transport can replace an object's metadata in place, and read as they
+# are otherwise.
+METADATA_VERSION_KEY = "storj_metadata"
+METADATA_VERSION = 2
+METADATA_BACKUP = "storj_backup"
+METADATA_BACKUP_ID = "storj_backup_id"
+METADATA_DATE = "storj_date"
+METADATA_SIZE = "storj_size"
+# Seconds after setup that the rewrite starts.
+METADATA_MIGRATION_DELAY = 300
+
+# Compressed backups record the codec under this metadata key. The stored
+# object is smaller than the backup, but the backup metadata keeps the
+# original size.
+METADATA_CODEC = "storj_codec"
+# SHA-256 of the original backup, stored where the transport writes metadata
+# after the data.
+METADATA_CHECKSUM = "storj_sha256"
+CODEC_ZSTD = "zstd"
+DEFAULT_COMPRESSION_LEVEL = 3
+# Compressed input fed to the decompressor at once, which bounds its output.
+COMPRESSION_INPUT_SIZE = 128 * 1024
+
+# Deduplicated backups store each content-defined chunk once, named after its
+# SHA-256, under this directory at the root of the bucket, and a manifest named
+# after the backup with this suffix under backups/. Chunks average
+# DEDUP_CHUNK_SIZE (a power of two) and are held in memory whole, at most
+# four times that, while being uploaded or downloaded.
+CHUNKS_DIRECTORY = "chunks"
+CHUNKS_SUFFIX = ".chunks"
+CHUNKS_MANIFEST_VERSION = 1
+DEDUP_CHUNK_SIZE = 4 * 1024 * 1024
+DEDUP_UPLOAD_CONCURRENCY = 4
+
+# The most recent transport operations, and timing spans if enabled, are kept
+# in memory for the diagnostics download, with this much of a failed uplink
+# command's stderr.
+TRACE_BUFFER_SIZE = 200
+TRACE_STDERR_TAIL = 500
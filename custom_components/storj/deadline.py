@@ -0,0 +1,253 @@
+"""Deadlines for Storj operations, adapted from their recent latency."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable
+import math
+import time
+from typing import Any
+
+from .const import (
+    DEADLINE_INITIAL,
+    DEADLINE_MIN_SAMPLES,
+    DEADLINE_MINIMUM,
+    DEADLINE_MULTIPLIER,
+    DEADLINE_SAMPLES,
+    SMALL_OBJECT_SIZE,
+)
+from .scheduler import INTERACTIVE, UplinkScheduler
+from .transport import StorjObject, StorjTransport, UplinkError, UploadTuning
+
+
+class OperationLatency:
+    """Recent durations of one operation, and the calls cut short."""
+
+    def __init__(self, samples: int = DEADLINE_SAMPLES) -> None:
+        """Initialize."""
+        self._durations: deque[float] = deque(maxlen=samples)
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, duration: float) -> None:
+        """Add the duration of a completed call."""
+        self._durations.append(duration)
+
+    def percentile(self, fraction: float) -> float | None:
+        """Return a percentile of the recent durations, once there are enough."""
+        if len(self._durations) < DEADLINE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._durations)
+        return ordered[math.ceil(fraction * len(ordered)) - 1]
+
+    @property
+    def deadline(self) -> float:
+        """Return the seconds a call may take before it is cut short."""
+        if (p99 := self.percentile(0.99)) is None:
+            return DEADLINE_INITIAL
+        return min(max(DEADLINE_MINIMUM, p99 * DEADLINE_MULTIPLIER), DEADLINE_INITIAL)
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the percentiles and deadline in effect, and the calls cut short."""
+        return {
+            "samples": len(self._durations),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "deadline": self.deadline,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class DeadlineTransport(StorjTransport):
+    """Cuts short the operations of another transport that run far too long.
+
+    Each operation's deadline follows its own recent p99, so a slow link
+    isn't mistaken for a stuck one. Cancelling an uplink command kills it,
+    but a libuplink call that is cut short keeps running in its executor
+    thread until it returns. Streams and uploads take as long as their size
+    requires and have none, and neither do puts of objects larger than
+    SMALL_OBJECT_SIZE.
+
+    With hedging, a listing or metadata read that is slower than its p95 is
+    started a second time and whichever finishes first wins; both are
+    idempotent, so the loser is simply cancelled. The second call waits for
+    an interactive slot of the scheduler, if there is one, as the first
+    already holds its own.
+    """
+
+    def __init__(
+        self,
+        transport: StorjTransport,
+        hedge: bool = False,
+        scheduler: UplinkScheduler | None = None,
+    ) -> None:
+        """Initialize."""
+        super().__init__(transport.bucket_name)
+        self.transport = transport
+        self.replaces_metadata_in_place = transport.replaces_metadata_in_place
+        self.writes_metadata_last = transport.writes_metadata_last
+        self._hedge = hedge
+        self._scheduler = scheduler
+        self.latency: dict[str, OperationLatency] = {}
+
+    def diagnostics(self) -> dict[str, dict[str, Any]]:
+        """Return the latency and deadline of every operation called so far."""
+        return {
+            operation: latency.diagnostics()
+            for operation, latency in self.latency.items()
+        }
+
+    async def _call[_T](
+        self,
+        operation: str,
+        call: Callable[[], Awaitable[_T]],
+        hedge: bool = False,
+    ) -> _T:
+        """Run a call within the operation's deadline."""
+        latency = self.latency.setdefault(operation, OperationLatency())
+        deadline = latency.deadline
+        start = time.monotonic()
+        try:
+            async with asyncio.timeout(deadline) as timeout:
+                if (
+                    hedge
+                    and self._hedge
+                    and (delay := latency.percentile(0.95)) is not None
+                ):
+                    result = await self._hedged(latency, call, delay)
+                else:
+                    result = await call()
+        except TimeoutError as err:
+            if not timeout.expired():
+                raise
+            latency.timeouts += 1
+            # Counting the deadline as a sample raises it if the link has
+            # become slower, instead of every later call timing out too; a
+            # stuck link raises it no further than DEADLINE_INITIAL.
+            latency.record(deadline)
+            raise UplinkError(
+                f"Storj {operation} timed out after {deadline:.1f}s"
+            ) from err
+        latency.record(time.monotonic() - start)
+        return result
+
+    async def _hedged[_T](
+        self,
+        latency: OperationLatency,
+        call: Callable[[], Awaitable[_T]],
+        delay: float,
+    ) -> _T:
+        """Run a call, and a duplicate once it has taken longer than delay.
+
+        The first to succeed wins; if both fail, the first error is raised.
+        """
+        first = asyncio.ensure_future(call())
+        pending = {first}
+        errors: list[BaseException] = []
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                latency.hedges += 1
+                pending.add(asyncio.ensure_future(self._in_slot(call)))
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if (err := task.exception()) is not None:
+                        errors.append(err)
+                        continue
+                    if task is not first:
+                        latency.hedge_wins += 1
+                    return task.result()
+            raise errors[0]
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _in_slot[_T](self, call: Callable[[], Awaitable[_T]]) -> _T:
+        """Run a call in an interactive slot of the scheduler, if there is one."""
+        if self._scheduler is None:
+            return await call()
+        async with self._scheduler.async_slot(INTERACTIVE):
+            return await call()
+
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Return whether the access grant can be used."""
+        return await self._call(
+            "authenticate", lambda: self.transport.async_authenticate(access_grant)
+        )
+
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects directly under a prefix."""
+        return await self._call(
+            "list",
+            lambda: self.transport.async_list(prefix, include_metadata),
+            hedge=True,
+        )
+
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the custom metadata of an object."""
+        return await self._call(
+            "get_metadata", lambda: self.transport.async_get_metadata(key), hedge=True
+        )
+
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+        return await self._call("read", lambda: self.transport.async_read(key))
+
+    def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of an object."""
+        return self.transport.async_stream(key, offset, length)
+
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload an object without metadata."""
+        if len(data) > SMALL_OBJECT_SIZE:
+            await self.transport.async_put(key, data)
+            return
+        await self._call("put", lambda: self.transport.async_put(key, data))
+
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream."""
+        return await self.transport.async_write(key, stream, metadata, tuning)
+
+    def wrote_metadata_last(self, size: int) -> bool:
+        """Return whether a write of this many bytes stored metadata last."""
+        return self.transport.wrote_metadata_last(size)
+
+    async def async_delete(self, key: str) -> None:
+        """Delete an object."""
+        await self._call("delete", lambda: self.transport.async_delete(key))
+
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix."""
+        await self._call(
+            "delete_prefix", lambda: self.transport.async_delete_prefix(prefix)
+        )
+
+    async def async_replace_metadata(self, key: str, metadata: dict[str, str]) -> None:
+        """Replace the custom metadata of an object."""
+        await self._call(
+            "replace_metadata",
+            lambda: self.transport.async_replace_metadata(key, metadata),
+        )
+
+    async def async_close(self) -> None:
+        """Close the wrapped transport."""
+        await self.transport.async_close()
@@ -0,0 +1,177 @@
+"""Content-defined chunking and the chunk index for deduplicated backups."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator
+import hashlib
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+import numpy as np
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+
+# Gear table for the rolling hash. It is derived rather than random so chunk
+# boundaries, and with them the chunk names, are stable across restarts and
+# versions.
+_GEAR = np.array(
+    [
+        int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], "big")
+        for value in range(256)
+    ],
+    dtype=np.uint64,
+)
+# Bytes that make up the hash at a position: older ones are shifted out.
+_WINDOW = 64
+# Bytes hashed at a time: few enough for their hashes to stay in the CPU
+# cache, and a boundary found early doesn't pay for the rest.
+_BLOCK = 64 * 1024
+COMPRESSED_SUFFIX = ".zst"
+
+
+def find_boundary(data: bytes | bytearray, average: int) -> int:
+    """Return the length of the first content-defined chunk of data.
+
+    A gear hash rolls over the bytes from the minimum chunk size, and the
+    chunk ends where its top bits are all zero. Those bits depend on the last
+    64 bytes only, so an insertion early in a backup moves the boundaries
+    around it but leaves the later ones, and their chunks, unchanged.
+    Chunks are between a quarter of and four times the average size, which
+    must be a power of two.
+    """
+    minimum, maximum = average // 4, average * 4
+    end = min(len(data), maximum)
+    if end <= minimum:
+        return end
+    limit = np.uint64(1 << (64 - (average.bit_length() - 1)))
+    view = np.frombuffer(data, dtype=np.uint8)
+    for start in range(minimum, end, _BLOCK):
+        first = max(start - _WINDOW + 1, 0)
+        hashes = _gear_hashes(view[first : min(start + _BLOCK, end)])
+        if (hits := np.flatnonzero(hashes[start - first :] < limit)).size:
+            return start + int(hits[0]) + 1
+    return end
+
+
+def _gear_hashes(data: np.ndarray) -> np.ndarray:
+    """Return the gear hash of the window ending at each byte of data.
+
+    The hash at a byte is the sum of the gear values of the 64 bytes up to
+    it, each shifted left by its distance. Rather than rolling over the
+    bytes one at a time, the sums over windows of 1, 2, 4, ... bytes are
+    doubled six times, with numpy doing each step over the whole block.
+    """
+    hashes = _GEAR[data]
+    span = 1
+    while span < _WINDOW:
+        hashes[span:] += hashes[:-span] << np.uint64(span)
+        span *= 2
+    return hashes
+
+
+async def async_chunks(
+    stream: AsyncIterator[bytes], average: int
+) -> AsyncGenerator[bytes]:
+    """Split a stream into content-defined chunks.
+
+    The buffer holds at most one maximum sized chunk beyond the last read, and
+    the hashing runs in the executor, where numpy releases the GIL.
+    """
+    loop = asyncio.get_running_loop()
+    maximum = average * 4
+    buffer = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buffer) < maximum:
+            try:
+                buffer += await anext(stream)
+            except StopAsyncIteration:
+                eof = True
+        if not buffer:
+            return
+        cut = await loop.run_in_executor(None, find_boundary, buffer, average)
+        chunk = bytes(buffer[:cut])
+        del buffer[:cut]
+        yield chunk
+
+
+def chunk_name(data: bytes, compressed: bool) -> str:
+    """Return the object name of a chunk: its SHA-256, and a suffix if compressed."""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest}{COMPRESSED_SUFFIX}" if compressed else digest
+
+
+class ChunkIndex:
+    """The chunks known to be in the bucket and the chunks of each manifest.
+
+    It lets an upload skip chunks without asking the bucket. Chunks that were
+    removed behind its back, by another installation sharing the bucket or by
+    hand, would be missed, so the stored index is only a starting point: it
+    is rebuilt from a listing of the bucket the first time it is used after a
+    restart and whenever unreferenced chunks are collected.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize."""
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.chunks"
+        )
+        self._chunks: dict[str, int] = {}
+        self._manifests: dict[str, list[str]] = {}
+        self.synced = False
+
+    async def async_load(self) -> None:
+        """Load the index from storage."""
+        if data := await self._store.async_load():
+            self._chunks = data["chunks"]
+            self._manifests = data["manifests"]
+
+    async def async_remove_store(self) -> None:
+        """Remove the index from storage."""
+        await self._store.async_remove()
+
+    def has(self, name: str) -> bool:
+        """Return whether a chunk is in the bucket."""
+        return name in self._chunks
+
+    def manifest(self, filename: str) -> list[str] | None:
+        """Return the chunks used by a manifest, if known."""
+        return self._manifests.get(filename)
+
+    @callback
+    def async_set_chunks(self, chunks: dict[str, int]) -> None:
+        """Replace the chunks with those found in the bucket."""
+        self._chunks = chunks
+        self.synced = True
+        self._async_schedule_save()
+
+    @callback
+    def async_add_chunk(self, name: str, size: int) -> None:
+        """Record an uploaded chunk."""
+        self._chunks[name] = size
+        self._async_schedule_save()
+
+    @callback
+    def async_set_manifest(self, filename: str, names: list[str]) -> None:
+        """Record the chunks used by a manifest."""
+        self._manifests[filename] = names
+        self._async_schedule_save()
+
+    @callback
+    def async_retain_manifests(self, filenames: set[str]) -> None:
+        """Forget the manifests that are no longer in the bucket."""
+        for filename in self._manifests.keys() - filenames:
+            del self._manifests[filename]
+        self._async_schedule_save()
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        self._store.async_delay_save(
+            lambda: {"chunks": self._chunks, "manifests": self._manifests},
+            STORAGE_SAVE_DELAY,
+        )
@@ -0,0 +1,31 @@
+"""Diagnostics support for the Storj integration."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.core import HomeAssistant
+
+from . import DATA_SCHEDULER, StorjConfigEntry
+from .const import CONF_ACCESS_GRANT, CONF_S3_ACCESS_KEY_ID, CONF_S3_SECRET_ACCESS_KEY
+from .throttle import BandwidthSchedule, BandwidthThrottle
+
+TO_REDACT = {CONF_ACCESS_GRANT, CONF_S3_ACCESS_KEY_ID, CONF_S3_SECRET_ACCESS_KEY}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: StorjConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    client = entry.runtime_data
+    throttle = client.throttle or BandwidthThrottle(BandwidthSchedule())
+    return {
+        "data": async_redact_data(dict(entry.data), TO_REDACT),
+        "options": async_redact_data(dict(entry.options), TO_REDACT),
+        "bandwidth": throttle.diagnostics(),
+        "scheduler": hass.data[DATA_SCHEDULER].stats(),
+        "traces": client.traces.diagnostics() if client.traces else [],
+        "deadlines": client.deadlines.diagnostics() if client.deadlines else {},
+        "circuit_breaker": client.breaker.diagnostics() if client.breaker else None,
+    }
@@ -0,0 +1,46 @@
+"""In-stream checksums of backups for the Storj integration."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator
+import contextlib
+import hashlib
+
+from homeassistant.components.backup import BackupAgentError
+
+from .const import METADATA_CHECKSUM
+
+
+async def async_checksum(
+    stream: AsyncIterator[bytes], metadata: dict[str, str]
+) -> AsyncGenerator[bytes]:
+    """Yield a stream unchanged and add its SHA-256 to metadata at the end.
+
+    The hash is updated in the executor as each chunk passes, so the backup
+    is never read a second time.
+    """
+    loop = asyncio.get_running_loop()
+    digest = hashlib.sha256()
+    async for chunk in stream:
+        await loop.run_in_executor(None, digest.update, chunk)
+        yield chunk
+    metadata[METADATA_CHECKSUM] = digest.hexdigest()
+
+
+async def async_verify(
+    stream: AsyncGenerator[bytes], checksum: str, backup_id: str
+) -> AsyncGenerator[bytes]:
+    """Yield a stream unchanged and check its SHA-256 once it ends.
+
+    Chunks are passed on as they arrive, so a mismatch can only be raised
+    after the last one.
+    """
+    loop = asyncio.get_running_loop()
+    digest = hashlib.sha256()
+    async with contextlib.aclosing(stream):
+        async for chunk in stream:
+            await loop.run_in_executor(None, digest.update, chunk)
+            yield chunk
+    if digest.hexdigest() != checksum:
+        raise BackupAgentError(f"Backup {backup_id} doesn't match its checksum")
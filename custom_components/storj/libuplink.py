@@ -0,0 +1,358 @@
+"""Transport that uses the libuplink Python bindings in-process."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+import contextlib
+import ctypes
+import logging
+from types import ModuleType
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DOWNLOAD_CHUNK_SIZE
+from .transport import (
+    ObjectNotFoundError,
+    StorjObject,
+    StorjTransport,
+    UplinkError,
+    UploadTuning,
+    listed_metadata,
+    unpack_metadata,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LibUplinkTransport(StorjTransport):
+    """Transport backed by one long-lived libuplink project.
+
+    The bindings are only imported when the first operation runs, so the
+    integration loads without them. Every libuplink call blocks, so each one
+    runs in the executor; the project and its satellite connections are
+    reused until the transport is closed. Metadata is replaced in place if
+    the library the bindings loaded can update it, which is known once the
+    project is open.
+    """
+
+    writes_metadata_last = True
+
+    def __init__(self, hass: HomeAssistant, access_grant: str, bucket_name: str):
+        """Initialize."""
+        super().__init__(bucket_name)
+        self._hass = hass
+        self._access_grant = access_grant
+        self._bindings: _Bindings | None = None
+        self._project: Any = None
+        self._lock = asyncio.Lock()
+
+    async def async_connect(self) -> None:
+        """Open the project, if it isn't open yet."""
+        async with self._lock:
+            if self._project is None:
+                self._bindings, self._project = await self._hass.async_add_executor_job(
+                    _open_project, self._access_grant
+                )
+                self.replaces_metadata_in_place = _can_update_metadata(self._project)
+
+    async def _async_call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking call with the project, translating libuplink errors."""
+        await self.async_connect()
+        assert self._bindings
+        try:
+            return await self._hass.async_add_executor_job(func, self._project, *args)
+        except self._bindings.errors.ObjectNotFoundError as err:
+            raise ObjectNotFoundError(f"libuplink error: {err}") from err
+        except self._bindings.errors.StorjException as err:
+            raise UplinkError(f"libuplink error: {err}") from err
+
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Return whether the access grant opens a project with the bucket."""
+        try:
+            bindings, project = await self._hass.async_add_executor_job(
+                _open_project, access_grant
+            )
+        except UplinkError:
+            return False
+        try:
+            await self._hass.async_add_executor_job(
+                project.stat_bucket, self.bucket_name
+            )
+        except bindings.errors.StorjException:
+            return False
+        finally:
+            await self._hass.async_add_executor_job(project.close)
+        return True
+
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects directly under a prefix."""
+
+        def _list(project: Any) -> list[StorjObject]:
+            assert self._bindings
+            options = self._bindings.module_classes.ListObjectsOptions(
+                prefix=prefix, recursive=False, system=True, custom=include_metadata
+            )
+            return [
+                StorjObject(
+                    key=ob.key.removeprefix(prefix),
+                    size=ob.system.content_length,
+                    created=_format_created(ob.system.created),
+                    metadata=(
+                        listed_metadata(_metadata_dict(ob.custom))
+                        if include_metadata
+                        else None
+                    ),
+                )
+                for ob in project.list_objects(self.bucket_name, options)
+                if not ob.is_prefix
+            ]
+
+        return await self._async_call(_list)
+
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the custom metadata of an object."""
+
+        def _stat(project: Any) -> dict[str, str]:
+            return unpack_metadata(
+                _metadata_dict(project.stat_object(self.bucket_name, key).custom)
+            )
+
+        return await self._async_call(_stat)
+
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+        async with contextlib.aclosing(self.async_stream(key)) as stream:
+            return b"".join([chunk async for chunk in stream])
+
+    async def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of an object, one executor read per chunk."""
+
+        def _open(project: Any) -> tuple[Any, int]:
+            assert self._bindings
+            size = project.stat_object(self.bucket_name, key).system.content_length
+            remaining = max(size - offset, 0)
+            if length is not None:
+                remaining = min(remaining, length)
+            download = project.download_object(
+                self.bucket_name,
+                key,
+                self._bindings.module_classes.DownloadOptions(
+                    offset=offset, length=-1 if length is None else length
+                ),
+            )
+            return download, remaining
+
+        download, remaining = await self._async_call(_open)
+        try:
+            while remaining > 0:
+                chunk = await self._async_call(
+                    _read_chunk, download, min(remaining, DOWNLOAD_CHUNK_SIZE)
+                )
+                if not chunk:
+                    raise UplinkError(f"Unable to download {key}")
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await self._async_call(lambda project: download.close())
+
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload a small object without metadata."""
+        await self.async_write(key, _iter_bytes(data), None, UploadTuning(1))
+
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream, committing the object only once it is complete.
+
+        libuplink splits uploads into segments itself, so the uplink CLI
+        tuning doesn't apply.
+        """
+        upload = await self._async_call(
+            lambda project: project.upload_object(self.bucket_name, key)
+        )
+        written = 0
+        committed = False
+        try:
+            async for chunk in stream:
+                await self._async_call(_write_chunk, upload, chunk)
+                written += len(chunk)
+            if metadata is not None:
+                await self._async_call(_set_metadata, self._bindings, upload, metadata)
+            await self._async_call(lambda project: upload.commit())
+            committed = True
+        finally:
+            if not committed:
+                with contextlib.suppress(UplinkError):
+                    await self._async_call(lambda project: upload.abort())
+        return written
+
+    async def async_delete(self, key: str) -> None:
+        """Delete an object."""
+        await self._async_call(
+            lambda project: project.delete_object(self.bucket_name, key)
+        )
+
+    async def async_replace_metadata(self, key: str, metadata: dict[str, str]) -> None:
+        """Replace the custom metadata of an object, in place if libuplink can."""
+        await self.async_connect()
+        if not self.replaces_metadata_in_place:
+            await super().async_replace_metadata(key, metadata)
+            return
+        await self._async_call(
+            _update_metadata, self._bindings, self.bucket_name, key, metadata
+        )
+
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix."""
+
+        def _delete(project: Any) -> None:
+            assert self._bindings
+            options = self._bindings.module_classes.ListObjectsOptions(
+                prefix=prefix, recursive=True
+            )
+            for ob in project.list_objects(self.bucket_name, options):
+                project.delete_object(self.bucket_name, ob.key)
+
+        await self._async_call(_delete)
+
+    async def async_close(self) -> None:
+        """Close the project and its connections."""
+        async with self._lock:
+            if self._project is None:
+                return
+            project, self._project = self._project, None
+        with contextlib.suppress(Exception):
+            await self._hass.async_add_executor_job(project.close)
+
+
+class _Bindings:
+    """The libuplink modules, imported on first use."""
+
+    def __init__(
+        self,
+        uplink: ModuleType,
+        module_classes: ModuleType,
+        module_def: ModuleType,
+        errors: ModuleType,
+    ):
+        """Initialize."""
+        self.uplink = uplink
+        self.module_classes = module_classes
+        self.module_def = module_def
+        self.errors = errors
+
+
+def _import_bindings() -> _Bindings:
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        from uplink_python import errors, module_classes, module_def, uplink
+    except ImportError as err:
+        raise UplinkError("The uplink-python bindings are not installed") from err
+    return _Bindings(uplink, module_classes, module_def, errors)
+
+
+def _open_project(access_grant: str) -> tuple[_Bindings, Any]:
+    """Parse an access grant and open a project with it."""
+    bindings = _import_bindings()
+    try:
+        access = bindings.uplink.Uplink().parse_access(access_grant)
+        return bindings, access.open_project()
+    except bindings.errors.StorjException as err:
+        raise UplinkError(f"Unable to open project: {err}") from err
+
+
+def _read_chunk(project: Any, download: Any, size: int) -> bytes:
+    data, read = download.read(size)
+    return data[:read]
+
+
+def _write_chunk(project: Any, upload: Any, chunk: bytes) -> None:
+    view = memoryview(chunk)
+    while view:
+        view = view[upload.write(bytes(view), len(view)) :]
+
+
+def _set_metadata(
+    project: Any, bindings: _Bindings, upload: Any, metadata: dict[str, str]
+) -> None:
+    upload.set_custom_metadata(_custom_metadata(bindings, metadata))
+
+
+def _custom_metadata(bindings: _Bindings, metadata: dict[str, str]) -> Any:
+    classes = bindings.module_classes
+    entries = [
+        classes.CustomMetadataEntry(
+            key=key,
+            key_length=len(key.encode()),
+            value=value,
+            value_length=len(value.encode()),
+        )
+        for key, value in metadata.items()
+    ]
+    return classes.CustomMetadata(entries, len(entries))
+
+
+def _can_update_metadata(project: Any) -> bool:
+    """Return whether the loaded libuplink can update metadata in place."""
+    return hasattr(project.uplink.m_libuplink, "uplink_update_object_metadata")
+
+
+def _update_metadata(
+    project: Any,
+    bindings: _Bindings,
+    bucket_name: str,
+    key: str,
+    metadata: dict[str, str],
+) -> None:
+    """Replace an object's custom metadata with uplink_update_object_metadata.
+
+    uplink-python doesn't wrap it, so it is called through the library the
+    bindings loaded, the way the bindings call the rest of libuplink.
+    """
+    structs = bindings.module_def
+    update = project.uplink.m_libuplink.uplink_update_object_metadata
+    update.argtypes = [
+        ctypes.POINTER(structs._ProjectStruct),
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+        structs._CustomMetadataStruct,
+        ctypes.c_void_p,
+    ]
+    update.restype = ctypes.POINTER(structs._Error)
+    error = update(
+        project.project,
+        bucket_name.encode(),
+        key.encode(),
+        _custom_metadata(bindings, metadata).get_structure(),
+        None,
+    )
+    if error:
+        raise bindings.errors._storj_exception(
+            error.contents.code, error.contents.message.decode()
+        )
+
+
+def _metadata_dict(custom: Any) -> dict[str, str]:
+    if custom is None:
+        return {}
+    return {entry.key: entry.value for entry in custom.entries or []}
+
+
+def _format_created(created: int) -> str:
+    """Format a creation time the way `uplink ls` does."""
+    return dt_util.utc_from_timestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+
+
+async def _iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+    yield data
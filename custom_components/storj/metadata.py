@@ -0,0 +1,88 @@
+"""Encoding of backups in the custom metadata of Storj objects."""
+
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any
+import zlib
+
+from homeassistant.components.backup import AgentBackup
+from json_flatten import unflatten
+
+from .const import (
+    METADATA_BACKUP,
+    METADATA_BACKUP_ID,
+    METADATA_CHECKSUM,
+    METADATA_CODEC,
+    METADATA_DATE,
+    METADATA_SIZE,
+    METADATA_VERSION,
+    METADATA_VERSION_KEY,
+)
+from .transport import UplinkError
+
+# Keys that describe the stored object rather than the backup, kept as they
+# are when a backup's metadata is rewritten.
+OBJECT_KEYS = (METADATA_CODEC, METADATA_CHECKSUM)
+
+
+def encode_backup(backup: AgentBackup) -> dict[str, str]:
+    """Return the metadata that stores a backup.
+
+    The whole backup is one compressed JSON value; its ID, date and size
+    are repeated under their own keys, so they can be read without it.
+    """
+    return {
+        METADATA_VERSION_KEY: str(METADATA_VERSION),
+        METADATA_BACKUP: base64.b64encode(
+            zlib.compress(json.dumps(backup.as_dict()).encode())
+        ).decode(),
+        METADATA_BACKUP_ID: backup.backup_id,
+        METADATA_DATE: backup.date,
+        METADATA_SIZE: str(backup.size),
+    }
+
+
+def decode_backup(metadata: dict[str, str]) -> AgentBackup | None:
+    """Return the backup stored in an object's metadata, if it holds one.
+
+    Backups uploaded before the metadata was versioned store one key per
+    field, flattened by json_flatten, and are still read. Metadata of a newer
+    version, or that is corrupt, raises UplinkError.
+    """
+    if (version := metadata.get(METADATA_VERSION_KEY)) is None:
+        return _decode_flattened(metadata)
+    if version != str(METADATA_VERSION):
+        raise UplinkError(f"Unsupported backup metadata version {version}")
+    try:
+        backup: dict[str, Any] = json.loads(
+            zlib.decompress(base64.b64decode(metadata[METADATA_BACKUP]))
+        )
+        return AgentBackup.from_dict(backup)
+    except (KeyError, TypeError, ValueError, zlib.error) as err:
+        raise UplinkError("Unable to read backup metadata") from err
+
+
+def is_flattened(metadata: dict[str, str]) -> bool:
+    """Return whether metadata holds a backup in the flattened format."""
+    return METADATA_VERSION_KEY not in metadata and (
+        _decode_flattened(metadata) is not None
+    )
+
+
+def reencode(metadata: dict[str, str]) -> dict[str, str]:
+    """Return flattened backup metadata in the current format."""
+    backup = _decode_flattened(metadata)
+    assert backup is not None
+    return {
+        **{key: metadata[key] for key in OBJECT_KEYS if key in metadata},
+        **encode_backup(backup),
+    }
+
+
+def _decode_flattened(metadata: dict[str, str]) -> AgentBackup | None:
+    metadata_dict = unflatten(metadata)
+    if "homeassistant_version" not in metadata_dict.keys():
+        return None
+    return AgentBackup.from_dict(metadata_dict)
@@ -0,0 +1,90 @@
+"""Retention policies for pruning Storj backups."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from homeassistant.components.backup import AgentBackup
+from homeassistant.util import dt as dt_util
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Which backups to keep.
+
+    A backup is kept if any rule keeps it: the newest keep_last backups, and
+    the newest backup of each of the last keep_daily days, keep_weekly ISO
+    weeks and keep_monthly months that have a backup. A policy without any
+    of these rules keeps every backup. max_bytes then drops the oldest kept
+    backups until the total size fits, but never the newest backup.
+    """
+
+    keep_last: int = 0
+    keep_daily: int = 0
+    keep_weekly: int = 0
+    keep_monthly: int = 0
+    max_bytes: int | None = None
+
+
+@dataclass(frozen=True)
+class PruneReport:
+    """The outcome of pruning a bucket."""
+
+    deleted: list[AgentBackup] = field(default_factory=list)
+    failed: list[AgentBackup] = field(default_factory=list)
+    # Sum of the sizes of the deleted backups, as Home Assistant reports them.
+    bytes_reclaimed: int = 0
+    # Seconds from the listing until the last deletion finished.
+    duration: float = 0.0
+
+
+def select_backups_to_prune(
+    backups: list[AgentBackup], policy: RetentionPolicy
+) -> list[AgentBackup]:
+    """Return the backups the policy doesn't keep, oldest first."""
+    newest_first = sorted(backups, key=_backup_date, reverse=True)
+    if (
+        policy.keep_last
+        or policy.keep_daily
+        or policy.keep_weekly
+        or policy.keep_monthly
+    ):
+        kept = {backup.backup_id for backup in newest_first[: policy.keep_last]}
+        for count, period in (
+            (policy.keep_daily, lambda date: date.date()),
+            (policy.keep_weekly, lambda date: date.isocalendar()[:2]),
+            (policy.keep_monthly, lambda date: (date.year, date.month)),
+        ):
+            kept.update(_newest_per_period(newest_first, count, period))
+    else:
+        kept = {backup.backup_id for backup in newest_first}
+
+    if policy.max_bytes is not None:
+        remaining = [backup for backup in newest_first if backup.backup_id in kept]
+        total = 0
+        for index, backup in enumerate(remaining):
+            total += backup.size
+            if index and total > policy.max_bytes:
+                kept.difference_update(older.backup_id for older in remaining[index:])
+                break
+
+    return [backup for backup in reversed(newest_first) if backup.backup_id not in kept]
+
+
+def _newest_per_period(
+    newest_first: list[AgentBackup], count: int, period: Callable[[datetime], object]
+) -> set[str]:
+    """Return the newest backup_id of each of the last count periods."""
+    kept: dict[object, str] = {}
+    for backup in newest_first:
+        if len(kept) == count:
+            break
+        kept.setdefault(period(_backup_date(backup)), backup.backup_id)
+    return set(kept.values())
+
+
+def _backup_date(backup: AgentBackup) -> datetime:
+    """Return when a backup was made, in local time, so days end at midnight."""
+    return dt_util.as_local(dt_util.parse_datetime(backup.date, raise_on_error=True))
@@ -0,0 +1,492 @@
+"""Transport that talks to Storj's S3-compatible gateway."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Mapping
+from dataclasses import replace
+import hashlib
+import hmac
+from http import HTTPStatus
+import logging
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout
+from yarl import URL
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DEFAULT_S3_REGION,
+    DOWNLOAD_CHUNK_SIZE,
+    PACKED_METADATA_KEY,
+    S3_PART_SIZE,
+)
+from .transport import (
+    ChunkReader,
+    ObjectNotFoundError,
+    StorjObject,
+    StorjTransport,
+    UplinkError,
+    UploadTuning,
+    listed_metadata,
+    pack_metadata,
+    unpack_metadata,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+META_PREFIX = "x-amz-meta-"
+XMLNS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+class S3Transport(StorjTransport):
+    """Transport that sends signed S3 requests through an aiohttp session.
+
+    Home Assistant's shared session keeps connections to the gateway alive
+    between requests. Uploads larger than one part are sent as a multipart
+    upload with the parts in flight at once, so at most parallelism parts
+    are held in memory.
+    """
+
+    replaces_metadata_in_place = True
+
+    def __init__(
+        self,
+        session: ClientSession,
+        endpoint: str,
+        access_key_id: str,
+        secret_access_key: str,
+        bucket_name: str,
+        region: str = DEFAULT_S3_REGION,
+        part_size: int = S3_PART_SIZE,
+    ) -> None:
+        """Initialize."""
+        super().__init__(bucket_name)
+        self._session = session
+        self._endpoint = URL(endpoint)
+        self._access_key_id = access_key_id
+        self._secret_access_key = secret_access_key
+        self._region = region
+        self._part_size = part_size
+
+    async def _request(
+        self,
+        method: str,
+        key: str | None = None,
+        params: Mapping[str, str] | None = None,
+        headers: Mapping[str, str] | None = None,
+        data: bytes | None = None,
+        unsigned_payload: bool = False,
+    ) -> ClientResponse:
+        """Send a signed request for the bucket, or one of its objects.
+
+        An unsigned payload skips hashing the body, which is what keeps large
+        parts from blocking the event loop. The caller releases the response.
+        """
+        path = f"/{quote(self.bucket_name, safe='')}"
+        if key is not None:
+            path += f"/{quote(key, safe='/-_.~')}"
+        query = canonical_query(params or {})
+        url = self._endpoint.with_path(
+            self._endpoint.path.rstrip("/") + path, encoded=True
+        ).with_query(None)
+        if query:
+            url = URL(f"{url}?{query}", encoded=True)
+
+        request_headers = {
+            "host": url.raw_authority,
+            "x-amz-content-sha256": _payload_hash(data, unsigned_payload),
+            "x-amz-date": dt_util.utcnow().strftime("%Y%m%dT%H%M%SZ"),
+            **{name.lower(): value for name, value in (headers or {}).items()},
+        }
+        request_headers["authorization"] = sign_request(
+            method,
+            url.raw_path,
+            query,
+            request_headers,
+            self._access_key_id,
+            self._secret_access_key,
+            self._region,
+        )
+        try:
+            return await self._session.request(
+                method,
+                url,
+                headers=request_headers,
+                data=data,
+                skip_auto_headers=["Content-Type"],
+                timeout=ClientTimeout(total=None, sock_connect=30, sock_read=300),
+            )
+        except (ClientError, TimeoutError) as err:
+            raise UplinkError(f"Unable to reach the S3 gateway: {err}") from err
+
+    async def _request_ok(
+        self,
+        method: str,
+        key: str | None = None,
+        params: Mapping[str, str] | None = None,
+        headers: Mapping[str, str] | None = None,
+        data: bytes | None = None,
+        message: str = "S3 request failed",
+        unsigned_payload: bool = False,
+    ) -> ClientResponse:
+        response = await self._request(
+            method, key, params, headers, data, unsigned_payload
+        )
+        if response.status >= 300:
+            response.release()
+            if response.status == HTTPStatus.NOT_FOUND:
+                raise ObjectNotFoundError(f"{message} (HTTP {response.status})")
+            raise UplinkError(f"{message} (HTTP {response.status})")
+        return response
+
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Return whether the credentials can reach the bucket.
+
+        The gateway uses its own credentials, so the access grant is unused.
+        """
+        try:
+            response = await self._request("HEAD")
+        except UplinkError:
+            return False
+        response.release()
+        return response.status == 200
+
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects under a prefix with ListObjectsV2.
+
+        With include_metadata the listing asks for user metadata with the
+        `metadata=true` extension of MinIO based gateways. A gateway that
+        ignores it leaves the metadata unset.
+        """
+        return [
+            replace(ob, key=ob.key.removeprefix(prefix))
+            for ob in await self._list_objects(prefix, "/", include_metadata)
+        ]
+
+    async def _list_objects(
+        self, prefix: str, delimiter: str | None, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        params = {"list-type": "2", "prefix": prefix}
+        if delimiter:
+            params["delimiter"] = delimiter
+        if include_metadata:
+            params["metadata"] = "true"
+        objects: list[StorjObject] = []
+        while True:
+            response = await self._request_ok(
+                "GET", params=params, message=f"Unable to list {prefix}"
+            )
+            async with response:
+                body = await response.read()
+            try:
+                root = ElementTree.fromstring(body)
+            except ElementTree.ParseError as err:
+                raise UplinkError(f"Unable to read the listing of {prefix}") from err
+            objects.extend(
+                StorjObject(
+                    key=contents.findtext(f"{XMLNS}Key", ""),
+                    size=int(contents.findtext(f"{XMLNS}Size", "0")),
+                    created=_format_created(
+                        contents.findtext(f"{XMLNS}LastModified", "")
+                    ),
+                    metadata=_user_metadata(contents.find(f"{XMLNS}UserMetadata")),
+                )
+                for contents in root.iter(f"{XMLNS}Contents")
+            )
+            token = root.findtext(f"{XMLNS}NextContinuationToken")
+            if root.findtext(f"{XMLNS}IsTruncated") != "true" or not token:
+                return objects
+            params = {**params, "continuation-token": token}
+
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the x-amz-meta-* headers of an object."""
+        response = await self._request_ok(
+            "HEAD", key, message=f"Unable to fetch metadata for {key}"
+        )
+        response.release()
+        return unpack_metadata(
+            {
+                name.lower().removeprefix(META_PREFIX): value
+                for name, value in response.headers.items()
+                if name.lower().startswith(META_PREFIX)
+            }
+        )
+
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+        response = await self._request_ok(
+            "GET", key, message=f"Unable to download {key}"
+        )
+        async with response:
+            try:
+                return await response.read()
+            except (ClientError, TimeoutError) as err:
+                raise UplinkError(f"Unable to download {key}") from err
+
+    async def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of an object as the response body arrives."""
+        headers = {}
+        if offset or length is not None:
+            end = "" if length is None else str(offset + length - 1)
+            headers["range"] = f"bytes={offset}-{end}"
+        response = await self._request_ok(
+            "GET", key, headers=headers, message=f"Unable to download {key}"
+        )
+        async with response:
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    yield chunk
+            except (ClientError, TimeoutError) as err:
+                raise UplinkError(f"Unable to download {key}") from err
+
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload a small object without metadata."""
+        response = await self._request_ok(
+            "PUT", key, data=data, message=f"Unable to upload {key}"
+        )
+        response.release()
+
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream, as a multipart upload if it spans several parts.
+
+        A stream that fits in one part is read before its metadata is packed,
+        so entries added to the metadata while streaming are stored.
+        """
+        reader = ChunkReader(stream)
+        first = await reader.read(self._part_size)
+        at_eof = await reader.at_eof()
+        headers = {}
+        if metadata:
+            headers[f"{META_PREFIX}{PACKED_METADATA_KEY}"] = pack_metadata(metadata)
+
+        if at_eof:
+            response = await self._request_ok(
+                "PUT",
+                key,
+                headers=headers,
+                data=first,
+                message="Unable to complete upload",
+                unsigned_payload=True,
+            )
+            response.release()
+            return len(first)
+
+        response = await self._request_ok(
+            "POST",
+            key,
+            params={"uploads": ""},
+            headers=headers,
+            message="Unable to complete upload",
+        )
+        async with response:
+            upload_id = ElementTree.fromstring(await response.read()).findtext(
+                f"{XMLNS}UploadId"
+            )
+        if not upload_id:
+            raise UplinkError("Unable to complete upload")
+
+        try:
+            etags, written = await self._upload_parts(
+                key, upload_id, first, reader, max(tuning.parallelism, 1)
+            )
+            response = await self._request_ok(
+                "POST",
+                key,
+                params={"uploadId": upload_id},
+                data=_complete_body(etags),
+                message="Unable to complete upload",
+            )
+            response.release()
+        except BaseException:
+            try:
+                response = await self._request("DELETE", key, {"uploadId": upload_id})
+                response.release()
+            except UplinkError:
+                _LOGGER.warning("Unable to abort the multipart upload of %s", key)
+            raise
+        return written
+
+    async def _upload_parts(
+        self,
+        key: str,
+        upload_id: str,
+        first: bytes,
+        reader: ChunkReader,
+        parallelism: int,
+    ) -> tuple[list[str], int]:
+        """Upload the parts of a multipart upload and return their ETags."""
+        semaphore = asyncio.Semaphore(parallelism)
+        etags: dict[int, str] = {}
+
+        async def _upload_part(number: int, data: bytes) -> None:
+            try:
+                response = await self._request_ok(
+                    "PUT",
+                    key,
+                    params={"partNumber": str(number), "uploadId": upload_id},
+                    data=data,
+                    message="Unable to complete upload",
+                    unsigned_payload=True,
+                )
+                response.release()
+                etags[number] = response.headers["ETag"]
+            finally:
+                semaphore.release()
+
+        tasks: list[asyncio.Task[None]] = []
+        written = 0
+        data, number = first, 1
+        try:
+            while data:
+                # Wait for a free slot before reading, to bound the buffered parts.
+                await semaphore.acquire()
+                if failed := [
+                    task for task in tasks if task.done() and task.exception()
+                ]:
+                    semaphore.release()
+                    await failed[0]
+                tasks.append(asyncio.create_task(_upload_part(number, data)))
+                written += len(data)
+                data, number = await reader.read(self._part_size), number + 1
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return [etags[number] for number in sorted(etags)], written
+
+    async def async_replace_metadata(self, key: str, metadata: dict[str, str]) -> None:
+        """Replace the metadata of an object by copying it onto itself."""
+        response = await self._request_ok(
+            "PUT",
+            key,
+            headers={
+                "x-amz-copy-source": quote(f"/{self.bucket_name}/{key}", safe="/-_.~"),
+                "x-amz-metadata-directive": "REPLACE",
+                f"{META_PREFIX}{PACKED_METADATA_KEY}": pack_metadata(metadata),
+            },
+            message=f"Unable to replace the metadata of {key}",
+        )
+        response.release()
+
+    def wrote_metadata_last(self, size: int) -> bool:
+        """Return whether a write of this many bytes was one PUT, sent last."""
+        return size <= self._part_size
+
+    async def async_delete(self, key: str) -> None:
+        """Delete an object."""
+        response = await self._request_ok(
+            "DELETE", key, message=f"Unable to delete {key}"
+        )
+        response.release()
+
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix."""
+        for ob in await self._list_objects(prefix, None):
+            await self.async_delete(ob.key)
+
+
+def canonical_query(params: Mapping[str, str]) -> str:
+    """Return a query string in SigV4 canonical form."""
+    return "&".join(
+        f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+        for name, value in sorted(params.items())
+    )
+
+
+def sign_request(
+    method: str,
+    path: str,
+    query: str,
+    headers: Mapping[str, str],
+    access_key_id: str,
+    secret_access_key: str,
+    region: str,
+) -> str:
+    """Return the AWS Signature Version 4 Authorization header for a request.
+
+    Every header given is signed; names must be lowercase and include host,
+    x-amz-date and x-amz-content-sha256.
+    """
+    amz_date = headers["x-amz-date"]
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    signed_headers = ";".join(sorted(headers))
+    canonical_request = "\n".join(
+        [
+            method,
+            path,
+            query,
+            "".join(
+                f"{name}:{' '.join(str(headers[name]).split())}\n"
+                for name in sorted(headers)
+            ),
+            signed_headers,
+            headers["x-amz-content-sha256"],
+        ]
+    )
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+    key = f"AWS4{secret_access_key}".encode()
+    for part in (amz_date[:8], region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return (
+        f"AWS4-HMAC-SHA256 Credential={access_key_id}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+
+
+def _payload_hash(data: bytes | None, unsigned: bool) -> str:
+    if unsigned:
+        return UNSIGNED_PAYLOAD
+    return hashlib.sha256(data).hexdigest() if data is not None else EMPTY_SHA256
+
+
+def _complete_body(etags: list[str]) -> bytes:
+    root = ElementTree.Element("CompleteMultipartUpload")
+    for number, etag in enumerate(etags, start=1):
+        part = ElementTree.SubElement(root, "Part")
+        ElementTree.SubElement(part, "PartNumber").text = str(number)
+        ElementTree.SubElement(part, "ETag").text = etag
+    return ElementTree.tostring(root)
+
+
+def _user_metadata(element: ElementTree.Element | None) -> dict[str, str] | None:
+    """Return the x-amz-meta-* entries of a listing's UserMetadata element."""
+    if element is None:
+        return None
+    metadata = {}
+    for child in element:
+        name = child.tag.rpartition("}")[2].lower()
+        if name.startswith(META_PREFIX):
+            metadata[name.removeprefix(META_PREFIX)] = child.text or ""
+    return listed_metadata(metadata)
+
+
+def _format_created(last_modified: str) -> str:
+    """Format a LastModified time the way `uplink ls` formats creation times."""
+    if (created := dt_util.parse_datetime(last_modified)) is None:
+        return last_modified
+    return dt_util.as_utc(created).strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,188 @@
+"""Scheduler shared by the Storj config entries to bound uplink operations."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator
+import contextlib
+import time
+from typing import Any
+
+from .const import (
+    SCHEDULER_INTERACTIVE_SLOTS,
+    SCHEDULER_TRANSFER_SLOTS,
+    SMALL_OBJECT_SIZE,
+)
+from .transport import StorjObject, StorjTransport, UploadTuning
+
+INTERACTIVE = "interactive"
+TRANSFER = "transfer"
+
+
+class SchedulerLane:
+    """A bounded number of operations of one kind, with queue statistics."""
+
+    def __init__(self, slots: int) -> None:
+        """Initialize."""
+        self.slots = slots
+        self._semaphore = asyncio.Semaphore(slots)
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self) -> AsyncIterator[None]:
+        """Wait for a free slot and hold it for the duration of the block."""
+        start = time.monotonic()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        wait = time.monotonic() - start
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, Any]:
+        """Return the queue depth and wait times of the lane."""
+        return {
+            "slots": self.slots,
+            "active": self.active,
+            "queued": self.queued,
+            "completed": self.completed,
+            "average_wait": (
+                self.total_wait / self.completed if self.completed else 0.0
+            ),
+            "max_wait": self.max_wait,
+        }
+
+
+class UplinkScheduler:
+    """Caps the uplink operations of every config entry together.
+
+    Interactive operations (listing, metadata and small objects) and
+    transfers each have their own lane, so a Backups page load never queues
+    behind a long upload or download.
+    """
+
+    def __init__(
+        self,
+        interactive_slots: int = SCHEDULER_INTERACTIVE_SLOTS,
+        transfer_slots: int = SCHEDULER_TRANSFER_SLOTS,
+    ) -> None:
+        """Initialize."""
+        self.lanes = {
+            INTERACTIVE: SchedulerLane(interactive_slots),
+            TRANSFER: SchedulerLane(transfer_slots),
+        }
+
+    def async_slot(self, lane: str) -> contextlib.AbstractAsyncContextManager[None]:
+        """Return a context manager that holds a slot in a lane."""
+        return self.lanes[lane].async_slot()
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Return the statistics of every lane."""
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+class ScheduledTransport(StorjTransport):
+    """Runs each operation of another transport in a scheduler lane.
+
+    Streams hold their slot until they are exhausted or closed.
+    """
+
+    def __init__(self, transport: StorjTransport, scheduler: UplinkScheduler) -> None:
+        """Initialize."""
+        super().__init__(transport.bucket_name)
+        self.transport = transport
+        self.replaces_metadata_in_place = transport.replaces_metadata_in_place
+        self.writes_metadata_last = transport.writes_metadata_last
+        self._scheduler = scheduler
+
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Return whether the access grant can be used."""
+        async with self._scheduler.async_slot(INTERACTIVE):
+            return await self.transport.async_authenticate(access_grant)
+
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects directly under a prefix."""
+        async with self._scheduler.async_slot(INTERACTIVE):
+            return await self.transport.async_list(prefix, include_metadata)
+
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the custom metadata of an object."""
+        async with self._scheduler.async_slot(INTERACTIVE):
+            return await self.transport.async_get_metadata(key)
+
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+        async with self._scheduler.async_slot(INTERACTIVE):
+            return await self.transport.async_read(key)
+
+    async def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of an object while holding a transfer slot."""
+        async with (
+            self._scheduler.async_slot(TRANSFER),
+            contextlib.aclosing(
+                self.transport.async_stream(key, offset, length)
+            ) as stream,
+        ):
+            async for chunk in stream:
+                yield chunk
+
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload an object without metadata.
+
+        Indexes and manifests are interactive; larger objects, such as
+        deduplicated chunks, are transfers.
+        """
+        lane = INTERACTIVE if len(data) <= SMALL_OBJECT_SIZE else TRANSFER
+        async with self._scheduler.async_slot(lane):
+            await self.transport.async_put(key, data)
+
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream while holding a transfer slot."""
+        async with self._scheduler.async_slot(TRANSFER):
+            return await self.transport.async_write(key, stream, metadata, tuning)
+
+    def wrote_metadata_last(self, size: int) -> bool:
+        """Return whether a write of this many bytes stored metadata last."""
+        return self.transport.wrote_metadata_last(size)
+
+    async def async_delete(self, key: str) -> None:
+        """Delete an object."""
+        async with self._scheduler.async_slot(INTERACTIVE):
+            await self.transport.async_delete(key)
+
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix."""
+        async with self._scheduler.async_slot(INTERACTIVE):
+            await self.transport.async_delete_prefix(prefix)
+
+    async def async_replace_metadata(self, key: str, metadata: dict[str, str]) -> None:
+        """Replace the custom metadata of a small object, or of any in place."""
+        async with self._scheduler.async_slot(INTERACTIVE):
+            await self.transport.async_replace_metadata(key, metadata)
+
+    async def async_close(self) -> None:
+        """Close the wrapped transport."""
+        await self.transport.async_close()
@@ -0,0 +1,149 @@
+"""Sensor platform for the Storj integration."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import (
+    EntityCategory,
+    UnitOfDataRate,
+    UnitOfInformation,
+    UnitOfTime,
+)
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import StateType
+
+from . import StorjConfigEntry
+from .const import DOMAIN
+from .stats import DELETE, DOWNLOAD, LIST, UPLOAD, ClientStats
+
+
+@dataclass(frozen=True, kw_only=True)
+class StorjSensorEntityDescription(SensorEntityDescription):
+    """Describes a Storj sensor."""
+
+    value_fn: Callable[[ClientStats], StateType]
+
+
+def _throughput(
+    key: str, value_fn: Callable[[ClientStats], StateType]
+) -> StorjSensorEntityDescription:
+    return StorjSensorEntityDescription(
+        key=key,
+        translation_key=key,
+        device_class=SensorDeviceClass.DATA_RATE,
+        native_unit_of_measurement=UnitOfDataRate.BYTES_PER_SECOND,
+        suggested_unit_of_measurement=UnitOfDataRate.MEGABITS_PER_SECOND,
+        suggested_display_precision=1,
+        value_fn=value_fn,
+    )
+
+
+def _duration(
+    key: str, value_fn: Callable[[ClientStats], StateType]
+) -> StorjSensorEntityDescription:
+    return StorjSensorEntityDescription(
+        key=key,
+        translation_key=key,
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        suggested_display_precision=1,
+        value_fn=value_fn,
+    )
+
+
+def _errors(operation: str) -> StorjSensorEntityDescription:
+    return StorjSensorEntityDescription(
+        key=f"{operation}_errors",
+        translation_key=f"{operation}_errors",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda stats: stats.errors[operation],
+    )
+
+
+SENSORS: tuple[StorjSensorEntityDescription, ...] = (
+    _throughput("upload_throughput", lambda stats: stats.upload_throughput),
+    _duration("upload_duration", lambda stats: stats.upload_duration),
+    _throughput("download_throughput", lambda stats: stats.download_throughput),
+    _duration("download_duration", lambda stats: stats.download_duration),
+    StorjSensorEntityDescription(
+        key="list_latency",
+        translation_key="list_latency",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        suggested_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        suggested_display_precision=0,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        value_fn=lambda stats: stats.list_latency,
+    ),
+    StorjSensorEntityDescription(
+        key="backups",
+        translation_key="backups",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.backup_count,
+    ),
+    StorjSensorEntityDescription(
+        key="backups_size",
+        translation_key="backups_size",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        suggested_unit_of_measurement=UnitOfInformation.GIBIBYTES,
+        suggested_display_precision=2,
+        value_fn=lambda stats: stats.backups_size,
+    ),
+    *(_errors(operation) for operation in (UPLOAD, DOWNLOAD, LIST, DELETE)),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: StorjConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the Storj sensors."""
+    async_add_entities(StorjSensor(entry, description) for description in SENSORS)
+
+
+class StorjSensor(SensorEntity):
+    """A figure recorded by the Storj client of a config entry.
+
+    The client pushes every change, so the sensor never polls.
+    """
+
+    entity_description: StorjSensorEntityDescription
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+
+    def __init__(
+        self, entry: StorjConfigEntry, description: StorjSensorEntityDescription
+    ) -> None:
+        """Initialize."""
+        self.entity_description = description
+        self._stats = entry.runtime_data.stats
+        self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, entry.entry_id)},
+            name=entry.title,
+            manufacturer="Storj",
+            entry_type=DeviceEntryType.SERVICE,
+        )
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the current value."""
+        return self.entity_description.value_fn(self._stats)
+
+    async def async_added_to_hass(self) -> None:
+        """Write the state whenever the client's stats change."""
+        self.async_on_remove(self._stats.async_add_listener(self.async_write_ha_state))
@@ -0,0 +1,100 @@
+"""Transfer and bucket statistics of a Storj client."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+
+from homeassistant.core import CALLBACK_TYPE, callback
+
+from .throttle import DOWNLOAD, UPLOAD
+
+LIST = "list"
+DELETE = "delete"
+
+
+class ClientStats:
+    """Figures a client records as it works, for the sensors.
+
+    Nothing here makes calls of its own: the bucket figures come from the
+    last listing, kept up to date by the uploads and deletes since, and stay
+    unknown until the bucket has been listed once.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        # Seconds and bytes per second of the last complete transfer.
+        self.upload_duration: float | None = None
+        self.upload_throughput: float | None = None
+        self.download_duration: float | None = None
+        self.download_throughput: float | None = None
+        # Seconds the last listing of the bucket took.
+        self.list_latency: float | None = None
+        self.errors = dict.fromkeys((UPLOAD, DOWNLOAD, LIST, DELETE), 0)
+        # Size of each backup in the bucket, by object key.
+        self._backups: dict[str, int] | None = None
+        self._listeners: list[CALLBACK_TYPE] = []
+
+    @property
+    def backup_count(self) -> int | None:
+        """Return the number of backups in the bucket."""
+        return None if self._backups is None else len(self._backups)
+
+    @property
+    def backups_size(self) -> int | None:
+        """Return the total size of the backups, as Home Assistant reports them."""
+        return None if self._backups is None else sum(self._backups.values())
+
+    @callback
+    def async_add_listener(self, update_callback: CALLBACK_TYPE) -> Callable[[], None]:
+        """Call update_callback whenever a figure changes."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_record_upload(self, key: str, size: int, duration: float) -> None:
+        """Record a finished upload of a backup."""
+        self.upload_duration = duration
+        self.upload_throughput = _throughput(size, duration)
+        if self._backups is not None:
+            self._backups[key] = size
+        self._async_notify()
+
+    @callback
+    def async_record_download(self, size: int, duration: float) -> None:
+        """Record a finished download of a whole backup."""
+        self.download_duration = duration
+        self.download_throughput = _throughput(size, duration)
+        self._async_notify()
+
+    @callback
+    def async_record_listing(self, backups: dict[str, int], latency: float) -> None:
+        """Record a listing of the bucket and the size of each backup in it."""
+        self.list_latency = latency
+        self._backups = backups
+        self._async_notify()
+
+    @callback
+    def async_record_delete(self, key: str) -> None:
+        """Record a deleted backup."""
+        if self._backups is not None and self._backups.pop(key, None) is not None:
+            self._async_notify()
+
+    @callback
+    def async_record_error(self, operation: str) -> None:
+        """Count a failed operation."""
+        self.errors[operation] += 1
+        self._async_notify()
+
+    @callback
+    def _async_notify(self) -> None:
+        for update_callback in list(self._listeners):
+            update_callback()
+
+
+def _throughput(size: int, duration: float) -> float | None:
+    return size / duration if duration > 0 else None
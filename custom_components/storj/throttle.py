@@ -0,0 +1,146 @@
+"""Bandwidth limits for Storj transfers."""
+
+from __future__ import annotations
+
+from asyncio import Lock, sleep
+from collections.abc import AsyncGenerator, AsyncIterator
+from dataclasses import dataclass
+from datetime import datetime, time
+import logging
+from time import monotonic
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+
+
+@dataclass(frozen=True)
+class BandwidthSchedule:
+    """Bandwidth limits in bytes per second, 0 for unlimited.
+
+    With a start and end time the limits only apply from start until end,
+    local time, and transfers are unlimited the rest of the day. A window
+    that ends before it starts runs over midnight; one that ends when it
+    starts lasts all day.
+    """
+
+    upload: int = 0
+    download: int = 0
+    start: time | None = None
+    end: time | None = None
+
+    def limit(self, direction: str, now: datetime) -> int:
+        """Return the limit in effect for a direction at a point in time."""
+        if self.start is not None and self.end is not None and self.start != self.end:
+            current = dt_util.as_local(now).time()
+            if self.start < self.end:
+                active = self.start <= current < self.end
+            else:
+                active = current >= self.start or current < self.end
+            if not active:
+                return 0
+        return self.upload if direction == UPLOAD else self.download
+
+
+class TokenBucket:
+    """Token bucket holding up to one second of transfer at its rate.
+
+    A chunk larger than the bucket is let through and the debt is paid off
+    by sleeping before the next one, so chunks never need splitting.
+    """
+
+    def __init__(self, rate: int) -> None:
+        """Initialize."""
+        self.rate = rate
+        self._tokens = float(rate)
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def set_rate(self, rate: int) -> None:
+        """Change the rate, keeping no more than a second of tokens."""
+        self._refill()
+        self.rate = rate
+        self._tokens = min(self._tokens, float(rate))
+
+    def _refill(self) -> None:
+        now = monotonic()
+        if self.rate:
+            self._tokens = min(
+                self._tokens + (now - self._updated) * self.rate, float(self.rate)
+            )
+        self._updated = now
+
+    async def async_consume(self, amount: int) -> None:
+        """Take amount tokens, waiting while the bucket is in debt.
+
+        Callers queue on a lock, so concurrent transfers share the rate.
+        """
+        async with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens < 0 and self.rate:
+                await sleep(-self._tokens / self.rate)
+                self._refill()
+
+
+class BandwidthThrottle:
+    """Applies a bandwidth schedule to every transfer of a client.
+
+    Each direction has one token bucket shared by all of its transfers.
+    """
+
+    def __init__(self, schedule: BandwidthSchedule) -> None:
+        """Initialize."""
+        self.schedule = schedule
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def limit(self, direction: str) -> int:
+        """Return the limit in effect for a direction now, 0 for unlimited."""
+        return self.schedule.limit(direction, dt_util.now())
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Return the schedule and the limits in effect now."""
+        return {
+            "upload_limit": format_rate(self.limit(UPLOAD)),
+            "download_limit": format_rate(self.limit(DOWNLOAD)),
+            "schedule": {
+                "upload": format_rate(self.schedule.upload),
+                "download": format_rate(self.schedule.download),
+                "start": self.schedule.start and self.schedule.start.isoformat(),
+                "end": self.schedule.end and self.schedule.end.isoformat(),
+            },
+        }
+
+    async def async_consume(self, direction: str, amount: int) -> None:
+        """Wait until amount bytes may be transferred in a direction."""
+        rate = self.limit(direction)
+        bucket = self._buckets.get(direction)
+        if bucket is None or bucket.rate != rate:
+            _LOGGER.info(
+                "Storj %s bandwidth limit is now %s", direction, format_rate(rate)
+            )
+            if bucket is None:
+                bucket = self._buckets[direction] = TokenBucket(rate)
+            else:
+                bucket.set_rate(rate)
+        if rate:
+            await bucket.async_consume(amount)
+
+    async def async_throttle(
+        self, stream: AsyncIterator[bytes], direction: str
+    ) -> AsyncGenerator[bytes]:
+        """Yield a stream's chunks no faster than the limit allows."""
+        async for chunk in stream:
+            await self.async_consume(direction, len(chunk))
+            yield chunk
+
+
+def format_rate(rate: int) -> str:
+    """Describe a rate in bytes per second in Mbit/s."""
+    if not rate:
+        return "unlimited"
+    return f"{rate * 8 / 1_000_000:g} Mbit/s"
@@ -0,0 +1,194 @@
+"""Traces of Storj operations, kept in memory for the diagnostics download."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
+import contextlib
+from dataclasses import asdict, dataclass
+import logging
+import time
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+from .const import TRACE_BUFFER_SIZE, TRACE_STDERR_TAIL
+from .transport import StorjObject, StorjTransport, UplinkError, UploadTuning
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Trace:
+    """One transport operation, or one phase of a client call."""
+
+    operation: str
+    key: str | None
+    start: str
+    duration: float
+    # Bytes moved to or from the bucket, where the operation moves any.
+    size: int | None = None
+    error: str | None = None
+    # Only known for a failed uplink command.
+    exit_code: int | None = None
+    stderr: str | None = None
+
+
+class TraceBuffer:
+    """The most recent traces, oldest first."""
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE) -> None:
+        """Initialize."""
+        self._traces: deque[Trace] = deque(maxlen=size)
+
+    def record(self, trace: Trace) -> None:
+        """Add a trace, dropping the oldest one if the buffer is full."""
+        self._traces.append(trace)
+
+    def diagnostics(self) -> list[dict[str, Any]]:
+        """Return the traces for the diagnostics download."""
+        return [asdict(trace) for trace in self._traces]
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Trace and log the time spent in the block as a phase of a call."""
+        start, started = dt_util.utcnow(), time.monotonic()
+        error: str | None = None
+        try:
+            yield
+        except Exception as err:
+            error = repr(err)
+            raise
+        finally:
+            duration = time.monotonic() - started
+            self.record(Trace(name, None, start.isoformat(), duration, error=error))
+            _LOGGER.info("Storj %s took %.3fs", name, duration)
+
+
+class TracingTransport(StorjTransport):
+    """Traces each operation of another transport.
+
+    The credentials an operation is given are never part of its trace.
+    """
+
+    def __init__(self, transport: StorjTransport, traces: TraceBuffer) -> None:
+        """Initialize."""
+        super().__init__(transport.bucket_name)
+        self.transport = transport
+        self.replaces_metadata_in_place = transport.replaces_metadata_in_place
+        self.writes_metadata_last = transport.writes_metadata_last
+        self._traces = traces
+
+    @contextlib.contextmanager
+    def _trace(self, operation: str, key: str | None) -> Iterator[dict[str, Any]]:
+        """Trace the block; it may set the bytes it moved under "size"."""
+        start, started = dt_util.utcnow(), time.monotonic()
+        details: dict[str, Any] = {}
+        try:
+            yield details
+        except UplinkError as err:
+            details["error"] = str(err)
+            details["exit_code"] = err.exit_code
+            if err.stderr:
+                details["stderr"] = err.stderr[-TRACE_STDERR_TAIL:].decode(
+                    errors="replace"
+                )
+            raise
+        except asyncio.CancelledError:
+            # Cut short by a deadline, or a hedged read that lost.
+            details["error"] = "cancelled"
+            raise
+        except Exception as err:
+            details["error"] = repr(err)
+            raise
+        finally:
+            self._traces.record(
+                Trace(
+                    operation,
+                    key,
+                    start.isoformat(),
+                    time.monotonic() - started,
+                    **details,
+                )
+            )
+
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Return whether the access grant can be used."""
+        with self._trace("authenticate", None):
+            return await self.transport.async_authenticate(access_grant)
+
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects directly under a prefix."""
+        with self._trace("list", prefix):
+            return await self.transport.async_list(prefix, include_metadata)
+
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the custom metadata of an object."""
+        with self._trace("get_metadata", key):
+            return await self.transport.async_get_metadata(key)
+
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+        with self._trace("read", key) as details:
+            data = await self.transport.async_read(key)
+            details["size"] = len(data)
+            return data
+
+    async def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of an object, tracing it once it ends or is closed."""
+        with self._trace("stream", key) as details:
+            details["size"] = 0
+            async with contextlib.aclosing(
+                self.transport.async_stream(key, offset, length)
+            ) as stream:
+                async for chunk in stream:
+                    details["size"] += len(chunk)
+                    yield chunk
+
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload an object without metadata."""
+        with self._trace("put", key) as details:
+            details["size"] = len(data)
+            await self.transport.async_put(key, data)
+
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream."""
+        with self._trace("write", key) as details:
+            details["size"] = await self.transport.async_write(
+                key, stream, metadata, tuning
+            )
+            return details["size"]
+
+    def wrote_metadata_last(self, size: int) -> bool:
+        """Return whether a write of this many bytes stored metadata last."""
+        return self.transport.wrote_metadata_last(size)
+
+    async def async_delete(self, key: str) -> None:
+        """Delete an object."""
+        with self._trace("delete", key):
+            await self.transport.async_delete(key)
+
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix."""
+        with self._trace("delete_prefix", prefix):
+            await self.transport.async_delete_prefix(prefix)
+
+    async def async_replace_metadata(self, key: str, metadata: dict[str, str]) -> None:
+        """Replace the custom metadata of an object."""
+        with self._trace("replace_metadata", key):
+            await self.transport.async_replace_metadata(key, metadata)
+
+    async def async_close(self) -> None:
+        """Close the wrapped transport."""
+        await self.transport.async_close()
@@ -0,0 +1,491 @@
+"""Transports that move objects between Home Assistant and a Storj bucket."""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+import base64
+from collections.abc import AsyncGenerator, AsyncIterator
+import contextlib
+from dataclasses import dataclass
+import json
+import logging
+import zlib
+
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import DOWNLOAD_CHUNK_SIZE, PACKED_METADATA_KEY
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StorjObject:
+    """An object listed under a prefix."""
+
+    key: str
+    size: int
+    created: str
+    # Only set by a listing that includes metadata, and then only if the
+    # transport got it in the same call.
+    metadata: dict[str, str] | None = None
+
+
+@dataclass(frozen=True)
+class UploadTuning:
+    """uplink cp settings for one upload."""
+
+    parallelism: int
+    maximum_concurrent_pieces: int | None = None
+
+    def as_args(self) -> list[str]:
+        """Return the uplink cp arguments for these settings."""
+        args = ["--parallelism", str(self.parallelism)]
+        if self.maximum_concurrent_pieces:
+            args += ["--maximum-concurrent-pieces", str(self.maximum_concurrent_pieces)]
+        return args
+
+
+class StorjTransport(ABC):
+    """Reads and writes the objects of one bucket.
+
+    Keys are relative to the bucket. Every failure is raised as UplinkError.
+    """
+
+    # Whether async_replace_metadata leaves the object's data where it is.
+    replaces_metadata_in_place = False
+    # Whether async_write reads the metadata only once the stream is exhausted.
+    writes_metadata_last = False
+
+    def __init__(self, bucket_name: str) -> None:
+        """Initialize."""
+        self.bucket_name = bucket_name
+
+    @abstractmethod
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Return whether the access grant can be used."""
+
+    @abstractmethod
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects directly under a prefix, with the prefix removed.
+
+        With include_metadata, the listing asks for each object's metadata in
+        the same call, where the transport supports that.
+        """
+
+    @abstractmethod
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the custom metadata of an object."""
+
+    @abstractmethod
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+
+    @abstractmethod
+    def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield a byte range of an object in chunks of at most DOWNLOAD_CHUNK_SIZE.
+
+        Closing the iterator early releases the download.
+        """
+
+    @abstractmethod
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload a small object without metadata."""
+
+    @abstractmethod
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Upload a stream to an object and return the number of bytes written.
+
+        If writes_metadata_last is set, the metadata is read once the stream
+        is exhausted, so entries added to it while streaming are stored.
+        """
+
+    def wrote_metadata_last(self, size: int) -> bool:
+        """Return whether a write of this many bytes stored metadata last.
+
+        Some transports only do so for streams small enough to read up front.
+        """
+        return self.writes_metadata_last
+
+    @abstractmethod
+    async def async_delete(self, key: str) -> None:
+        """Delete an object."""
+
+    @abstractmethod
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix."""
+
+    async def async_replace_metadata(self, key: str, metadata: dict[str, str]) -> None:
+        """Replace the custom metadata of an object.
+
+        Unless replaces_metadata_in_place is set, this uploads the object
+        again, so it is only meant for small objects.
+        """
+        data = await self.async_read(key)
+        await self.async_write(
+            key, _iter_bytes(data), metadata, UploadTuning(parallelism=1)
+        )
+
+    async def async_close(self) -> None:
+        """Release any connections held by the transport."""
+
+
+class UplinkCliTransport(StorjTransport):
+    """Transport that runs the uplink CLI for every operation."""
+
+    def _url(self, key: str) -> str:
+        return f"sj://{self.bucket_name}/{key}"
+
+    async def async_authenticate(self, access_grant: str) -> bool:
+        """Import the access grant into uplink's configuration."""
+        result = await asyncio.create_subprocess_exec(
+            "uplink", "access", "import", "ha2", access_grant
+        )
+        await _communicate(result)
+        return result.returncode == 0
+
+    async def async_list(
+        self, prefix: str, include_metadata: bool = False
+    ) -> list[StorjObject]:
+        """Return the objects `uplink ls` reports under a prefix.
+
+        The expanded listing reports each object's metadata as well.
+        """
+        result = await asyncio.create_subprocess_exec(
+            "uplink",
+            "ls",
+            self._url(prefix),
+            "--o",
+            "json",
+            *(["--expanded"] if include_metadata else []),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await _communicate(result)
+        if (exit_code := result.returncode) != 0:
+            raise UplinkError(
+                f"Unable to list {prefix}", exit_code=exit_code, stderr=stderr
+            )
+
+        storj_objs = [json.loads(ob) for ob in stdout.decode().split("\n") if ob]
+        return [
+            StorjObject(
+                key=ob["key"],
+                size=ob["size"],
+                created=ob["created"],
+                metadata=(
+                    listed_metadata(ob["metadata"])
+                    if include_metadata and isinstance(ob.get("metadata"), dict)
+                    else None
+                ),
+            )
+            for ob in storj_objs
+            if ob.get("kind", "OBJ") == "OBJ"
+        ]
+
+    async def async_get_metadata(self, key: str) -> dict[str, str]:
+        """Return the metadata `uplink meta get` reports for an object."""
+        result = await asyncio.create_subprocess_exec(
+            "uplink",
+            "meta",
+            "get",
+            self._url(key),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await _communicate(result)
+        if (exit_code := result.returncode) != 0:
+            raise _command_error(
+                f"Unable to fetch metadata for {key}", exit_code, stderr
+            )
+
+        try:
+            return unpack_metadata(json.loads(stdout.decode()))
+        except ValueError as err:
+            raise UplinkError(f"Unable to read metadata for {key}") from err
+
+    async def async_read(self, key: str) -> bytes:
+        """Download a small object into memory."""
+        result = await asyncio.create_subprocess_exec(
+            "uplink",
+            "cp",
+            self._url(key),
+            "-",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await _communicate(result)
+        if (exit_code := result.returncode) != 0:
+            raise _command_error(f"Unable to download {key}", exit_code, stderr)
+        return stdout
+
+    async def async_stream(
+        self, key: str, offset: int = 0, length: int | None = None
+    ) -> AsyncGenerator[bytes]:
+        """Yield an object's bytes from `uplink cp` as they arrive.
+
+        The stdout buffer is bounded to a chunk, so a slow consumer stalls
+        uplink instead of the object piling up in memory. Closing or
+        cancelling the iterator kills the process.
+        """
+        args = []
+        if offset or length is not None:
+            end = "" if length is None else str(offset + length - 1)
+            args = ["--range", f"bytes={offset}-{end}"]
+        process = await asyncio.create_subprocess_exec(
+            "uplink",
+            "cp",
+            self._url(key),
+            "-",
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            limit=DOWNLOAD_CHUNK_SIZE,
+        )
+        assert process.stdout
+        finished = False
+        try:
+            while True:
+                try:
+                    chunk = await process.stdout.readexactly(DOWNLOAD_CHUNK_SIZE)
+                except asyncio.IncompleteReadError as err:
+                    chunk = err.partial
+                if not chunk:
+                    break
+                yield chunk
+
+            returncode = await process.wait()
+            finished = True
+            if returncode != 0:
+                raise UplinkError(f"Unable to download {key}", exit_code=returncode)
+        finally:
+            if not finished:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+
+    async def async_put(self, key: str, data: bytes) -> None:
+        """Upload a small object through uplink's stdin."""
+        result = await asyncio.create_subprocess_exec(
+            "uplink",
+            "cp",
+            "-",
+            self._url(key),
+            stdin=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await _communicate(result, data)
+        if (exit_code := result.returncode) != 0:
+            raise UplinkError(
+                f"Unable to upload {key}", exit_code=exit_code, stderr=stderr
+            )
+
+    async def async_write(
+        self,
+        key: str,
+        stream: AsyncIterator[bytes],
+        metadata: dict[str, str] | None,
+        tuning: UploadTuning,
+    ) -> int:
+        """Pipe a stream into `uplink cp`.
+
+        Every write waits for the pipe to drain, so memory use stays flat
+        regardless of the size of the stream.
+        """
+        args = ["--metadata", json.dumps(metadata)] if metadata is not None else []
+        process = await asyncio.create_subprocess_exec(
+            "uplink",
+            "cp",
+            "-",
+            self._url(key),
+            *args,
+            *tuning.as_args(),
+            stdin=asyncio.subprocess.PIPE,
+        )
+        assert process.stdin
+        written = 0
+        finished = False
+        try:
+            async for chunk in stream:
+                process.stdin.write(chunk)
+                written += len(chunk)
+                await process.stdin.drain()
+            process.stdin.close()
+            await process.stdin.wait_closed()
+            returncode = await process.wait()
+            finished = True
+        except (BrokenPipeError, ConnectionResetError) as err:
+            # uplink exited before reading the whole stream.
+            raise UplinkError("Unable to complete upload") from err
+        finally:
+            if not finished:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+        if returncode != 0:
+            raise UplinkError("Unable to complete upload", exit_code=returncode)
+        return written
+
+    async def async_delete(self, key: str) -> None:
+        """Delete an object with `uplink rm`."""
+        result = await asyncio.create_subprocess_exec(
+            "uplink", "rm", self._url(key), stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await _communicate(result)
+        if (exit_code := result.returncode) != 0:
+            raise _command_error(f"Unable to delete {key}", exit_code, stderr)
+
+    async def async_delete_prefix(self, prefix: str) -> None:
+        """Delete every object under a prefix with `uplink rm --recursive`."""
+        result = await asyncio.create_subprocess_exec(
+            "uplink",
+            "rm",
+            "--recursive",
+            self._url(prefix),
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await _communicate(result)
+        if (exit_code := result.returncode) != 0:
+            raise UplinkError(
+                f"Unable to delete {prefix}", exit_code=exit_code, stderr=stderr
+            )
+
+
+async def _iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def _communicate(
+    process: asyncio.subprocess.Process, data: bytes | None = None
+) -> tuple[bytes, bytes]:
+    """Wait for an uplink command to exit, killing it if the wait is cancelled."""
+    try:
+        return await process.communicate(data)
+    except asyncio.CancelledError:
+        with contextlib.suppress(ProcessLookupError):
+            process.kill()
+        await process.wait()
+        raise
+
+
+def pack_metadata(metadata: dict[str, str]) -> str:
+    """Pack metadata into one header-safe value."""
+    return base64.b64encode(zlib.compress(json.dumps(metadata).encode())).decode()
+
+
+def unpack_metadata(metadata: dict[str, str]) -> dict[str, str]:
+    """Expand metadata that was packed by pack_metadata, if any."""
+    if (packed := metadata.get(PACKED_METADATA_KEY)) is None:
+        return metadata
+    try:
+        unpacked = json.loads(zlib.decompress(base64.b64decode(packed)))
+    except (ValueError, zlib.error) as err:
+        raise CorruptMetadataError("Unable to read packed metadata") from err
+    rest = {key: value for key, value in metadata.items() if key != PACKED_METADATA_KEY}
+    return {**rest, **unpacked}
+
+
+def listed_metadata(metadata: dict[str, str]) -> dict[str, str] | None:
+    """Return the unpacked metadata of a listed object, or None if it is corrupt.
+
+    The object's metadata is then fetched on its own, which reports the error
+    for that object alone instead of failing the whole listing.
+    """
+    try:
+        return unpack_metadata(metadata)
+    except CorruptMetadataError:
+        return None
+
+
+class ChunkReader:
+    """Read exact amounts from a stream of arbitrarily sized chunks."""
+
+    def __init__(self, stream: AsyncIterator[bytes]) -> None:
+        """Initialize."""
+        self._stream = stream
+        self._buffer = bytearray()
+        self._eof = False
+
+    async def _fill(self, size: int) -> None:
+        while len(self._buffer) < size and not self._eof:
+            try:
+                self._buffer += await anext(self._stream)
+            except StopAsyncIteration:
+                self._eof = True
+
+    async def read(self, size: int) -> bytes:
+        """Return up to size bytes, fewer only at the end of the stream."""
+        await self._fill(size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def at_eof(self) -> bool:
+        """Return whether the stream is exhausted."""
+        await self._fill(1)
+        return not self._buffer
+
+    async def skip(self, size: int) -> int:
+        """Discard up to size bytes and return how many were discarded."""
+        skipped = 0
+        while skipped < size and (
+            data := await self.read(min(size - skipped, DOWNLOAD_CHUNK_SIZE))
+        ):
+            skipped += len(data)
+        return skipped
+
+    async def iter_part(self, size: int) -> AsyncIterator[bytes]:
+        """Yield the next size bytes of the stream in bounded chunks."""
+        remaining = size
+        while remaining > 0 and (
+            data := await self.read(min(remaining, DOWNLOAD_CHUNK_SIZE))
+        ):
+            remaining -= len(data)
+            yield data
+
+
+class UplinkError(HomeAssistantError):
+    """Error to indicate there is a problem calling uplink."""
+
+    def __init__(
+        self,
+        *args: object,
+        exit_code: int | None = None,
+        stderr: bytes | None = None,
+    ) -> None:
+        """Initialize, with the exit code and stderr of a failed uplink command."""
+        super().__init__(*args)
+        self.exit_code = exit_code
+        self.stderr = stderr
+
+
+class ObjectNotFoundError(UplinkError):
+    """Error to indicate an object is not in the bucket.
+
+    Storj was reached and answered, so it says nothing about connectivity.
+    """
+
+
+class CorruptMetadataError(UplinkError):
+    """Error to indicate an object's metadata can't be read.
+
+    Like ObjectNotFoundError, Storj answered, and only this object is affected.
+    """
+
+
+def _command_error(
+    message: str, exit_code: int | None, stderr: bytes | None
+) -> UplinkError:
+    """Return the error of a failed uplink command, by what it reported."""
+    if stderr and b"object not found" in stderr:
+        return ObjectNotFoundError(message, exit_code=exit_code, stderr=stderr)
+    return UplinkError(message, exit_code=exit_code, stderr=stderr)
@@ -0,0 +1 @@
+"""Benchmarks for the Storj integration."""
@@ -0,0 +1,59 @@
+"""Fixtures for the Storj benchmarks."""
+
+import json
+import os
+from pathlib import Path
+import sys
+
+import pytest
+
+FAKE_UPLINK = Path(__file__).parent / "fake_uplink.py"
+
+
+class FakeUplinkBinary:
+    """An `uplink` executable on PATH that keeps the bucket in a directory."""
+
+    def __init__(self, root: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Initialize."""
+        self.root = root
+        self._monkeypatch = monkeypatch
+        monkeypatch.setenv("FAKE_UPLINK_ROOT", str(root))
+
+    def configure(self, latency: float = 0.0, throughput: int = 0) -> None:
+        """Set the seconds each call waits and the bytes per second it moves."""
+        self._monkeypatch.setenv("FAKE_UPLINK_LATENCY", str(latency))
+        self._monkeypatch.setenv("FAKE_UPLINK_THROUGHPUT", str(throughput))
+
+    def put(self, path: str, data: bytes, metadata: dict[str, str] | None = None):
+        """Store an object, given as "bucket/key", without running uplink."""
+        bucket, _, key = path.partition("/")
+        for file, content in (
+            (self.root / bucket / key, data),
+            (
+                self.root / ".metadata" / bucket / f"{key}.json",
+                json.dumps(metadata or {}).encode(),
+            ),
+        ):
+            file.parent.mkdir(parents=True, exist_ok=True)
+            file.write_bytes(content)
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations() -> None:
+    """Run the benchmarks without a Home Assistant instance."""
+
+
+@pytest.fixture
+def fake_uplink_binary(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> FakeUplinkBinary:
+    """Put a filesystem-backed `uplink` first on PATH."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    executable = bin_dir / "uplink"
+    executable.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_UPLINK}" "$@"\n')
+    executable.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir), prepend=os.pathsep)
+    binary = FakeUplinkBinary(tmp_path / "bucket", monkeypatch)
+    binary.configure()
+    return binary
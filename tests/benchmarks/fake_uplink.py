@@ -0,0 +1,156 @@
+"""Stand-in for the uplink CLI that keeps a bucket on the local filesystem.
+
+It serves the commands UplinkCliTransport runs: `access import`, `ls`,
+`meta get`, `cp` in both directions and `rm`. Objects are stored as files
+under FAKE_UPLINK_ROOT/<bucket>/ and their metadata as JSON under
+FAKE_UPLINK_ROOT/.metadata/<bucket>/. Every call sleeps for
+FAKE_UPLINK_LATENCY seconds first, and FAKE_UPLINK_THROUGHPUT, if set, caps
+transfers at that many bytes per second.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+import time
+
+BLOCK_SIZE = 1024 * 1024
+
+ROOT = Path(os.environ["FAKE_UPLINK_ROOT"])
+LATENCY = float(os.environ.get("FAKE_UPLINK_LATENCY", 0))
+THROUGHPUT = int(os.environ.get("FAKE_UPLINK_THROUGHPUT", 0))
+
+
+def _paths(url: str) -> tuple[Path, Path]:
+    """Return the object and metadata paths of an sj:// URL."""
+    bucket, _, key = url.removeprefix("sj://").partition("/")
+    return ROOT / bucket / key, ROOT / ".metadata" / bucket / f"{key}.json"
+
+
+def _option(args: list[str], name: str) -> str | None:
+    return args[args.index(name) + 1] if name in args else None
+
+
+def _pace(size: int, started: float, moved: int) -> None:
+    """Sleep until moved + size bytes are due at the configured throughput."""
+    if THROUGHPUT:
+        delay = started + (moved + size) / THROUGHPUT - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _copy(source, dest, length: int | None = None) -> None:
+    started, moved = time.monotonic(), 0
+    while length is None or moved < length:
+        block = source.read(
+            BLOCK_SIZE if length is None else min(BLOCK_SIZE, length - moved)
+        )
+        if not block:
+            break
+        _pace(len(block), started, moved)
+        dest.write(block)
+        moved += len(block)
+
+
+def _upload(dest: str, args: list[str]) -> int:
+    path, metadata_path = _paths(dest)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    metadata_path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as file:
+        _copy(sys.stdin.buffer, file)
+    metadata = _option(args, "--metadata")
+    metadata_path.write_text(metadata or "{}")
+    return 0
+
+
+def _download(source: str, args: list[str]) -> int:
+    path, _ = _paths(source)
+    if not path.is_file():
+        print(f"object not found: {source}", file=sys.stderr)
+        return 1
+    start, end = 0, None
+    if (byte_range := _option(args, "--range")) is not None:
+        first, _, last = byte_range.removeprefix("bytes=").partition("-")
+        start, end = int(first), int(last) + 1 if last else None
+    with path.open("rb") as file:
+        file.seek(start)
+        _copy(file, sys.stdout.buffer, None if end is None else end - start)
+    return 0
+
+
+def _list(url: str, args: list[str]) -> int:
+    directory, _ = _paths(url)
+    bucket, _, prefix = url.removeprefix("sj://").partition("/")
+    lines = []
+    for path in sorted(directory.iterdir()) if directory.is_dir() else []:
+        if path.is_dir():
+            lines.append({"kind": "PRE", "key": f"{path.name}/"})
+            continue
+        stat = path.stat()
+        line = {
+            "kind": "OBJ",
+            "created": datetime.fromtimestamp(stat.st_mtime, timezone.utc).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ),
+            "size": stat.st_size,
+            "key": path.name,
+        }
+        if "--expanded" in args:
+            _, metadata_path = _paths(f"sj://{bucket}/{prefix}{path.name}")
+            line["metadata"] = json.loads(metadata_path.read_text())
+        lines.append(line)
+    sys.stdout.write("\n".join(json.dumps(line) for line in lines))
+    return 0
+
+
+def _meta_get(url: str) -> int:
+    path, metadata_path = _paths(url)
+    if not path.is_file():
+        print(f"object not found: {url}", file=sys.stderr)
+        return 1
+    sys.stdout.write(metadata_path.read_text())
+    return 0
+
+
+def _remove(url: str, recursive: bool) -> int:
+    path, metadata_path = _paths(url)
+    if recursive:
+        bucket, _, prefix = url.removeprefix("sj://").partition("/")
+        for directory in (ROOT / bucket / prefix, ROOT / ".metadata" / bucket / prefix):
+            if directory.is_dir():
+                shutil.rmtree(directory)
+        return 0
+    if not path.is_file():
+        print(f"object not found: {url}", file=sys.stderr)
+        return 1
+    path.unlink()
+    metadata_path.unlink(missing_ok=True)
+    return 0
+
+
+def main(args: list[str]) -> int:
+    """Run one uplink command and return its exit code."""
+    time.sleep(LATENCY)
+    command, rest = args[0], args[1:]
+    if command == "access":
+        return 0
+    if command == "ls":
+        return _list(rest[0], rest)
+    if command == "meta" and rest[0] == "get":
+        return _meta_get(rest[1])
+    if command == "cp":
+        source, dest = rest[0], rest[1]
+        return _upload(dest, rest) if source == "-" else _download(source, rest)
+    if command == "rm":
+        url = next(arg for arg in rest if arg.startswith("sj://"))
+        return _remove(url, "--recursive" in rest)
+    print(f"unsupported command: {command}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,167 @@
+"""Benchmarks of the Storj client against a filesystem-backed uplink.
+
+They are deselected by default; run them with `pytest tests/benchmarks -m
+benchmark`.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime, timedelta
+import random
+
+from homeassistant.components.backup import AgentBackup, suggested_filename
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from custom_components.storj.api import StorjClient
+from custom_components.storj.const import DEDUP_CHUNK_SIZE
+from custom_components.storj.dedup import async_chunks
+from custom_components.storj.metadata import encode_backup
+
+from .conftest import FakeUplinkBinary
+
+pytestmark = pytest.mark.benchmark
+
+# Round trip to the satellite added to every uplink call.
+LATENCY = 0.01
+TRANSFER_SIZE = 64 * 1024 * 1024
+BLOCK_SIZE = 1024 * 1024
+START = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def _backup(index: int, size: int = 10) -> AgentBackup:
+    return AgentBackup.from_dict(
+        {
+            "addons": [],
+            "backup_id": f"backup-{index:04d}",
+            "database_included": True,
+            "date": (START + timedelta(minutes=index)).isoformat(),
+            "extra_metadata": {},
+            "folders": [],
+            "homeassistant_included": True,
+            "homeassistant_version": "2025.1.0",
+            "name": f"Backup {index}",
+            "protected": False,
+            "size": size,
+        }
+    )
+
+
+def _put_backup(binary: FakeUplinkBinary, backup: AgentBackup, data: bytes) -> None:
+    binary.put(
+        f"ha-backups/backups/{suggested_filename(backup)}",
+        data,
+        encode_backup(backup),
+    )
+
+
+def _open_stream(size: int):
+    block = b"\x5a" * BLOCK_SIZE
+
+    async def open_stream() -> AsyncIterator[bytes]:
+        async def stream() -> AsyncIterator[bytes]:
+            for _ in range(size // BLOCK_SIZE):
+                yield block
+
+        return stream()
+
+    return open_stream
+
+
+def _record_throughput(benchmark: BenchmarkFixture, size: int) -> None:
+    benchmark.extra_info["mib_per_second"] = (
+        size / BLOCK_SIZE / benchmark.stats.stats.mean
+    )
+
+
+@pytest.mark.parametrize("count", [10, 100, 1000])
+def test_list_backups(
+    benchmark: BenchmarkFixture, fake_uplink_binary: FakeUplinkBinary, count: int
+) -> None:
+    """Benchmark listing a bucket of count backups."""
+    fake_uplink_binary.configure(latency=LATENCY)
+    for index in range(count):
+        _put_backup(fake_uplink_binary, _backup(index), b"x" * 10)
+
+    def _list() -> list[AgentBackup]:
+        return asyncio.run(StorjClient("instance", "ha-backups").async_list_backups())
+
+    backups = benchmark.pedantic(_list, rounds=5, iterations=1)
+
+    assert len(backups) == count
+
+
+def test_upload_throughput(
+    benchmark: BenchmarkFixture, fake_uplink_binary: FakeUplinkBinary
+) -> None:
+    """Benchmark uploading a large backup."""
+    fake_uplink_binary.configure(latency=LATENCY)
+    backup = _backup(0, TRANSFER_SIZE)
+    client = StorjClient("instance", "ha-backups")
+
+    def _upload() -> None:
+        asyncio.run(client.async_upload_backup(_open_stream(TRANSFER_SIZE), backup))
+
+    benchmark.pedantic(_upload, rounds=3, iterations=1)
+
+    _record_throughput(benchmark, TRANSFER_SIZE)
+    stored = fake_uplink_binary.root / "ha-backups/backups" / suggested_filename(backup)
+    assert stored.stat().st_size == TRANSFER_SIZE
+
+
+def test_download_throughput(
+    benchmark: BenchmarkFixture, fake_uplink_binary: FakeUplinkBinary
+) -> None:
+    """Benchmark downloading a large backup."""
+    fake_uplink_binary.configure(latency=LATENCY)
+    backup = _backup(0, TRANSFER_SIZE)
+    _put_backup(fake_uplink_binary, backup, b"\x5a" * TRANSFER_SIZE)
+    client = StorjClient("instance", "ha-backups")
+
+    async def _read() -> int:
+        stream = await client.async_download_backup(backup.backup_id)
+        return sum([len(chunk) async for chunk in stream])
+
+    size = benchmark.pedantic(lambda: asyncio.run(_read()), rounds=3, iterations=1)
+
+    _record_throughput(benchmark, TRANSFER_SIZE)
+    assert size == TRANSFER_SIZE
+
+
+def test_chunking_throughput(benchmark: BenchmarkFixture) -> None:
+    """Benchmark splitting a large backup into content-defined chunks."""
+    content = random.Random(0).randbytes(TRANSFER_SIZE)
+
+    async def _chunk() -> int:
+        async def stream() -> AsyncIterator[bytes]:
+            for offset in range(0, TRANSFER_SIZE, BLOCK_SIZE):
+                yield content[offset : offset + BLOCK_SIZE]
+
+        return sum(
+            [len(chunk) async for chunk in async_chunks(stream(), DEDUP_CHUNK_SIZE)]
+        )
+
+    size = benchmark.pedantic(lambda: asyncio.run(_chunk()), rounds=3, iterations=1)
+
+    _record_throughput(benchmark, TRANSFER_SIZE)
+    assert size == TRANSFER_SIZE
+
+
+def test_delete_latency(
+    benchmark: BenchmarkFixture, fake_uplink_binary: FakeUplinkBinary
+) -> None:
+    """Benchmark deleting a backup the client has already listed."""
+    fake_uplink_binary.configure(latency=LATENCY)
+    backup = _backup(0)
+    client = StorjClient("instance", "ha-backups")
+
+    def _setup() -> None:
+        _put_backup(fake_uplink_binary, backup, b"x" * 10)
+        asyncio.run(client.async_list_backups())
+
+    def _delete() -> None:
+        asyncio.run(client.async_delete_backup(backup.backup_id))
+
+    benchmark.pedantic(_delete, setup=_setup, rounds=10, iterations=1)
+
+    assert not any((fake_uplink_binary.root / "ha-backups/backups").iterdir())
@@ -0,0 +1,195 @@
+"""Load test of the backup websocket commands served by the Storj agent.
+
+The bucket is filled with thousands of backups in the filesystem-backed
+uplink, then a mix of backup/info, backup/details and backup/delete commands
+is sent with a bounded number in flight. The run reports the p50, p95 and p99
+latency of each command and the peak number of uplink processes, and fails
+if they exceed the thresholds, which can be set through the environment:
+
+- STORJ_LOAD_BACKUPS: backups in the bucket
+- STORJ_LOAD_REQUESTS, STORJ_LOAD_CONCURRENCY: commands sent, and in flight
+- STORJ_LOAD_P95_MS, STORJ_LOAD_P99_MS: latency limits for every command
+- STORJ_LOAD_MAX_PROCESSES: limit on uplink processes running at once
+"""
+
+import asyncio
+from collections import defaultdict
+import os
+import statistics
+import time
+from typing import Any
+from unittest.mock import patch
+
+from homeassistant.components.backup import DOMAIN as BACKUP_DOMAIN
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.typing import WebSocketGenerator
+
+from custom_components.storj.const import (
+    SCHEDULER_INTERACTIVE_SLOTS,
+    SCHEDULER_TRANSFER_SLOTS,
+)
+
+from .conftest import FakeUplinkBinary
+from .test_benchmarks import LATENCY, _backup, _put_backup
+
+pytestmark = pytest.mark.benchmark
+
+BACKUPS = int(os.environ.get("STORJ_LOAD_BACKUPS", 2000))
+REQUESTS = int(os.environ.get("STORJ_LOAD_REQUESTS", 100))
+CONCURRENCY = int(os.environ.get("STORJ_LOAD_CONCURRENCY", 10))
+P95_MS = float(os.environ.get("STORJ_LOAD_P95_MS", 20000))
+P99_MS = float(os.environ.get("STORJ_LOAD_P99_MS", 30000))
+# Every entry's uplink calls share one scheduler.
+MAX_PROCESSES = int(
+    os.environ.get(
+        "STORJ_LOAD_MAX_PROCESSES",
+        SCHEDULER_INTERACTIVE_SLOTS + SCHEDULER_TRANSFER_SLOTS,
+    )
+)
+# Of every ten commands, the number of each type.
+MIX = {"backup/info": 4, "backup/details": 4, "backup/delete": 2}
+
+
+class ProcessCounter:
+    """Wraps create_subprocess_exec to count the processes running at once."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.started = 0
+        self.running = 0
+        self.peak = 0
+        self._create = asyncio.create_subprocess_exec
+        self._waiters: set[asyncio.Task[None]] = set()
+
+    async def create_subprocess_exec(self, *args: Any, **kwargs: Any):
+        """Start a process and count it until it exits."""
+        process = await self._create(*args, **kwargs)
+        self.started += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        task = asyncio.create_task(self._wait(process))
+        self._waiters.add(task)
+        task.add_done_callback(self._waiters.discard)
+        return process
+
+    async def _wait(self, process: asyncio.subprocess.Process) -> None:
+        await process.wait()
+        self.running -= 1
+
+    async def async_drain(self) -> None:
+        """Wait for every counted process to exit."""
+        await asyncio.gather(*self._waiters)
+
+
+def _percentiles(latencies: list[float]) -> dict[str, float]:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def _commands() -> list[dict[str, Any]]:
+    """Return the commands to send, interleaving the types of the mix."""
+    pattern = [kind for kind, count in MIX.items() for _ in range(count)]
+    commands, deleted = [], 0
+    for number in range(REQUESTS):
+        kind = pattern[number % len(pattern)]
+        if kind == "backup/info":
+            commands.append({"type": kind})
+        elif kind == "backup/details":
+            # Backups from the end of the bucket, which are never deleted.
+            backup_id = _backup(BACKUPS - 1 - number % (BACKUPS // 2)).backup_id
+            commands.append({"type": kind, "backup_id": backup_id})
+        else:
+            commands.append({"type": kind, "backup_id": _backup(deleted).backup_id})
+            deleted += 1
+    return commands
+
+
+@pytest.mark.usefixtures("enable_custom_integrations")
+async def test_websocket_load(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    mock_config_entry: MockConfigEntry,
+    fake_uplink_binary: FakeUplinkBinary,
+    capsys: pytest.CaptureFixture[str],
+    record_property,
+) -> None:
+    """Test the backup commands stay fast with thousands of backups."""
+    # Debug mode records a traceback for every task, which would dominate.
+    hass.loop.set_debug(False)
+    fake_uplink_binary.configure(latency=LATENCY)
+    for index in range(BACKUPS):
+        _put_backup(fake_uplink_binary, _backup(index), b"x" * 10)
+    counter = ProcessCounter()
+
+    with (
+        patch("homeassistant.components.backup.is_hassio", return_value=False),
+        patch("homeassistant.components.backup.store.STORE_DELAY_SAVE", 0),
+        patch("asyncio.create_subprocess_exec", counter.create_subprocess_exec),
+    ):
+        assert await async_setup_component(hass, BACKUP_DOMAIN, {BACKUP_DOMAIN: {}})
+        mock_config_entry.add_to_hass(hass)
+        await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+        client = await hass_ws_client(hass)
+
+        pending: dict[int, asyncio.Future[dict[str, Any]]] = {}
+
+        async def _receive() -> None:
+            while True:
+                message = await client.receive_json()
+                if future := pending.pop(message["id"], None):
+                    future.set_result(message)
+
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        latencies: dict[str, list[float]] = defaultdict(list)
+        failures: list[dict[str, Any]] = []
+
+        async def _send(message_id: int, command: dict[str, Any]) -> None:
+            async with semaphore:
+                future = pending[message_id] = hass.loop.create_future()
+                start = time.monotonic()
+                await client.send_json({"id": message_id, **command})
+                response = await future
+                latencies[command["type"]].append(time.monotonic() - start)
+                if not response["success"] or (
+                    command["type"] == "backup/delete"
+                    and response["result"]["agent_errors"]
+                ):
+                    failures.append(response)
+
+        receiver = asyncio.create_task(_receive())
+        await asyncio.gather(
+            *(
+                _send(message_id, command)
+                for message_id, command in enumerate(_commands(), start=1)
+            )
+        )
+        receiver.cancel()
+        await counter.async_drain()
+
+    report = {kind: _percentiles(values) for kind, values in latencies.items()}
+    with capsys.disabled():
+        print(f"\nWebsocket load: {BACKUPS} backups, {REQUESTS} commands")
+        for kind, percentiles in report.items():
+            print(
+                f"  {kind:<15}"
+                + "".join(
+                    f" {name} {value * 1000:8.1f} ms"
+                    for name, value in percentiles.items()
+                )
+            )
+        print(
+            f"  uplink processes: {counter.started} started,"
+            f" at most {counter.peak} at once"
+        )
+    record_property("latency", report)
+    record_property("peak_processes", counter.peak)
+
+    assert not failures
+    for kind, percentiles in report.items():
+        assert percentiles["p95"] * 1000 <= P95_MS, kind
+        assert percentiles["p99"] * 1000 <= P99_MS, kind
+    assert counter.peak <= MAX_PROCESSES
@@ -1,6 +1,6 @@
 """Global fixtures for Storj integration."""
 
-from collections.abc import Generator, Coroutine
+from collections.abc import Callable, Generator, Coroutine
 from unittest.mock import AsyncMock, MagicMock, patch
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 from pytest_homeassistant_custom_component.typing import (
@@ -9,6 +9,7 @@ from pytest_homeassistant_custom_component.typing import (
     MockHAClientWebSocket,
 )
 from custom_components.storj.const import DOMAIN
+from custom_components.storj.s3 import canonical_query, sign_request
 from contextlib import contextmanager
 from typing import Any, cast
 
@@ -24,9 +25,17 @@ from homeassistant.components.websocket_api.auth import (
 from typing import Iterable
 
 import asyncio
+import ctypes
+import hashlib
+import json
+import sys
+from urllib.parse import unquote
+from xml.etree import ElementTree
 
-import pytest
+from aiohttp import web
+from types import ModuleType, SimpleNamespace
 
+import pytest
 
 TEST_ACCESS_GRANT = "123xyz"
 TEST_AGENT_ID = f"storj.{TEST_ACCESS_GRANT}"
@@ -118,8 +127,13 @@ def mock_asyncio_subprocess_run(
     responses: bytes = iter([b""]),
     returncode: int | Iterable = 0,
     exception: Exception | None = None,
+    stdout: bytes | None = None,
 ):
-    """Mock create_subprocess_shell."""
+    """Mock create_subprocess_shell.
+
+    `stdout` is served through a StreamReader for commands that stream their
+    output instead of calling communicate().
+    """
 
     class MockProcess(asyncio.subprocess.Process):
         @property
@@ -128,12 +142,22 @@ def mock_asyncio_subprocess_run(
                 return returncode
             return returncode.__next__()
 
-        async def communicate(self):
+        async def communicate(self, input=None):
+            if input is not None:
+                self.communicate_input = input
             if exception:
                 raise exception
             return responses.__next__(), b""
 
+        async def wait(self):
+            return self.returncode
+
     mock_process = MockProcess(MagicMock(), MagicMock(), MagicMock())
+    mock_process.stdin = MagicMock(drain=AsyncMock(), wait_closed=AsyncMock())
+    if stdout is not None:
+        mock_process.stdout = asyncio.StreamReader()
+        mock_process.stdout.feed_data(stdout)
+        mock_process.stdout.feed_eof()
 
     with patch(
         "asyncio.create_subprocess_exec",
@@ -142,6 +166,605 @@ def mock_asyncio_subprocess_run(
         yield mock
 
 
+# What uplink reports for an object that isn't in the bucket.
+NOT_FOUND = b"uplink: object not found"
+
+
+class FakeUplink:
+    """In-memory stand-in for the uplink CLI.
+
+    Patches create_subprocess_exec and serves `cp`, `ls`, `meta get`, `rm` and
+    `access import` from a dict of objects, so tests can follow data through
+    several calls.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.objects: dict[str, tuple[bytes, dict[str, str]]] = {}
+        self.calls: list[tuple[str, ...]] = []
+        self.fail: Callable[[tuple[str, ...]], bool] = lambda args: False
+        self.break_after: int | None = None
+
+    def put(self, path: str, data: bytes, metadata: dict[str, str] | None = None):
+        """Store an object, given as "bucket/key"."""
+        self.objects[path] = (data, metadata or {})
+
+    async def create_subprocess_exec(self, *args: str, **kwargs: Any) -> "FakeProcess":
+        """Start a fake uplink command."""
+        self.calls.append(args)
+        return FakeProcess(self, args)
+
+    def run(self, args: tuple[str, ...], stdin: bytes) -> tuple[int, bytes, bytes]:
+        """Run a command and return its exit code, stdout and stderr."""
+        if self.fail(args):
+            return 1, b"", b""
+        command, rest = args[1], list(args[2:])
+        if command == "cp":
+            source, dest = rest[0], rest[1]
+            if source == "-":
+                metadata = {}
+                if "--metadata" in rest:
+                    metadata = json.loads(rest[rest.index("--metadata") + 1])
+                self.put(dest.removeprefix("sj://"), stdin, metadata)
+                return 0, b"", b""
+            if (obj := self.objects.get(source.removeprefix("sj://"))) is None:
+                return 1, b"", NOT_FOUND
+            data = obj[0]
+            if "--range" in rest:
+                start, _, end = (
+                    rest[rest.index("--range") + 1]
+                    .removeprefix("bytes=")
+                    .partition("-")
+                )
+                data = data[int(start) : int(end) + 1 if end else None]
+            if self.break_after is not None:
+                # Deliver part of the object, then fail like a dropped connection.
+                data, self.break_after = data[: self.break_after], None
+                return 1, data, b""
+            return 0, data, b""
+        if command == "meta":
+            if (obj := self.objects.get(rest[1].removeprefix("sj://"))) is None:
+                return 1, b"", NOT_FOUND
+            return 0, json.dumps(obj[1]).encode(), b""
+        if command == "ls":
+            prefix = rest[0].removeprefix("sj://")
+            lines, prefixes = [], set()
+            for path, (data, metadata) in self.objects.items():
+                if not path.startswith(prefix):
+                    continue
+                key = path.removeprefix(prefix)
+                if "/" in key:
+                    prefixes.add(key.split("/")[0] + "/")
+                    continue
+                line = {
+                    "kind": "OBJ",
+                    "created": "2025-02-09 20:02:19",
+                    "size": len(data),
+                    "key": key,
+                }
+                if "--expanded" in rest:
+                    line["metadata"] = metadata
+                lines.append(line)
+            lines += [{"kind": "PRE", "key": key} for key in sorted(prefixes)]
+            return 0, "\n".join(json.dumps(line) for line in lines).encode(), b""
+        if command == "rm":
+            recursive = "--recursive" in rest
+            target = [arg for arg in rest if arg.startswith("sj://")][0].removeprefix(
+                "sj://"
+            )
+            if recursive:
+                for path in [path for path in self.objects if path.startswith(target)]:
+                    del self.objects[path]
+                return 0, b"", b""
+            if self.objects.pop(target, None) is None:
+                return 1, b"", NOT_FOUND
+            return 0, b"", b""
+        if command == "access":
+            return 0, b"", b""
+        return 1, b"", b""
+
+
+class FakeProcess:
+    """A process started by FakeUplink."""
+
+    def __init__(self, uplink: FakeUplink, args: tuple[str, ...]) -> None:
+        """Initialize."""
+        self._uplink = uplink
+        self._args = args
+        self._input = bytearray()
+        self.returncode: int | None = None
+        self.killed = False
+        self.stdin = MagicMock(
+            write=self._input.extend, drain=AsyncMock(), wait_closed=AsyncMock()
+        )
+        self.stdout = asyncio.StreamReader()
+        if args[1] == "cp" and args[3] == "-":
+            self._finish()
+            self.stdout.feed_data(self._output)
+            self.stdout.feed_eof()
+
+    def _finish(self, stdin: bytes = b"") -> None:
+        if self.returncode is None:
+            self.returncode, self._output, self._stderr = self._uplink.run(
+                self._args, stdin or bytes(self._input)
+            )
+
+    async def communicate(self, input: bytes | None = None) -> tuple[bytes, bytes]:
+        """Run the command to completion."""
+        self._finish(input or b"")
+        return self._output, self._stderr
+
+    async def wait(self) -> int:
+        """Run the command to completion."""
+        if not self.killed:
+            self._finish()
+        return self.returncode
+
+    def kill(self) -> None:
+        """Kill the command before it completes."""
+        self.killed = True
+        if self.returncode is None:
+            self.returncode = -9
+
+
+@pytest.fixture
+def fake_uplink() -> Generator[FakeUplink]:
+    """Replace the uplink CLI with an in-memory bucket."""
+    uplink = FakeUplink()
+    with patch(
+        "asyncio.create_subprocess_exec", side_effect=uplink.create_subprocess_exec
+    ):
+        yield uplink
+
+
 @pytest.fixture(autouse=True)
 def auto_enable_custom_integrations(enable_custom_integrations):
     yield
+
+
+class FakeLibUplink:
+    """In-memory stand-in for the uplink-python bindings.
+
+    Installs fake `uplink_python` modules backed by a dict of objects in the
+    same "bucket/key" layout as FakeUplink.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.objects: dict[str, tuple[bytes, dict[str, str]]] = {}
+        self.projects_opened = 0
+        self.projects_closed = 0
+        self.metadata_update = True
+        self.metadata_updates = 0
+        self.modules = self._build_modules()
+
+    def put(self, path: str, data: bytes, metadata: dict[str, str] | None = None):
+        """Store an object, given as "bucket/key"."""
+        self.objects[path] = (data, metadata or {})
+
+    def _build_modules(self) -> dict[str, ModuleType]:
+        fake = self
+        errors = ModuleType("uplink_python.errors")
+        module_classes = ModuleType("uplink_python.module_classes")
+        module_def = ModuleType("uplink_python.module_def")
+        uplink = ModuleType("uplink_python.uplink")
+
+        class StorjException(Exception):
+            """Base libuplink error."""
+
+        class ObjectNotFoundError(StorjException):
+            """Missing object."""
+
+        class BucketNotFoundError(StorjException):
+            """Missing bucket."""
+
+        errors.StorjException = StorjException
+        errors.ObjectNotFoundError = ObjectNotFoundError
+        errors.BucketNotFoundError = BucketNotFoundError
+        errors._storj_exception = lambda code, message: (
+            ObjectNotFoundError(message) if code == 0x21 else StorjException(message)
+        )
+
+        class _ProjectStruct(ctypes.Structure):
+            _fields_ = [("_handle", ctypes.c_size_t)]
+
+        class _CustomMetadataStruct(ctypes.Structure):
+            _fields_ = [("count", ctypes.c_size_t)]
+
+        class _Error(ctypes.Structure):
+            _fields_ = [("code", ctypes.c_int32), ("message", ctypes.c_char_p)]
+
+        module_def._ProjectStruct = _ProjectStruct
+        module_def._CustomMetadataStruct = _CustomMetadataStruct
+        module_def._Error = _Error
+
+        module_classes.ListObjectsOptions = lambda **kwargs: SimpleNamespace(
+            **{
+                "prefix": "",
+                "recursive": False,
+                "system": False,
+                "custom": False,
+                **kwargs,
+            }
+        )
+        module_classes.DownloadOptions = lambda offset, length: SimpleNamespace(
+            offset=offset, length=length
+        )
+        module_classes.CustomMetadataEntry = lambda **kwargs: SimpleNamespace(**kwargs)
+        module_classes.CustomMetadata = lambda entries, count: SimpleNamespace(
+            entries=entries, count=count, get_structure=lambda: entries
+        )
+
+        def _custom(metadata: dict[str, str]) -> SimpleNamespace:
+            return SimpleNamespace(
+                entries=[
+                    SimpleNamespace(key=key, value=value)
+                    for key, value in metadata.items()
+                ]
+            )
+
+        def _object(path: str) -> tuple[bytes, dict[str, str]]:
+            if path not in fake.objects:
+                raise ObjectNotFoundError(path)
+            return fake.objects[path]
+
+        class Download:
+            def __init__(self, data: bytes) -> None:
+                self._data = data
+
+            def read(self, size: int) -> tuple[bytes, int]:
+                data, self._data = self._data[:size], self._data[size:]
+                return data, len(data)
+
+            def close(self) -> None:
+                pass
+
+        class Upload:
+            def __init__(self, path: str) -> None:
+                self._path = path
+                self._data = bytearray()
+                self._metadata: dict[str, str] = {}
+
+            def write(self, data: bytes, size: int) -> int:
+                # Accept at most 4 bytes at a time, like a short write.
+                self._data += data[: min(size, 4)]
+                return min(size, 4)
+
+            def set_custom_metadata(self, custom: SimpleNamespace) -> None:
+                self._metadata = {entry.key: entry.value for entry in custom.entries}
+
+            def commit(self) -> None:
+                fake.put(self._path, bytes(self._data), self._metadata)
+
+            def abort(self) -> None:
+                pass
+
+        def _update_object_metadata(
+            project: _ProjectStruct,
+            bucket: bytes,
+            key: bytes,
+            entries: list[SimpleNamespace],
+            options: None,
+        ) -> SimpleNamespace | None:
+            path = f"{bucket.decode()}/{key.decode()}"
+            if path not in fake.objects:
+                return SimpleNamespace(
+                    contents=SimpleNamespace(code=0x21, message=b"object not found")
+                )
+            fake.metadata_updates += 1
+            fake.put(
+                path,
+                fake.objects[path][0],
+                {entry.key: entry.value for entry in entries},
+            )
+            return None
+
+        class Project:
+            def __init__(self) -> None:
+                self.project = _ProjectStruct()
+                self.uplink = SimpleNamespace(m_libuplink=SimpleNamespace())
+                if fake.metadata_update:
+                    self.uplink.m_libuplink.uplink_update_object_metadata = (
+                        _update_object_metadata
+                    )
+
+            def stat_bucket(self, bucket: str) -> SimpleNamespace:
+                if not any(path.startswith(f"{bucket}/") for path in fake.objects):
+                    raise BucketNotFoundError(bucket)
+                return SimpleNamespace(name=bucket)
+
+            def list_objects(self, bucket: str, options: SimpleNamespace):
+                prefix = f"{bucket}/{options.prefix}"
+                objects, prefixes = [], set()
+                for path, (data, metadata) in fake.objects.items():
+                    if not path.startswith(prefix):
+                        continue
+                    key = path.removeprefix(f"{bucket}/")
+                    rest = path.removeprefix(prefix)
+                    if "/" in rest and not options.recursive:
+                        prefixes.add(options.prefix + rest.split("/")[0] + "/")
+                        continue
+                    objects.append(
+                        SimpleNamespace(
+                            key=key,
+                            is_prefix=False,
+                            system=SimpleNamespace(
+                                created=1739131339, content_length=len(data)
+                            ),
+                            custom=_custom(metadata if options.custom else {}),
+                        )
+                    )
+                return objects + [
+                    SimpleNamespace(key=key, is_prefix=True) for key in prefixes
+                ]
+
+            def stat_object(self, bucket: str, key: str) -> SimpleNamespace:
+                data, metadata = _object(f"{bucket}/{key}")
+                return SimpleNamespace(
+                    key=key,
+                    system=SimpleNamespace(
+                        created=1739131339, content_length=len(data)
+                    ),
+                    custom=_custom(metadata),
+                )
+
+            def download_object(
+                self, bucket: str, key: str, options: SimpleNamespace
+            ) -> Download:
+                data = _object(f"{bucket}/{key}")[0][options.offset :]
+                if options.length >= 0:
+                    data = data[: options.length]
+                return Download(data)
+
+            def upload_object(self, bucket: str, key: str) -> Upload:
+                return Upload(f"{bucket}/{key}")
+
+            def delete_object(self, bucket: str, key: str) -> None:
+                _object(f"{bucket}/{key}")
+                del fake.objects[f"{bucket}/{key}"]
+
+            def close(self) -> None:
+                fake.projects_closed += 1
+
+        class Access:
+            def open_project(self) -> Project:
+                fake.projects_opened += 1
+                return Project()
+
+        class Uplink:
+            def parse_access(self, access_grant: str) -> Access:
+                if access_grant != TEST_ACCESS_GRANT:
+                    raise StorjException("invalid access grant")
+                return Access()
+
+        uplink.Uplink = Uplink
+        package = ModuleType("uplink_python")
+        package.errors, package.module_classes, package.module_def, package.uplink = (
+            errors,
+            module_classes,
+            module_def,
+            uplink,
+        )
+        return {
+            "uplink_python": package,
+            "uplink_python.errors": errors,
+            "uplink_python.module_classes": module_classes,
+            "uplink_python.module_def": module_def,
+            "uplink_python.uplink": uplink,
+        }
+
+
+@pytest.fixture
+def fake_libuplink() -> Generator[FakeLibUplink]:
+    """Install in-memory uplink-python bindings."""
+    bindings = FakeLibUplink()
+    with patch.dict(sys.modules, bindings.modules):
+        yield bindings
+
+
+class FakeS3:
+    """Local stand-in for the S3-compatible gateway.
+
+    Serves the requests S3Transport makes from a dict of objects in the
+    "bucket/key" layout of FakeUplink, and rejects requests whose signature
+    doesn't match what was sent.
+    """
+
+    access_key_id = "access"
+    secret_access_key = "secret"
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.objects: dict[str, tuple[bytes, dict[str, str]]] = {}
+        self.uploads: dict[str, dict[str, Any]] = {}
+        self.requests: list[tuple[str, str]] = []
+        self.page_size = 2
+        self.list_metadata = True
+        self.parts_in_flight = 0
+        self.max_parts_in_flight = 0
+        self.fail: Callable[[web.Request], bool] = lambda request: False
+        self.endpoint = ""
+
+    def put(self, path: str, data: bytes, metadata: dict[str, str] | None = None):
+        """Store an object, given as "bucket/key"."""
+        self.objects[path] = (data, metadata or {})
+
+    def app(self) -> web.Application:
+        """Return the aiohttp application serving the gateway."""
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        return app
+
+    def _signature_ok(self, request: web.Request) -> bool:
+        authorization = request.headers.get("Authorization", "")
+        fields = dict(
+            field.strip().split("=", 1)
+            for field in authorization.removeprefix("AWS4-HMAC-SHA256 ").split(",")
+            if "=" in field
+        )
+        if "SignedHeaders" not in fields:
+            return False
+        headers = {
+            name: request.headers.get(name, "")
+            for name in fields["SignedHeaders"].split(";")
+        }
+        expected = sign_request(
+            request.method,
+            request.raw_path.split("?")[0],
+            canonical_query(dict(request.query)),
+            headers,
+            self.access_key_id,
+            self.secret_access_key,
+            "us-1",
+        )
+        return authorization == expected
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append((request.method, request.path_qs))
+        if not self._signature_ok(request):
+            return web.Response(status=403)
+        if self.fail(request):
+            return web.Response(status=500)
+        bucket, _, key = request.match_info["path"].partition("/")
+        if bucket != "ha-backups":
+            return web.Response(status=404)
+        if not key:
+            if request.method == "HEAD":
+                return web.Response()
+            return self._list(request, bucket)
+
+        path = f"{bucket}/{key}"
+        query = request.query
+        if request.method == "POST" and "uploads" in query:
+            upload_id = f"upload-{len(self.uploads)}"
+            self.uploads[upload_id] = {"parts": {}, "metadata": _meta(request)}
+            return _xml(
+                f"<InitiateMultipartUploadResult {_XMLNS}>"
+                f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            )
+        if request.method == "PUT" and "partNumber" in query:
+            self.parts_in_flight += 1
+            self.max_parts_in_flight = max(
+                self.max_parts_in_flight, self.parts_in_flight
+            )
+            try:
+                data = await request.read()
+                await asyncio.sleep(0.01)
+            finally:
+                self.parts_in_flight -= 1
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+            self.uploads[query["uploadId"]]["parts"][int(query["partNumber"])] = (
+                data,
+                etag,
+            )
+            return web.Response(headers={"ETag": etag})
+        if request.method == "POST" and "uploadId" in query:
+            upload = self.uploads.pop(query["uploadId"])
+            root = ElementTree.fromstring(await request.read())
+            data = b""
+            for part in root.iter("Part"):
+                part_data, etag = upload["parts"][int(part.findtext("PartNumber"))]
+                assert part.findtext("ETag") == etag
+                data += part_data
+            self.put(path, data, upload["metadata"])
+            return _xml(f"<CompleteMultipartUploadResult {_XMLNS}/>")
+        if request.method == "DELETE" and "uploadId" in query:
+            self.uploads.pop(query["uploadId"], None)
+            return web.Response(status=204)
+        if request.method == "PUT" and (
+            source := request.headers.get("x-amz-copy-source")
+        ):
+            if request.headers.get("x-amz-metadata-directive") != "REPLACE":
+                return web.Response(status=400)
+            data, _ = self.objects[unquote(source).removeprefix("/")]
+            self.put(path, data, _meta(request))
+            return _xml(f"<CopyObjectResult {_XMLNS}/>")
+        if request.method == "PUT":
+            self.put(path, await request.read(), _meta(request))
+            return web.Response()
+        if request.method == "DELETE":
+            # Like S3, deleting a missing object succeeds.
+            self.objects.pop(path, None)
+            return web.Response(status=204)
+        if (obj := self.objects.get(path)) is None:
+            return web.Response(status=404)
+        data, metadata = obj
+        headers = {f"x-amz-meta-{name}": value for name, value in metadata.items()}
+        if request.method == "HEAD":
+            return web.Response(headers={**headers, "Content-Length": str(len(data))})
+        if range_header := request.headers.get("Range"):
+            start, _, end = range_header.removeprefix("bytes=").partition("-")
+            return web.Response(
+                status=206,
+                body=data[int(start) : int(end) + 1 if end else None],
+                headers=headers,
+            )
+        return web.Response(body=data, headers=headers)
+
+    def _user_metadata(self, request: web.Request, path: str) -> str:
+        """Return the UserMetadata element of MinIO's `metadata=true` extension."""
+        if request.query.get("metadata") != "true" or not self.list_metadata:
+            return ""
+        return "<UserMetadata>{}</UserMetadata>".format(
+            "".join(
+                f"<X-Amz-Meta-{name}>{value}</X-Amz-Meta-{name}>"
+                for name, value in self.objects[path][1].items()
+            )
+        )
+
+    def _list(self, request: web.Request, bucket: str) -> web.Response:
+        prefix = request.query.get("prefix", "")
+        delimiter = request.query.get("delimiter")
+        keys = sorted(
+            key
+            for key in (path.removeprefix(f"{bucket}/") for path in self.objects)
+            if key.startswith(prefix)
+            and not (delimiter and delimiter in key.removeprefix(prefix))
+        )
+        start = int(request.query.get("continuation-token", 0))
+        page = keys[start : start + self.page_size]
+        truncated = start + self.page_size < len(keys)
+        contents = "".join(
+            f"<Contents><Key>{key}</Key>"
+            "<LastModified>2025-02-09T20:02:19.000Z</LastModified>"
+            f"<Size>{len(self.objects[f'{bucket}/{key}'][0])}</Size>"
+            f"{self._user_metadata(request, f'{bucket}/{key}')}</Contents>"
+            for key in page
+        )
+        token = (
+            f"<NextContinuationToken>{start + self.page_size}</NextContinuationToken>"
+            if truncated
+            else ""
+        )
+        return _xml(
+            f"<ListBucketResult {_XMLNS}><Name>{bucket}</Name>"
+            f"<IsTruncated>{str(truncated).lower()}</IsTruncated>"
+            f"{token}{contents}</ListBucketResult>"
+        )
+
+
+_XMLNS = 'xmlns="http://s3.amazonaws.com/doc/2006-03-01/"'
+
+
+def _meta(request: web.Request) -> dict[str, str]:
+    return {
+        name.lower().removeprefix("x-amz-meta-"): value
+        for name, value in request.headers.items()
+        if name.lower().startswith("x-amz-meta-")
+    }
+
+
+def _xml(body: str) -> web.Response:
+    return web.Response(
+        text=f'<?xml version="1.0" encoding="UTF-8"?>{body}',
+        content_type="application/xml",
+    )
+
+
+@pytest.fixture
+async def fake_s3(aiohttp_server, socket_enabled: None) -> FakeS3:
+    """Serve an in-memory bucket over a local S3 gateway."""
+    s3 = FakeS3()
+    server = await aiohttp_server(s3.app())
+    s3.endpoint = str(server.make_url(""))
+    return s3
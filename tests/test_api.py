@@ -0,0 +1,1360 @@
+"""Test the Storj API client."""
+
+import base64
+from collections.abc import AsyncIterator, Generator
+from datetime import time, timedelta
+import hashlib
+import io
+import json
+import os
+import random
+import tarfile
+from typing import Any
+from unittest.mock import patch
+import zlib
+
+from freezegun.api import FrozenDateTimeFactory
+from homeassistant.components.backup import AgentBackup, BackupAgentError
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
+from json_flatten import flatten
+import pytest
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from custom_components.storj.api import (
+    StorjClient,
+    UplinkError,
+    UploadTuning,
+    upload_tuning,
+)
+from custom_components.storj.cache import BackupMetadataCache
+from custom_components.storj.checkpoint import UploadCheckpoints
+from custom_components.storj.compression import CompressionError
+from custom_components.storj.const import (
+    CONF_TRANSPORT,
+    METADATA_MIGRATION_DELAY,
+    TRANSPORT_LIBUPLINK,
+)
+from custom_components.storj.dedup import ChunkIndex, async_chunks, find_boundary
+from custom_components.storj.metadata import decode_backup, encode_backup
+from custom_components.storj.libuplink import LibUplinkTransport
+from custom_components.storj.retention import (
+    RetentionPolicy,
+    select_backups_to_prune,
+)
+from custom_components.storj.s3 import S3Transport
+from custom_components.storj.throttle import (
+    DOWNLOAD,
+    UPLOAD,
+    BandwidthSchedule,
+    BandwidthThrottle,
+    TokenBucket,
+    format_rate,
+)
+from custom_components.storj.tracing import TraceBuffer
+from custom_components.storj.transport import StorjTransport, UplinkCliTransport
+
+from .conftest import TEST_ACCESS_GRANT, FakeLibUplink, FakeS3, FakeUplink
+
+MIB = 1024 * 1024
+
+TEST_BACKUP = AgentBackup(
+    addons=[],
+    backup_id="test-backup",
+    database_included=True,
+    date="2025-01-01T01:23:45.678Z",
+    extra_metadata={},
+    folders=[],
+    homeassistant_included=True,
+    homeassistant_version="2024.12.0",
+    name="Test",
+    protected=False,
+    size=10,
+)
+TEST_CONTENT = b"0123456789"
+MANIFEST = "ha-backups/backups/Test_2025-01-01_01.23_45678000.tar.parts"
+CHUNKS = "ha-backups/chunks/"
+
+
+def _open_stream(data: bytes, chunk_size: int = 3):
+    async def open_stream() -> AsyncIterator[bytes]:
+        async def stream() -> AsyncIterator[bytes]:
+            for i in range(0, len(data), chunk_size):
+                yield data[i : i + chunk_size]
+
+        return stream()
+
+    return open_stream
+
+
+async def _read_all(stream: AsyncIterator[bytes]) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+@pytest.fixture
+async def checkpoints(hass: HomeAssistant) -> UploadCheckpoints:
+    """Return empty upload checkpoints."""
+    checkpoints = UploadCheckpoints(hass, "test")
+    await checkpoints.async_load()
+    return checkpoints
+
+
+@pytest.fixture
+def resumable_client(checkpoints: UploadCheckpoints) -> StorjClient:
+    """Return a client that uploads in 4 byte parts."""
+    return StorjClient(
+        "ha-id",
+        "ha-backups",
+        checkpoints=checkpoints,
+        resumable_uploads=True,
+        part_size=4,
+    )
+
+
+@pytest.fixture
+async def chunk_index(hass: HomeAssistant) -> ChunkIndex:
+    """Return an empty chunk index."""
+    chunk_index = ChunkIndex(hass, "test")
+    await chunk_index.async_load()
+    return chunk_index
+
+
+def _dedup_client(chunk_index: ChunkIndex, **kwargs: Any) -> StorjClient:
+    """Return a client that deduplicates in chunks of about 256 bytes."""
+    return StorjClient(
+        "ha-id",
+        "ha-backups",
+        chunk_index=chunk_index,
+        deduplicate=True,
+        chunk_size=256,
+        **kwargs,
+    )
+
+
+def _backup(backup_id: str, content: bytes) -> AgentBackup:
+    return AgentBackup.from_dict(
+        {
+            **TEST_BACKUP.as_dict(),
+            "backup_id": backup_id,
+            "name": backup_id,
+            "size": len(content),
+        }
+    )
+
+
+def _chunk_objects(fake_uplink: FakeUplink) -> set[str]:
+    return {path for path in fake_uplink.objects if path.startswith(CHUNKS)}
+
+
+async def test_resumable_upload(
+    fake_uplink: FakeUplink, resumable_client: StorjClient
+) -> None:
+    """Test a resumable upload round trips through parts and a manifest."""
+
+    await resumable_client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+
+    assert sorted(fake_uplink.objects) == [
+        "ha-backups/backups/.parts/test-backup/00000",
+        "ha-backups/backups/.parts/test-backup/00001",
+        "ha-backups/backups/.parts/test-backup/00002",
+        MANIFEST,
+    ]
+    assert fake_uplink.objects[MANIFEST][1]["storj_backup_id"] == "test-backup"
+
+    listing_client = StorjClient("ha-id", "ha-backups")
+    assert await listing_client.async_list_backups() == [TEST_BACKUP]
+    stream = await listing_client.async_download_backup(TEST_BACKUP.backup_id)
+    assert await _read_all(stream) == TEST_CONTENT
+
+    await listing_client.async_delete_backup(TEST_BACKUP.backup_id)
+    assert fake_uplink.objects == {}
+
+
+async def test_resumable_upload_resumes(
+    fake_uplink: FakeUplink,
+    resumable_client: StorjClient,
+    checkpoints: UploadCheckpoints,
+) -> None:
+    """Test a failed upload only sends the missing parts when retried."""
+
+    fake_uplink.fail = (
+        lambda args: "sj://ha-backups/backups/.parts/test-backup/00001" in args
+    )
+    with pytest.raises(UplinkError):
+        await resumable_client.async_upload_backup(
+            _open_stream(TEST_CONTENT), TEST_BACKUP
+        )
+    assert checkpoints.get(TEST_BACKUP.backup_id)["parts"] == 1
+
+    fake_uplink.fail = lambda args: False
+    fake_uplink.calls.clear()
+    await resumable_client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+
+    assert [call[3] for call in fake_uplink.calls] == [
+        "sj://ha-backups/backups/.parts/test-backup/00001",
+        "sj://ha-backups/backups/.parts/test-backup/00002",
+        f"sj://{MANIFEST}",
+    ]
+    assert checkpoints.get(TEST_BACKUP.backup_id) is None
+
+    stream = await StorjClient("ha-id", "ha-backups").async_download_backup(
+        TEST_BACKUP.backup_id
+    )
+    assert await _read_all(stream) == TEST_CONTENT
+
+
+async def test_resumable_upload_shorter_stream(
+    fake_uplink: FakeUplink,
+    resumable_client: StorjClient,
+    checkpoints: UploadCheckpoints,
+) -> None:
+    """Test a checkpoint past the end of the stream is dropped."""
+
+    await checkpoints.async_start(TEST_BACKUP.backup_id, MANIFEST.split("/")[-1], 4)
+    await checkpoints.async_set_parts(TEST_BACKUP.backup_id, 5)
+
+    with pytest.raises(UplinkError, match="shorter"):
+        await resumable_client.async_upload_backup(
+            _open_stream(TEST_CONTENT), TEST_BACKUP
+        )
+    assert checkpoints.get(TEST_BACKUP.backup_id) is None
+
+
+async def test_abort_stale_uploads(
+    fake_uplink: FakeUplink,
+    checkpoints: UploadCheckpoints,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test the parts of abandoned uploads are removed."""
+
+    client = StorjClient(
+        "ha-id",
+        "ha-backups",
+        checkpoints=checkpoints,
+        stale_upload_age=timedelta(hours=1),
+    )
+    fake_uplink.put("ha-backups/backups/.parts/old/00000", b"data")
+    await checkpoints.async_start("old", "old.tar.parts", 4)
+    freezer.tick(timedelta(minutes=30))
+    await checkpoints.async_start("recent", "recent.tar.parts", 4)
+
+    fake_uplink.fail = lambda args: True
+    freezer.tick(timedelta(minutes=45))
+    await client.async_abort_stale_uploads()
+    assert checkpoints.get("old") is not None
+
+    fake_uplink.fail = lambda args: False
+    await client.async_abort_stale_uploads()
+    assert checkpoints.get("old") is None
+    assert checkpoints.get("recent") is not None
+    assert fake_uplink.objects == {}
+
+
+@pytest.mark.parametrize(
+    ("size", "parallelism", "max_concurrent_pieces", "expected"),
+    [
+        (2 * MIB, 0, 0, UploadTuning(parallelism=1)),
+        (512 * MIB, 0, 0, UploadTuning(parallelism=4)),
+        (
+            20 * 1024 * MIB,
+            0,
+            0,
+            UploadTuning(parallelism=8, maximum_concurrent_pieces=500),
+        ),
+        (2 * MIB, 6, 0, UploadTuning(parallelism=6)),
+        (
+            20 * 1024 * MIB,
+            2,
+            100,
+            UploadTuning(parallelism=2, maximum_concurrent_pieces=100),
+        ),
+    ],
+    ids=["small", "medium", "large", "configured", "configured_large"],
+)
+def test_upload_tuning(
+    size: int,
+    parallelism: int,
+    max_concurrent_pieces: int,
+    expected: UploadTuning,
+) -> None:
+    """Test upload settings are picked from the backup size and options."""
+    assert upload_tuning(size, parallelism, max_concurrent_pieces) == expected
+
+
+def test_upload_tuning_args() -> None:
+    """Test upload settings become uplink cp arguments."""
+    assert UploadTuning(parallelism=1).as_args() == ["--parallelism", "1"]
+    assert UploadTuning(parallelism=8, maximum_concurrent_pieces=500).as_args() == [
+        "--parallelism",
+        "8",
+        "--maximum-concurrent-pieces",
+        "500",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("offset", "length", "expected"),
+    [
+        (0, None, TEST_CONTENT),
+        (3, None, TEST_CONTENT[3:]),
+        (3, 4, TEST_CONTENT[3:7]),
+        (5, 100, TEST_CONTENT[5:]),
+    ],
+)
+@pytest.mark.parametrize("resumable", [False, True], ids=["object", "parts"])
+@pytest.mark.parametrize("compression_level", [0, 3], ids=["raw", "zstd"])
+async def test_download_range(
+    fake_uplink: FakeUplink,
+    checkpoints: UploadCheckpoints,
+    resumable: bool,
+    compression_level: int,
+    offset: int,
+    length: int | None,
+    expected: bytes,
+) -> None:
+    """Test downloading a byte range of a backup."""
+
+    client = StorjClient(
+        "ha-id",
+        "ha-backups",
+        checkpoints=checkpoints,
+        resumable_uploads=resumable,
+        part_size=4,
+        compression_level=compression_level,
+    )
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id, offset, length)
+    assert await _read_all(stream) == expected
+
+
+async def test_compressed_upload(fake_uplink: FakeUplink) -> None:
+    """Test a compressed backup is smaller in the bucket but lists unchanged."""
+
+    content = TEST_CONTENT * 10000
+    backup = AgentBackup.from_dict({**TEST_BACKUP.as_dict(), "size": len(content)})
+    await StorjClient("ha-id", "ha-backups", compression_level=3).async_upload_backup(
+        _open_stream(content, 4096), backup
+    )
+
+    data, metadata = fake_uplink.objects[
+        "ha-backups/backups/Test_2025-01-01_01.23_45678000.tar"
+    ]
+    assert len(data) < len(content) // 10
+    assert metadata["storj_codec"] == "zstd"
+
+    # A new client learns the codec from the listing.
+    client = StorjClient("ha-id", "ha-backups")
+    assert await client.async_list_backups() == [backup]
+    stream = await client.async_download_backup(backup.backup_id)
+    assert await _read_all(stream) == content
+
+    # Without a listing, the download fetches the codec itself.
+    stream = await StorjClient("ha-id", "ha-backups").async_download_backup(
+        backup.backup_id, 5, 10
+    )
+    assert await _read_all(stream) == content[5:15]
+
+
+async def test_download_unknown_codec(fake_uplink: FakeUplink) -> None:
+    """Test a backup stored with an unknown codec isn't returned as is."""
+
+    client = StorjClient("ha-id", "ha-backups")
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    path = "ha-backups/backups/Test_2025-01-01_01.23_45678000.tar"
+    data, metadata = fake_uplink.objects[path]
+    fake_uplink.put(path, data, {**metadata, "storj_codec": "lz4"})
+
+    with pytest.raises(UplinkError, match="unknown codec lz4"):
+        await StorjClient("ha-id", "ha-backups").async_download_backup(
+            TEST_BACKUP.backup_id
+        )
+
+
+async def test_download_corrupt_compressed_backup(fake_uplink: FakeUplink) -> None:
+    """Test a truncated or corrupt compressed backup fails to download."""
+
+    client = StorjClient("ha-id", "ha-backups", compression_level=3)
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    path = "ha-backups/backups/Test_2025-01-01_01.23_45678000.tar"
+    data, metadata = fake_uplink.objects[path]
+
+    fake_uplink.put(path, data[:-4], metadata)
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    with pytest.raises(CompressionError, match="ended early"):
+        await _read_all(stream)
+
+    fake_uplink.put(path, b"not zstd" + data, metadata)
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    with pytest.raises(CompressionError):
+        await _read_all(stream)
+
+
+async def test_chunk_boundaries() -> None:
+    """Test chunk boundaries follow the content, not the offsets."""
+
+    content = random.Random(0).randbytes(32768)
+
+    async def _chunks(data: bytes) -> list[bytes]:
+        return [
+            chunk async for chunk in async_chunks(await _open_stream(data, 100)(), 256)
+        ]
+
+    chunks = await _chunks(content)
+    assert b"".join(chunks) == content
+    assert all(64 < len(chunk) <= 1024 for chunk in chunks[:-1])
+
+    # Inserting bytes only changes the chunks around the insertion.
+    shifted = await _chunks(content[:10000] + b"inserted" + content[10000:])
+    assert len(set(chunks) - set(shifted)) <= 2
+
+
+def _rolling_boundary(data: bytes, average: int) -> int:
+    """Find a chunk boundary by rolling the gear hash one byte at a time."""
+    gear = [
+        int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], "big")
+        for value in range(256)
+    ]
+    minimum, end = average // 4, min(len(data), average * 4)
+    value = 0
+    for position in range(max(minimum - 64, 0), end):
+        value = ((value << 1) + gear[data[position]]) & ((1 << 64) - 1)
+        if position >= minimum and not value >> (65 - average.bit_length()):
+            return position + 1
+    return end
+
+
+@pytest.mark.parametrize("average", [16, 128, 256, 65536])
+def test_chunk_boundaries_match_rolling_hash(average: int) -> None:
+    """Test the vectorized hash finds the boundaries of a byte-wise rolling one."""
+    rng = random.Random(average)
+    for size in (0, average // 4, average, average * 3, average * 5):
+        for data in (rng.randbytes(size), bytes(size)):
+            assert find_boundary(bytearray(data), average) == _rolling_boundary(
+                data, average
+            )
+
+
+async def test_deduplicated_upload(
+    fake_uplink: FakeUplink, chunk_index: ChunkIndex
+) -> None:
+    """Test a second, mostly identical backup only uploads the changed chunks."""
+
+    content = random.Random(0).randbytes(32768)
+    first = _backup("first", content)
+    client = _dedup_client(chunk_index)
+    await client.async_upload_backup(_open_stream(content, 100), first)
+
+    manifest = "ha-backups/backups/first_2025-01-01_01.23_45678000.tar.chunks"
+    assert fake_uplink.objects[manifest][1]["storj_backup_id"] == "first"
+    first_chunks = _chunk_objects(fake_uplink)
+    assert len(first_chunks) > 10
+
+    changed = content[:16000] + b"changed" + content[16007:]
+    second = _backup("second", changed)
+    await client.async_upload_backup(_open_stream(changed, 100), second)
+    assert 0 < len(_chunk_objects(fake_uplink) - first_chunks) <= 2
+
+    listing_client = StorjClient("ha-id", "ha-backups")
+    assert sorted(
+        await listing_client.async_list_backups(), key=lambda b: b.backup_id
+    ) == [first, second]
+    stream = await listing_client.async_download_backup("first")
+    assert await _read_all(stream) == content
+    stream = await listing_client.async_download_backup("second", 15990, 30)
+    assert await _read_all(stream) == changed[15990:16020]
+
+
+async def test_deduplicated_upload_compressed(
+    fake_uplink: FakeUplink, chunk_index: ChunkIndex
+) -> None:
+    """Test compression applies to each chunk of a deduplicated backup."""
+
+    content = TEST_CONTENT * 100
+    backup = _backup("test-backup", content)
+    client = _dedup_client(chunk_index, compression_level=3)
+    await client.async_upload_backup(_open_stream(content, 100), backup)
+
+    chunks = _chunk_objects(fake_uplink)
+    assert chunks
+    assert all(path.endswith(".zst") for path in chunks)
+    assert sum(len(fake_uplink.objects[path][0]) for path in chunks) < len(content)
+    manifest = "ha-backups/backups/test-backup_2025-01-01_01.23_45678000.tar.chunks"
+    assert "storj_codec" not in fake_uplink.objects[manifest][1]
+
+    stream = await client.async_download_backup(backup.backup_id, 15, 100)
+    assert await _read_all(stream) == content[15:115]
+
+
+async def test_deduplicated_upload_syncs_index(
+    hass: HomeAssistant, fake_uplink: FakeUplink, chunk_index: ChunkIndex
+) -> None:
+    """Test chunks already in the bucket aren't uploaded by a new installation."""
+
+    content = random.Random(0).randbytes(16384)
+    await _dedup_client(chunk_index).async_upload_backup(
+        _open_stream(content), _backup("first", content)
+    )
+
+    fresh_index = ChunkIndex(hass, "fresh")
+    await fresh_index.async_load()
+    fake_uplink.calls.clear()
+    await _dedup_client(fresh_index).async_upload_backup(
+        _open_stream(content), _backup("second", content)
+    )
+    uploads = [call for call in fake_uplink.calls if call[1:3] == ("cp", "-")]
+    assert len(uploads) == 1
+
+
+async def test_deduplicated_upload_resyncs_stored_index(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    fake_uplink: FakeUplink,
+    chunk_index: ChunkIndex,
+) -> None:
+    """Test a chunk missing from the bucket is uploaded again after a restart."""
+
+    content = random.Random(0).randbytes(16384)
+    await _dedup_client(chunk_index).async_upload_backup(
+        _open_stream(content), _backup("first", content)
+    )
+    chunks = _chunk_objects(fake_uplink)
+    hass_storage["storj.restarted.chunks"] = {
+        "version": 1,
+        "key": "storj.restarted.chunks",
+        "data": {
+            "chunks": {
+                path.removeprefix(CHUNKS): len(fake_uplink.objects[path][0])
+                for path in chunks
+            },
+            "manifests": {},
+        },
+    }
+    # Removed behind the index's back, e.g. by another installation.
+    missing = sorted(chunks)[0]
+    del fake_uplink.objects[missing]
+
+    restarted_index = ChunkIndex(hass, "restarted")
+    await restarted_index.async_load()
+    client = _dedup_client(restarted_index)
+    await client.async_upload_backup(_open_stream(content), _backup("second", content))
+    assert missing in fake_uplink.objects
+    stream = await client.async_download_backup("second")
+    assert await _read_all(stream) == content
+
+
+async def test_deduplicated_upload_fails(
+    fake_uplink: FakeUplink, chunk_index: ChunkIndex
+) -> None:
+    """Test a failed chunk upload fails the backup without writing a manifest."""
+
+    content = random.Random(0).randbytes(16384)
+    fake_uplink.fail = lambda args: args[1] == "cp" and len(fake_uplink.objects) > 3
+    with pytest.raises(UplinkError):
+        await _dedup_client(chunk_index).async_upload_backup(
+            _open_stream(content), _backup("first", content)
+        )
+    assert all(path.startswith(CHUNKS) for path in fake_uplink.objects)
+
+
+async def test_download_corrupt_chunk(
+    fake_uplink: FakeUplink, chunk_index: ChunkIndex
+) -> None:
+    """Test a chunk that doesn't match its name fails the download."""
+
+    content = random.Random(0).randbytes(4096)
+    client = _dedup_client(chunk_index)
+    await client.async_upload_backup(_open_stream(content), _backup("first", content))
+    path = sorted(_chunk_objects(fake_uplink))[0]
+    fake_uplink.put(path, b"corrupt")
+
+    stream = await client.async_download_backup("first")
+    with pytest.raises(UplinkError, match="is corrupt"):
+        await _read_all(stream)
+
+
+async def test_delete_collects_chunks(
+    hass: HomeAssistant, fake_uplink: FakeUplink, chunk_index: ChunkIndex
+) -> None:
+    """Test deleting a backup removes the chunks no other backup uses."""
+
+    content = random.Random(0).randbytes(32768)
+    changed = content[:16000] + b"changed" + content[16007:]
+    client = _dedup_client(chunk_index)
+    await client.async_upload_backup(_open_stream(content), _backup("first", content))
+    first_chunks = _chunk_objects(fake_uplink)
+    await client.async_upload_backup(_open_stream(changed), _backup("second", changed))
+    fake_uplink.put(f"{CHUNKS}left-by-a-failed-upload", b"orphan")
+
+    await client.async_delete_backup("first")
+    remaining = _chunk_objects(fake_uplink)
+    assert f"{CHUNKS}left-by-a-failed-upload" not in remaining
+    assert 0 < len(first_chunks - remaining) <= 2
+    stream = await client.async_download_backup("second")
+    assert await _read_all(stream) == changed
+
+    # A client without the manifests indexed reads them from the bucket.
+    await client.async_upload_backup(_open_stream(content), _backup("first", content))
+    other_index = ChunkIndex(hass, "other")
+    await _dedup_client(other_index).async_delete_backup("first")
+    stream = await client.async_download_backup("second")
+    assert await _read_all(stream) == changed
+
+    await client.async_delete_backup("second")
+    assert fake_uplink.objects == {}
+
+
+async def test_delete_skips_collection_on_error(
+    fake_uplink: FakeUplink, chunk_index: ChunkIndex
+) -> None:
+    """Test chunks are kept when the manifests can't all be read."""
+
+    client = _dedup_client(chunk_index)
+    for backup_id in ("first", "second"):
+        await client.async_upload_backup(
+            _open_stream(TEST_CONTENT), _backup(backup_id, TEST_CONTENT)
+        )
+    chunks = _chunk_objects(fake_uplink)
+
+    fake_uplink.fail = lambda args: args[1] == "ls" and args[2].endswith("/chunks/")
+    await client.async_delete_backup("second")
+    assert _chunk_objects(fake_uplink) == chunks
+
+    fake_uplink.fail = lambda args: args[1] == "rm" and "/chunks/" in args[-1]
+    await client.async_delete_backup("first")
+    assert _chunk_objects(fake_uplink) == chunks
+
+
+async def test_checksum(
+    fake_uplink: FakeUplink,
+    resumable_client: StorjClient,
+    chunk_index: ChunkIndex,
+) -> None:
+    """Test the checksum is stored where the metadata is written last."""
+
+    expected = hashlib.sha256(TEST_CONTENT).hexdigest()
+    await resumable_client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    assert fake_uplink.objects[MANIFEST][1]["storj_sha256"] == expected
+
+    content = random.Random(0).randbytes(4096)
+    await _dedup_client(chunk_index).async_upload_backup(
+        _open_stream(content), _backup("dedup", content)
+    )
+    manifest = "ha-backups/backups/dedup_2025-01-01_01.23_45678000.tar.chunks"
+    assert (
+        fake_uplink.objects[manifest][1]["storj_sha256"]
+        == hashlib.sha256(content).hexdigest()
+    )
+
+    # The uplink CLI sends the metadata of a single object before its data.
+    fake_uplink.objects.clear()
+    await StorjClient("ha-id", "ha-backups").async_upload_backup(
+        _open_stream(TEST_CONTENT), TEST_BACKUP
+    )
+    data, metadata = fake_uplink.objects[
+        "ha-backups/backups/Test_2025-01-01_01.23_45678000.tar"
+    ]
+    assert "storj_sha256" not in metadata
+
+
+async def test_checksum_replaced_after_upload(
+    hass: HomeAssistant, fake_s3: FakeS3, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test the checksum of a multipart upload is stored once the data is."""
+
+    transport = S3Transport(
+        async_get_clientsession(hass),
+        fake_s3.endpoint,
+        fake_s3.access_key_id,
+        fake_s3.secret_access_key,
+        "ha-backups",
+        part_size=4,
+    )
+    await StorjClient("ha-id", "ha-backups", transport=transport).async_upload_backup(
+        _open_stream(TEST_CONTENT), TEST_BACKUP
+    )
+    metadata = await transport.async_get_metadata(
+        "backups/Test_2025-01-01_01.23_45678000.tar"
+    )
+    assert metadata["storj_sha256"] == hashlib.sha256(TEST_CONTENT).hexdigest()
+
+    # The backup is kept without a checksum if the metadata can't be replaced.
+    fake_s3.objects.clear()
+    fake_s3.fail = lambda request: "x-amz-copy-source" in request.headers
+    client = StorjClient("ha-id", "ha-backups", transport=transport)
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    assert "Unable to store the checksum" in caplog.text
+    metadata = await transport.async_get_metadata(
+        "backups/Test_2025-01-01_01.23_45678000.tar"
+    )
+    assert "storj_sha256" not in metadata
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    assert await _read_all(stream) == TEST_CONTENT
+
+
+async def test_checksum_in_single_part_upload(
+    hass: HomeAssistant, fake_s3: FakeS3, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test a backup uploaded in one part isn't copied to store its checksum."""
+
+    transport = S3Transport(
+        async_get_clientsession(hass),
+        fake_s3.endpoint,
+        fake_s3.access_key_id,
+        fake_s3.secret_access_key,
+        "ha-backups",
+    )
+    fake_s3.fail = lambda request: "x-amz-copy-source" in request.headers
+    await StorjClient("ha-id", "ha-backups", transport=transport).async_upload_backup(
+        _open_stream(TEST_CONTENT), TEST_BACKUP
+    )
+
+    assert "Unable to store the checksum" not in caplog.text
+    metadata = await transport.async_get_metadata(
+        "backups/Test_2025-01-01_01.23_45678000.tar"
+    )
+    assert metadata["storj_sha256"] == hashlib.sha256(TEST_CONTENT).hexdigest()
+
+
+async def test_checksum_written_last(
+    hass: HomeAssistant, fake_libuplink: FakeLibUplink
+) -> None:
+    """Test libuplink stores the checksum with the rest of the metadata."""
+
+    transport = LibUplinkTransport(hass, TEST_ACCESS_GRANT, "ha-backups")
+    await StorjClient("ha-id", "ha-backups", transport=transport).async_upload_backup(
+        _open_stream(TEST_CONTENT), TEST_BACKUP
+    )
+    metadata = await transport.async_get_metadata(
+        "backups/Test_2025-01-01_01.23_45678000.tar"
+    )
+    assert metadata["storj_sha256"] == hashlib.sha256(TEST_CONTENT).hexdigest()
+
+
+@pytest.mark.parametrize("compression_level", [0, 3], ids=["raw", "zstd"])
+async def test_download_verifies_checksum(
+    fake_uplink: FakeUplink,
+    checkpoints: UploadCheckpoints,
+    compression_level: int,
+) -> None:
+    """Test a full download that doesn't match the checksum fails at the end."""
+
+    client = StorjClient(
+        "ha-id",
+        "ha-backups",
+        checkpoints=checkpoints,
+        resumable_uploads=True,
+        compression_level=compression_level,
+    )
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    assert await _read_all(stream) == TEST_CONTENT
+
+    data, metadata = fake_uplink.objects[MANIFEST]
+    fake_uplink.put(MANIFEST, data, {**metadata, "storj_sha256": "0" * 64})
+    client = StorjClient("ha-id", "ha-backups")
+
+    # A range can't be checked and is returned as is.
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id, 2, 3)
+    assert await _read_all(stream) == b"234"
+
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    chunks = []
+    with pytest.raises(BackupAgentError, match="doesn't match its checksum"):
+        async for chunk in stream:
+            chunks.append(chunk)
+    assert b"".join(chunks) == TEST_CONTENT
+
+
+def _dated_backup(date: str, size: int = 10) -> AgentBackup:
+    return AgentBackup.from_dict(
+        {**TEST_BACKUP.as_dict(), "backup_id": date, "date": date, "size": size}
+    )
+
+
+# A backup every evening of January and the first half of February, and
+# an earlier one on the last day.
+DATED_BACKUPS = [
+    _dated_backup(f"2025-{month:02d}-{day:02d}T20:00:00+00:00")
+    for month, days in ((1, 31), (2, 15))
+    for day in range(1, days + 1)
+] + [_dated_backup("2025-02-15T18:00:00+00:00")]
+
+
+@pytest.mark.parametrize(
+    ("policy", "kept"),
+    [
+        (RetentionPolicy(), {backup.backup_id for backup in DATED_BACKUPS}),
+        (
+            RetentionPolicy(keep_last=2),
+            {"2025-02-15T20:00:00+00:00", "2025-02-15T18:00:00+00:00"},
+        ),
+        (
+            RetentionPolicy(keep_daily=2),
+            {"2025-02-15T20:00:00+00:00", "2025-02-14T20:00:00+00:00"},
+        ),
+        (
+            RetentionPolicy(keep_weekly=3),
+            {
+                "2025-02-15T20:00:00+00:00",
+                "2025-02-09T20:00:00+00:00",
+                "2025-02-02T20:00:00+00:00",
+            },
+        ),
+        (
+            RetentionPolicy(keep_monthly=6),
+            {"2025-02-15T20:00:00+00:00", "2025-01-31T20:00:00+00:00"},
+        ),
+        (
+            RetentionPolicy(keep_daily=1, keep_monthly=2),
+            {"2025-02-15T20:00:00+00:00", "2025-01-31T20:00:00+00:00"},
+        ),
+        (
+            RetentionPolicy(keep_daily=7, max_bytes=25),
+            {"2025-02-15T20:00:00+00:00", "2025-02-14T20:00:00+00:00"},
+        ),
+        (RetentionPolicy(max_bytes=5), {"2025-02-15T20:00:00+00:00"}),
+    ],
+)
+def test_select_backups_to_prune(policy: RetentionPolicy, kept: set[str]) -> None:
+    """Test the backups a retention policy doesn't keep."""
+
+    pruned = select_backups_to_prune(list(reversed(DATED_BACKUPS)), policy)
+
+    assert {backup.backup_id for backup in pruned} == {
+        backup.backup_id for backup in DATED_BACKUPS
+    } - kept
+    assert pruned == sorted(pruned, key=lambda backup: backup.date)
+
+
+async def test_prune(
+    fake_uplink: FakeUplink, checkpoints: UploadCheckpoints, chunk_index: ChunkIndex
+) -> None:
+    """Test pruning deletes every kind of backup from one listing."""
+
+    backups = [
+        _dated_backup(f"2025-01-0{day}T12:00:00+00:00", len(TEST_CONTENT))
+        for day in range(1, 6)
+    ]
+    plain = StorjClient("ha-id", "ha-backups", use_index=True)
+    await plain.async_upload_backup(_open_stream(TEST_CONTENT), backups[0])
+    await StorjClient(
+        "ha-id",
+        "ha-backups",
+        checkpoints=checkpoints,
+        resumable_uploads=True,
+        part_size=4,
+    ).async_upload_backup(_open_stream(TEST_CONTENT), backups[1])
+    client = _dedup_client(chunk_index, use_index=True)
+    for backup in backups[2:]:
+        await client.async_upload_backup(_open_stream(TEST_CONTENT), backup)
+    await client.async_list_backups()
+    fake_uplink.fail = lambda args: args[1] == "rm" and "01-04" in args[-1]
+    fake_uplink.calls.clear()
+
+    report = await client.async_prune(RetentionPolicy(keep_last=1))
+
+    assert report.deleted == backups[:3]
+    assert report.failed == [backups[3]]
+    assert report.bytes_reclaimed == 3 * len(TEST_CONTENT)
+    assert report.duration >= 0
+    # One listing picks the backups; chunk collection lists the bucket again.
+    commands = [call[1] for call in fake_uplink.calls]
+    assert commands[: commands.index("rm")].count("ls") == 1
+    assert (
+        await StorjClient("ha-id", "ha-backups", use_index=True).async_list_backups()
+        == backups[3:]
+    )
+    assert not [path for path in fake_uplink.objects if ".parts" in path]
+    stream = await client.async_download_backup(backups[4].backup_id)
+    assert await _read_all(stream) == TEST_CONTENT
+
+
+@pytest.fixture
+def sleeps() -> Generator[list[float]]:
+    """Record the throttle's sleeps on a clock that only they advance."""
+    clock = [0.0]
+    sleeps: list[float] = []
+
+    async def _sleep(delay: float) -> None:
+        sleeps.append(delay)
+        clock[0] += delay
+
+    with (
+        patch("custom_components.storj.throttle.monotonic", lambda: clock[0]),
+        patch("custom_components.storj.throttle.sleep", _sleep),
+    ):
+        yield sleeps
+
+
+@pytest.mark.parametrize(
+    ("start", "end", "hour", "limited"),
+    [
+        (None, None, 12, True),
+        (time(8), time(22), 12, True),
+        (time(8), time(22), 23, False),
+        (time(8), time(22), 7, False),
+        (time(22), time(6), 23, True),
+        (time(22), time(6), 3, True),
+        (time(22), time(6), 12, False),
+        (time(8), time(8), 3, True),
+    ],
+)
+def test_bandwidth_schedule(
+    start: time | None, end: time | None, hour: int, limited: bool
+) -> None:
+    """Test the limits only apply inside the scheduled window."""
+
+    schedule = BandwidthSchedule(upload=625_000, download=0, start=start, end=end)
+    now = dt_util.now().replace(hour=hour, minute=30)
+
+    assert schedule.limit(UPLOAD, now) == (625_000 if limited else 0)
+    assert schedule.limit(DOWNLOAD, now) == 0
+    assert format_rate(625_000) == "5 Mbit/s"
+    assert format_rate(0) == "unlimited"
+
+
+async def test_token_bucket(sleeps: list[float]) -> None:
+    """Test the bucket allows a second of burst and then holds to its rate."""
+
+    bucket = TokenBucket(100)
+    await bucket.async_consume(100)
+    assert sleeps == []
+
+    await bucket.async_consume(50)
+    assert sleeps == [0.5]
+
+    # A chunk larger than the bucket goes through in one piece.
+    await bucket.async_consume(300)
+    assert sleeps == [0.5, 3.0]
+
+    bucket.set_rate(10)
+    await bucket.async_consume(5)
+    assert sleeps == [0.5, 3.0, 0.5]
+
+
+async def test_throttled_transfers(
+    fake_uplink: FakeUplink, sleeps: list[float], caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test uploads and downloads each keep to their own limit."""
+
+    client = StorjClient(
+        "ha-id",
+        "ha-backups",
+        throttle=BandwidthThrottle(BandwidthSchedule(upload=4, download=2)),
+    )
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    assert sum(sleeps) == pytest.approx((len(TEST_CONTENT) - 4) / 4)
+    assert "upload bandwidth limit is now 3.2e-05 Mbit/s" in caplog.text
+
+    sleeps.clear()
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    assert await _read_all(stream) == TEST_CONTENT
+    assert sum(sleeps) == pytest.approx((len(TEST_CONTENT) - 2) / 2)
+
+
+async def test_download_resumes_after_interruption(
+    fake_uplink: FakeUplink, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test an interrupted download continues from the last byte delivered."""
+
+    monkeypatch.setattr("custom_components.storj.api.DOWNLOAD_RETRY_DELAY", 0)
+    client = StorjClient("ha-id", "ha-backups")
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+
+    fake_uplink.calls.clear()
+    fake_uplink.break_after = 6
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    assert await _read_all(stream) == TEST_CONTENT
+    assert [call[4:] for call in fake_uplink.calls] == [(), ("--range", "bytes=6-")]
+
+
+async def test_download_gives_up(
+    fake_uplink: FakeUplink, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a download fails once retries without progress are used up."""
+
+    monkeypatch.setattr("custom_components.storj.api.DOWNLOAD_RETRY_DELAY", 0)
+    client = StorjClient("ha-id", "ha-backups")
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+
+    fake_uplink.fail = lambda args: args[1] == "cp"
+    stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+    with pytest.raises(UplinkError):
+        await _read_all(stream)
+    assert len([call for call in fake_uplink.calls if call[1] == "cp"]) == 5
+
+
+async def test_read_backup_header(fake_uplink: FakeUplink) -> None:
+    """Test reading backup.json from the start of a backup without the rest."""
+
+    backup_json = json.dumps({"slug": TEST_BACKUP.backup_id}).encode()
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        for name, data in (
+            ("./backup.json", backup_json),
+            ("./homeassistant.tar.gz", os.urandom(256 * 1024)),
+        ):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    client = StorjClient("ha-id", "ha-backups")
+    await client.async_upload_backup(
+        _open_stream(archive.getvalue(), 4096), TEST_BACKUP
+    )
+
+    header = await client.async_read_backup_header(TEST_BACKUP.backup_id)
+    assert len(header) == 64 * 1024
+    with tarfile.open(fileobj=io.BytesIO(header), mode="r|") as tar:
+        member = tar.next()
+        assert member.name == "./backup.json"
+        assert tar.extractfile(member).read() == backup_json
+
+
+@pytest.mark.usefixtures("fake_uplink")
+@pytest.mark.parametrize("use_index", [False, True])
+async def test_timing_spans(caplog: pytest.LogCaptureFixture, use_index: bool) -> None:
+    """Test the phases of uploads and listings are traced when enabled."""
+    traces = TraceBuffer()
+    client = StorjClient(
+        "instance", "ha-backups", use_index=use_index, traces=traces, timing_spans=True
+    )
+
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    assert await client.async_list_backups() == [TEST_BACKUP]
+
+    spans = [trace["operation"] for trace in traces.diagnostics()]
+    assert spans == [
+        "upload_backup.encode",
+        "upload_backup.transfer",
+        *(["upload_backup.index"] if use_index else []),
+        "list_backups.list",
+        *(["list_backups.read_index"] if use_index else []),
+        "list_backups.metadata",
+        "list_backups.parse",
+        *(["list_backups.write_index"] if use_index else []),
+    ]
+    assert "Storj list_backups.parse took" in caplog.text
+
+
+@pytest.mark.usefixtures("fake_uplink")
+async def test_timing_spans_disabled() -> None:
+    """Test no spans are traced unless enabled."""
+    traces = TraceBuffer()
+    client = StorjClient("instance", "ha-backups", traces=traces)
+
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    await client.async_list_backups()
+
+    assert traces.diagnostics() == []
+
+
+@pytest.mark.usefixtures("fake_uplink")
+async def test_upload_metadata_encoding(fake_uplink: FakeUplink) -> None:
+    """Test a backup is stored as one encoded value plus its indexed fields."""
+    client = StorjClient("instance", "ha-backups")
+
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+
+    ((_, metadata),) = fake_uplink.objects.values()
+    assert set(metadata) == {
+        "storj_metadata",
+        "storj_backup",
+        "storj_backup_id",
+        "storj_date",
+        "storj_size",
+    }
+    assert metadata["storj_metadata"] == "2"
+    assert metadata["storj_backup_id"] == "test-backup"
+    assert metadata["storj_date"] == TEST_BACKUP.date
+    assert metadata["storj_size"] == "10"
+    assert decode_backup(metadata) == TEST_BACKUP
+
+
+@pytest.mark.parametrize(
+    ("metadata", "error"),
+    [
+        ({"storj_metadata": "3"}, "Unsupported backup metadata version 3"),
+        ({"storj_metadata": "2"}, "Unable to read backup metadata"),
+        (
+            {"storj_metadata": "2", "storj_backup": "not base64"},
+            "Unable to read backup metadata",
+        ),
+        (
+            {
+                "storj_metadata": "2",
+                "storj_backup": base64.b64encode(zlib.compress(b"{}")).decode(),
+            },
+            "Unable to read backup metadata",
+        ),
+    ],
+)
+def test_decode_invalid_metadata(metadata: dict[str, str], error: str) -> None:
+    """Test metadata that can't be decoded is an error, not a missing backup."""
+    with pytest.raises(UplinkError, match=error):
+        decode_backup(metadata)
+
+
+async def test_list_skips_unreadable_metadata(
+    hass: HomeAssistant, fake_uplink: FakeUplink, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test an object whose metadata can't be decoded is skipped, not fatal."""
+    cache = BackupMetadataCache(hass, "test")
+    client = StorjClient("instance", "ha-backups", cache=cache)
+    fake_uplink.put(
+        "ha-backups/backups/test-backup.tar", TEST_CONTENT, encode_backup(TEST_BACKUP)
+    )
+    fake_uplink.put(
+        "ha-backups/backups/newer.tar", b"x", {"storj_metadata": "3", "storj_x": "y"}
+    )
+
+    for _ in range(2):
+        assert await client.async_list_backups() == [TEST_BACKUP]
+    assert caplog.text.count("Skipping newer.tar in 'ha-backups'") == 1
+    assert "Unsupported backup metadata version 3" in caplog.text
+    assert cache.lookup("newer.tar", 1, "2025-02-09 20:02:19") is None
+
+
+@pytest.mark.parametrize("name", ["uplink", "libuplink", "s3"])
+async def test_list_skips_corrupt_packed_metadata(
+    hass: HomeAssistant,
+    fake_uplink: FakeUplink,
+    fake_libuplink: FakeLibUplink,
+    fake_s3: FakeS3,
+    caplog: pytest.LogCaptureFixture,
+    name: str,
+) -> None:
+    """Test an object whose packed metadata is corrupt doesn't fail the listing."""
+    fake: FakeUplink | FakeLibUplink | FakeS3 = fake_uplink
+    transport: StorjTransport = UplinkCliTransport("ha-backups")
+    if name == "libuplink":
+        fake = fake_libuplink
+        transport = LibUplinkTransport(hass, TEST_ACCESS_GRANT, "ha-backups")
+    elif name == "s3":
+        fake = fake_s3
+        transport = S3Transport(
+            async_get_clientsession(hass),
+            fake_s3.endpoint,
+            fake_s3.access_key_id,
+            fake_s3.secret_access_key,
+            "ha-backups",
+        )
+    client = StorjClient("instance", "ha-backups", transport=transport)
+    fake.put(
+        "ha-backups/backups/test-backup.tar", TEST_CONTENT, encode_backup(TEST_BACKUP)
+    )
+    fake.put("ha-backups/backups/corrupt.tar", b"x", {"ha-metadata": "not packed"})
+
+    assert await client.async_list_backups() == [TEST_BACKUP]
+    assert "Skipping corrupt.tar in 'ha-backups'" in caplog.text
+    assert "Unable to read packed metadata" in caplog.text
+
+
+async def test_cache_holds_bucket_larger_than_cap(
+    hass: HomeAssistant, fake_uplink: FakeUplink
+) -> None:
+    """Test a bucket with more backups than the cache cap is parsed only once."""
+    cache = BackupMetadataCache(hass, "test", max_entries=2)
+    client = StorjClient("instance", "ha-backups", cache=cache)
+    for index in range(3):
+        backup = _backup(f"backup-{index}", TEST_CONTENT)
+        fake_uplink.put(
+            f"ha-backups/backups/{backup.backup_id}.tar",
+            TEST_CONTENT,
+            encode_backup(backup),
+        )
+
+    assert len(await client.async_list_backups()) == 3
+    with patch(
+        "custom_components.storj.api.decode_backup", wraps=decode_backup
+    ) as decode:
+        assert len(await client.async_list_backups()) == 3
+    decode.assert_not_called()
+
+    # Entries for objects that are gone are still dropped.
+    del fake_uplink.objects["ha-backups/backups/backup-0.tar"]
+    assert len(await client.async_list_backups()) == 2
+    assert (
+        cache.lookup("backup-0.tar", len(TEST_CONTENT), "2025-02-09 20:02:19") is None
+    )
+
+
+async def test_cache_evicts_oldest_over_cap(hass: HomeAssistant) -> None:
+    """Test entries set beyond the cap evict the oldest, if the bucket is smaller."""
+    cache = BackupMetadataCache(hass, "test", max_entries=2)
+    cache.async_evict({"a.tar"})
+    cache.async_set("a.tar", None, 1, "2025-02-09 20:02:19")
+    cache.async_set("b.tar", None, 1, "2025-02-08 20:02:19")
+    cache.async_set("c.tar", None, 1)
+
+    assert cache.lookup("a.tar", 1, "2025-02-09 20:02:19")
+    assert cache.lookup("b.tar", 1, "2025-02-08 20:02:19") is None
+    assert cache.lookup("c.tar", 1, "2025-02-10 20:02:19")
+
+
+async def test_cache_loads_from_storage(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Test the cache reads back what it stored, including non-backups."""
+    hass_storage["storj.test.metadata"] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": "storj.test.metadata",
+        "data": {
+            "entries": {
+                "other.txt": {
+                    "size": 1,
+                    "created": "2025-02-09 20:02:19",
+                    "backup": None,
+                },
+                "test-backup.tar": {
+                    "size": 1,
+                    "created": "2025-02-09 20:02:19",
+                    "backup": TEST_BACKUP.as_dict(),
+                },
+            },
+            "metadata_version": 2,
+        },
+    }
+    cache = BackupMetadataCache(hass, "test")
+    await cache.async_load()
+
+    entry = cache.lookup("other.txt", 1, "2025-02-09 20:02:19")
+    assert entry
+    assert cache.backup_from_entry(entry) is None
+    assert cache.find_key(TEST_BACKUP.backup_id) == "test-backup.tar"
+    assert cache.find_key("other") is None
+    assert cache.metadata_migrated
+
+
+async def test_migrate_metadata(
+    hass: HomeAssistant, fake_libuplink: FakeLibUplink
+) -> None:
+    """Test flattened metadata is rewritten in place, however large the backup."""
+    cache = BackupMetadataCache(hass, "test")
+    transport = LibUplinkTransport(hass, TEST_ACCESS_GRANT, "ha-backups")
+    await transport.async_connect()
+    client = StorjClient("instance", "ha-backups", cache=cache, transport=transport)
+    small = _backup("small", b"0123")
+    large = _backup("large", TEST_CONTENT)
+    for backup, content in ((small, b"0123"), (large, TEST_CONTENT)):
+        fake_libuplink.put(
+            f"ha-backups/backups/{backup.backup_id}.tar",
+            content,
+            {**flatten(backup.as_dict()), "storj_sha256": "abc"},
+        )
+    fake_libuplink.put("ha-backups/backups/other.txt", b"x", {})
+
+    await client.async_migrate_metadata()
+
+    for backup_id, content in (("small", b"0123"), ("large", TEST_CONTENT)):
+        data, metadata = fake_libuplink.objects[f"ha-backups/backups/{backup_id}.tar"]
+        assert data == content
+        assert metadata["storj_metadata"] == "2"
+        assert metadata["storj_sha256"] == "abc"
+        assert "name" not in metadata
+    assert fake_libuplink.metadata_updates == 2
+    assert fake_libuplink.objects["ha-backups/backups/other.txt"][1] == {}
+    assert sorted(backup.backup_id for backup in await client.async_list_backups()) == [
+        "large",
+        "small",
+    ]
+    assert cache.metadata_migrated
+
+    await client.async_migrate_metadata()
+    assert fake_libuplink.metadata_updates == 2
+
+
+async def test_migrate_metadata_unsupported(
+    hass: HomeAssistant, fake_uplink: FakeUplink
+) -> None:
+    """Test transports that can't replace metadata in place leave it alone."""
+    cache = BackupMetadataCache(hass, "test")
+    client = StorjClient("instance", "ha-backups", cache=cache)
+    fake_uplink.put(
+        "ha-backups/backups/old.tar", b"0123", flatten(TEST_BACKUP.as_dict())
+    )
+
+    await client.async_migrate_metadata()
+
+    assert fake_uplink.calls == []
+    assert "name" in fake_uplink.objects["ha-backups/backups/old.tar"][1]
+    assert not cache.metadata_migrated
+    assert [backup.backup_id for backup in await client.async_list_backups()] == [
+        TEST_BACKUP.backup_id
+    ]
+
+
+async def test_migrate_metadata_failure(
+    hass: HomeAssistant,
+    fake_libuplink: FakeLibUplink,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Test a failed rewrite is logged and leaves the rest for the next run."""
+    cache = BackupMetadataCache(hass, "test")
+    transport = LibUplinkTransport(hass, TEST_ACCESS_GRANT, "ha-backups")
+    await transport.async_connect()
+    client = StorjClient("instance", "ha-backups", cache=cache, transport=transport)
+    fake_libuplink.put(
+        "ha-backups/backups/old.tar", TEST_CONTENT, flatten(TEST_BACKUP.as_dict())
+    )
+
+    with patch.object(
+        transport, "async_replace_metadata", side_effect=UplinkError("boom")
+    ):
+        await client.async_migrate_metadata()
+
+    assert "Unable to migrate the backup metadata" in caplog.text
+    assert "name" in fake_libuplink.objects["ha-backups/backups/old.tar"][1]
+    assert not cache.metadata_migrated
+
+
+async def test_migrate_metadata_after_setup(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    fake_libuplink: FakeLibUplink,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test the metadata is migrated in the background a while after setup."""
+    fake_libuplink.put(
+        "ha-backups/backups/old.tar", TEST_CONTENT, flatten(TEST_BACKUP.as_dict())
+    )
+    mock_config_entry.add_to_hass(hass)
+    hass.config_entries.async_update_entry(
+        mock_config_entry, options={CONF_TRANSPORT: TRANSPORT_LIBUPLINK}
+    )
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert "name" in fake_libuplink.objects["ha-backups/backups/old.tar"][1]
+
+    freezer.tick(timedelta(seconds=METADATA_MIGRATION_DELAY))
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    assert "storj_metadata" in fake_libuplink.objects["ha-backups/backups/old.tar"][1]
+
+
+async def test_migrate_metadata_not_scheduled(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    fake_uplink: FakeUplink,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test no migration is scheduled when the transport can't run one."""
+    mock_config_entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    with patch.object(
+        mock_config_entry.runtime_data, "async_migrate_metadata"
+    ) as migrate:
+        freezer.tick(timedelta(seconds=METADATA_MIGRATION_DELAY))
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+
+    migrate.assert_not_called()
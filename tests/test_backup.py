@@ -1,32 +1,38 @@
 """Test the Storj BackupAgent"""
 
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterator
+from datetime import timedelta
+from freezegun.api import FrozenDateTimeFactory
 from io import StringIO
 from homeassistant.core import HomeAssistant
 
-from typing import Any
-from pytest_homeassistant_custom_component.common import MockConfigEntry
+from typing import Any, Iterable
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
 from pytest_homeassistant_custom_component.typing import (
     ClientSessionGenerator,
     WebSocketGenerator,
 )
 from syrupy.assertion import SnapshotAssertion
-from syrupy.matchers import path_type
 from unittest.mock import Mock, patch
 from homeassistant.setup import async_setup_component
 from homeassistant.components.backup import (
     DOMAIN as BACKUP_DOMAIN,
     AddonInfo,
     AgentBackup,
+    BackupAgentError,
+    BackupNotFound,
 )
 from json_flatten import flatten
 import json
 
-from custom_components.storj.const import DOMAIN
+from custom_components.storj.backup import StorjBackupAgent
+from custom_components.storj.const import CONF_BUCKET_INDEX, DOMAIN
 from .conftest import mock_asyncio_subprocess_run, TEST_AGENT_ID
 import pytest
 
-
 TEST_AGENT_BACKUP = AgentBackup(
     addons=[AddonInfo(name="Test", slug="test", version="1.0.0")],
     backup_id="test-backup",
@@ -62,8 +68,13 @@ TEST_AGENT_BACKUP_RESULT = {
 async def setup_backup_integration(
     hass: HomeAssistant,
     mock_config_entry: MockConfigEntry,
+    freezer: FrozenDateTimeFactory,
 ) -> AsyncGenerator[None]:
-    """Set up Storj integration."""
+    """Set up Storj integration.
+
+    Time is frozen first, so starting it later doesn't jump past the
+    metadata migration scheduled at setup.
+    """
     with (
         patch("homeassistant.components.backup.is_hassio", return_value=False),
         patch("homeassistant.components.backup.store.STORE_DELAY_SAVE", 0),
@@ -107,16 +118,15 @@ async def test_agents_upload(
             data={"file": StringIO("test")},
         )
 
-        matcher = path_type(
-            mapping={"2": (str,)},
-            replacer=lambda data, _: data[data.find("backups") :],
-        )
-
         assert resp.status == 201
         assert f"Uploading backup: {TEST_AGENT_BACKUP.backup_id}" in caplog.text
+        assert "with parallelism 1 and maximum concurrent pieces default" in caplog.text
         assert f"Uploaded backup: {TEST_AGENT_BACKUP.backup_id}" in caplog.text
         subprocess_exec.assert_called_once()
-        assert snapshot(matcher=matcher) == subprocess_exec.mock_calls[0].args
+        assert snapshot == subprocess_exec.mock_calls[0].args
+        stdin = subprocess_exec.return_value.stdin
+        assert b"".join(call.args[0] for call in stdin.write.mock_calls) == b"test"
+        stdin.close.assert_called_once()
 
 
 async def test_agents_upload_fail(
@@ -158,6 +168,30 @@ async def test_agents_upload_fail(
         assert "Failed to upload backup: Unable to complete upload" in caplog.text
 
 
+async def test_agents_upload_uplink_exits_early(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+) -> None:
+    """Test the upload fails if uplink stops reading the stream."""
+
+    agent = StorjBackupAgent(hass, mock_config_entry)
+
+    async def open_stream() -> AsyncIterator[bytes]:
+        async def stream() -> AsyncIterator[bytes]:
+            yield b"test"
+
+        return stream()
+
+    with mock_asyncio_subprocess_run(responses=iter([b""])) as subprocess_exec:
+        subprocess_exec.return_value.stdin.drain.side_effect = BrokenPipeError
+        with pytest.raises(BackupAgentError, match="Unable to complete upload"):
+            await agent.async_upload_backup(
+                open_stream=open_stream, backup=TEST_AGENT_BACKUP
+            )
+
+        subprocess_exec.return_value._transport.kill.assert_called_once()
+
+
 async def test_agents_list_backups(
     hass: HomeAssistant,
     hass_ws_client: WebSocketGenerator,
@@ -187,6 +221,32 @@ async def test_agents_list_backups(
         assert [mock_call.args for mock_call in subprocess_exec.mock_calls] == snapshot
 
 
+async def test_agents_list_backups_inline_metadata(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+) -> None:
+    """Test metadata from the expanded listing needs no `meta get`."""
+
+    listing = {
+        "kind": "OBJ",
+        "created": "2025-02-09 20:02:19",
+        "size": 12,
+        "key": "backup.tar",
+        "metadata": flatten(TEST_AGENT_BACKUP.as_dict()),
+    }
+
+    with mock_asyncio_subprocess_run(
+        responses=iter([json.dumps(listing).encode()])
+    ) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+
+        assert response["success"]
+        assert response["result"]["backups"] == [TEST_AGENT_BACKUP_RESULT]
+        assert len(subprocess_exec.mock_calls) == 1
+
+
 async def test_agents_list_backups_fail(
     hass: HomeAssistant,
     hass_ws_client: WebSocketGenerator,
@@ -208,6 +268,539 @@ async def test_agents_list_backups_fail(
         assert subprocess_exec.called
 
 
+async def test_agents_fail_fast_when_unreachable(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+) -> None:
+    """Test the agent stops running uplink once Storj has failed repeatedly."""
+    client = await hass_ws_client(hass)
+
+    with mock_asyncio_subprocess_run(
+        responses=iter([b""] * 5), returncode=1
+    ) as subprocess_exec:
+        for _ in range(5):
+            await client.send_json_auto_id({"type": "backup/info"})
+            assert (await client.receive_json())["success"]
+        assert subprocess_exec.call_count == 5
+
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+        assert subprocess_exec.call_count == 5
+
+    assert response["result"]["agent_errors"] == {
+        TEST_AGENT_ID: "Failed to list backups: Unable to fetch backup data"
+    }
+
+
+@pytest.mark.parametrize(
+    ("metadata", "returncode"),
+    [
+        (b"", iter([0, 1])),
+        (b"not json", iter([0, 0])),
+    ],
+    ids=["missing", "unreadable"],
+)
+async def test_agents_list_backups_metadata_fail(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    metadata: bytes,
+    returncode: Iterable[int],
+) -> None:
+    """Test agent list backups fails when one object's metadata is bad."""
+
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}',
+            metadata,
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(responses=responses, returncode=returncode):
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+
+        assert response["success"]
+        assert response["result"]["backups"] == []
+        assert "backup.tar" in response["result"]["agent_errors"][TEST_AGENT_ID]
+
+
+async def test_agents_list_backups_keeps_order(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+) -> None:
+    """Test concurrent metadata fetches keep the listing order."""
+
+    backups = [
+        AgentBackup.from_dict({**TEST_AGENT_BACKUP.as_dict(), "backup_id": f"b{i}"})
+        for i in range(3)
+    ]
+    listing = b"\n".join(
+        json.dumps(
+            {
+                "kind": "OBJ",
+                "created": "2025-02-09 20:02:19",
+                "size": 12,
+                "key": f"{i}.tar",
+            }
+        ).encode()
+        for i in range(3)
+    )
+    responses = iter(
+        [listing]
+        + [json.dumps(flatten(backup.as_dict())).encode() for backup in backups]
+    )
+
+    with mock_asyncio_subprocess_run(responses=responses) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+
+        assert response["success"]
+        assert [backup["backup_id"] for backup in response["result"]["backups"]] == [
+            "b0",
+            "b1",
+            "b2",
+        ]
+        assert [call.args[3] for call in subprocess_exec.mock_calls[1:]] == [
+            f"sj://ha-backups/backups/{i}.tar" for i in range(3)
+        ]
+
+
+async def test_agents_list_backups_cached(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    hass_storage: dict[str, Any],
+    mock_config_entry: MockConfigEntry,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test metadata is only fetched for new or changed objects."""
+
+    listing = (
+        b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}'
+    )
+    changed_listing = (
+        b'{"kind":"OBJ","created":"2025-02-10 20:02:19","size":12,"key":"backup.tar"}'
+    )
+    flattened_metadata = json.dumps(flatten(TEST_AGENT_BACKUP.as_dict())).encode(
+        "utf-8"
+    )
+    responses = iter(
+        [
+            listing,
+            flattened_metadata,
+            listing,
+            changed_listing,
+            flattened_metadata,
+            b"",
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(responses=responses) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        for expected_calls, expected_backups in (
+            (2, [TEST_AGENT_BACKUP_RESULT]),
+            (3, [TEST_AGENT_BACKUP_RESULT]),
+            (5, [TEST_AGENT_BACKUP_RESULT]),
+            (6, []),
+        ):
+            await client.send_json_auto_id({"type": "backup/info"})
+            response = await client.receive_json()
+
+            assert response["success"]
+            assert response["result"]["backups"] == expected_backups
+            assert len(subprocess_exec.mock_calls) == expected_calls
+
+    freezer.tick(timedelta(seconds=30))
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+    assert hass_storage[f"{DOMAIN}.{mock_config_entry.entry_id}.metadata"]["data"] == {
+        "entries": {},
+        "metadata_version": None,
+    }
+
+
+async def test_agents_upload_populates_cache(
+    hass: HomeAssistant,
+    hass_client: ClientSessionGenerator,
+    hass_ws_client: WebSocketGenerator,
+    mock_config_entry: MockConfigEntry,
+) -> None:
+    """Test an uploaded backup is listed without fetching its metadata."""
+
+    client = await hass_client()
+
+    with (
+        patch(
+            "homeassistant.components.backup.manager.BackupManager.async_get_backup",
+            return_value=TEST_AGENT_BACKUP,
+        ),
+        patch(
+            "homeassistant.components.backup.manager.read_backup",
+            return_value=TEST_AGENT_BACKUP,
+        ),
+        patch("pathlib.Path.open") as mocked_open,
+        mock_asyncio_subprocess_run(responses=iter([b""])),
+    ):
+        mocked_open.return_value.read = Mock(side_effect=[b"test", b""])
+        resp = await client.post(
+            f"/api/backup/upload?agent_id={DOMAIN}.{mock_config_entry.unique_id}",
+            data={"file": StringIO("test")},
+        )
+        assert resp.status == 201
+
+    listing = json.dumps(
+        {
+            "kind": "OBJ",
+            "created": "2025-02-09 20:02:19",
+            "size": len(b"test"),
+            "key": "Test_2025-01-01_01.23_45678000.tar",
+        }
+    ).encode()
+
+    with mock_asyncio_subprocess_run(responses=iter([listing])) as subprocess_exec:
+        ws_client = await hass_ws_client(hass)
+        await ws_client.send_json_auto_id({"type": "backup/info"})
+        response = await ws_client.receive_json()
+
+        assert response["success"]
+        assert response["result"]["backups"] == [TEST_AGENT_BACKUP_RESULT]
+        subprocess_exec.assert_called_once()
+
+
+async def test_agents_get_and_delete_after_listing(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    snapshot: SnapshotAssertion,
+) -> None:
+    """Test get and delete go straight to the object once it has been listed."""
+
+    flattened_metadata = json.dumps(flatten(TEST_AGENT_BACKUP.as_dict())).encode(
+        "utf-8"
+    )
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}',
+            flattened_metadata,
+            flattened_metadata,
+            b"",
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(responses=responses) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+        assert response["success"]
+
+        await client.send_json_auto_id(
+            {"type": "backup/details", "backup_id": TEST_AGENT_BACKUP.backup_id}
+        )
+        response = await client.receive_json()
+        assert response["success"]
+        assert response["result"]["backup"] == TEST_AGENT_BACKUP_RESULT
+
+        await client.send_json_auto_id(
+            {"type": "backup/delete", "backup_id": TEST_AGENT_BACKUP.backup_id}
+        )
+        response = await client.receive_json()
+        assert response["success"]
+        assert response["result"] == {"agent_errors": {}}
+
+        assert [mock_call.args for mock_call in subprocess_exec.mock_calls] == snapshot
+
+
+async def test_agents_get_backup_gone(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+) -> None:
+    """Test a known backup that has disappeared falls back to a listing."""
+
+    flattened_metadata = json.dumps(flatten(TEST_AGENT_BACKUP.as_dict())).encode(
+        "utf-8"
+    )
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}',
+            flattened_metadata,
+            b"",
+            b"",
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(
+        responses=responses, returncode=iter([0, 0, 1, 0])
+    ) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+        assert response["success"]
+
+        await client.send_json_auto_id(
+            {"type": "backup/details", "backup_id": TEST_AGENT_BACKUP.backup_id}
+        )
+        response = await client.receive_json()
+        assert response["success"]
+        assert response["result"]["backup"] is None
+        assert len(subprocess_exec.mock_calls) == 4
+
+
+async def test_agents_download(
+    hass: HomeAssistant,
+    hass_client: ClientSessionGenerator,
+    mock_config_entry: MockConfigEntry,
+    snapshot: SnapshotAssertion,
+) -> None:
+    """Test agent download backup streams the object from uplink."""
+
+    flattened_metadata = json.dumps(flatten(TEST_AGENT_BACKUP.as_dict())).encode(
+        "utf-8"
+    )
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}',
+            flattened_metadata,
+        ]
+    )
+    content = b"backup data" * 200_000
+
+    client = await hass_client()
+    with mock_asyncio_subprocess_run(
+        responses=responses, stdout=content
+    ) as subprocess_exec:
+        resp = await client.get(
+            f"/api/backup/download/{TEST_AGENT_BACKUP.backup_id}?agent_id={DOMAIN}.{mock_config_entry.unique_id}"
+        )
+
+        assert resp.status == 200
+        assert await resp.content.read() == content
+        assert [mock_call.args for mock_call in subprocess_exec.mock_calls] == snapshot
+
+
+async def test_agents_download_fail(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a failed uplink download raises BackupAgentError."""
+
+    monkeypatch.setattr("custom_components.storj.api.DOWNLOAD_RETRY_DELAY", 0)
+    agent = StorjBackupAgent(hass, mock_config_entry)
+    flattened_metadata = json.dumps(flatten(TEST_AGENT_BACKUP.as_dict())).encode(
+        "utf-8"
+    )
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}',
+            flattened_metadata,
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(
+        responses=responses, returncode=iter([0, 0, 1, 1, 1, 1]), stdout=b"partial"
+    ):
+        stream = await agent.async_download_backup(TEST_AGENT_BACKUP.backup_id)
+        with pytest.raises(
+            BackupAgentError, match="Unable to download backups/backup.tar"
+        ):
+            async for _ in stream:
+                pass
+
+    with (
+        mock_asyncio_subprocess_run(responses=iter([b""])),
+        pytest.raises(BackupNotFound),
+    ):
+        await agent.async_download_backup("unknown")
+
+
+async def test_agents_download_cancelled(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+) -> None:
+    """Test closing the stream early kills uplink."""
+
+    agent = StorjBackupAgent(hass, mock_config_entry)
+    flattened_metadata = json.dumps(flatten(TEST_AGENT_BACKUP.as_dict())).encode(
+        "utf-8"
+    )
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}',
+            flattened_metadata,
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(
+        responses=responses, stdout=b"x" * (3 * 1024 * 1024)
+    ) as subprocess_exec:
+        stream = await agent.async_download_backup(TEST_AGENT_BACKUP.backup_id)
+        assert len(await anext(stream)) == 1024 * 1024
+        await stream.aclose()
+
+        subprocess_exec.return_value._transport.kill.assert_called_once()
+
+
+@pytest.fixture
+async def enable_bucket_index(
+    hass: HomeAssistant, mock_config_entry: MockConfigEntry
+) -> None:
+    """Enable the bucket index option."""
+    hass.config_entries.async_update_entry(
+        mock_config_entry, options={CONF_BUCKET_INDEX: True}
+    )
+    await hass.async_block_till_done()
+
+
+TEST_INDEX = {
+    "version": 1,
+    "backups": {
+        "backup.tar": {"size": 12, "backup": TEST_AGENT_BACKUP.as_dict()},
+        "other.txt": {"size": 3, "backup": None},
+    },
+}
+
+
+@pytest.mark.usefixtures("enable_bucket_index")
+async def test_agents_list_backups_from_index(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    snapshot: SnapshotAssertion,
+) -> None:
+    """Test listing reads the bucket index instead of each object's metadata."""
+
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}\n'
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":3,"key":"other.txt"}\n'
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":9,"key":".index.json"}',
+            json.dumps(TEST_INDEX).encode(),
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(responses=responses) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+
+        assert response["success"]
+        assert response["result"]["backups"] == [TEST_AGENT_BACKUP_RESULT]
+        assert [mock_call.args for mock_call in subprocess_exec.mock_calls] == snapshot
+
+
+@pytest.mark.usefixtures("enable_bucket_index")
+@pytest.mark.parametrize(
+    "index",
+    [b"", b"not json", json.dumps({"version": 1, "backups": {}}).encode()],
+    ids=["missing", "unreadable", "stale"],
+)
+async def test_agents_list_backups_rebuilds_index(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    index: bytes,
+) -> None:
+    """Test the bucket index is rebuilt from a full scan when it can't be used."""
+
+    flattened_metadata = json.dumps(flatten(TEST_AGENT_BACKUP.as_dict())).encode(
+        "utf-8"
+    )
+    responses = iter(
+        [
+            b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}\n'
+            b'{"kind":"PRE","key":"nested/"}',
+            index,
+            flattened_metadata,
+            b"",
+        ]
+    )
+
+    with mock_asyncio_subprocess_run(
+        responses=responses, returncode=iter([0, 0 if index else 1, 0, 0])
+    ) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id({"type": "backup/info"})
+        response = await client.receive_json()
+
+        assert response["success"]
+        assert response["result"]["backups"] == [TEST_AGENT_BACKUP_RESULT]
+        assert subprocess_exec.mock_calls[-1].args[1:] == (
+            "cp",
+            "-",
+            "sj://ha-backups/backups/.index.json",
+        )
+        written_index = subprocess_exec.return_value.communicate_input
+        assert json.loads(written_index) == {
+            "version": 1,
+            "backups": {
+                "backup.tar": {"size": 12, "backup": TEST_AGENT_BACKUP.as_dict()}
+            },
+        }
+
+
+@pytest.mark.usefixtures("enable_bucket_index")
+async def test_agents_upload_updates_index(
+    hass: HomeAssistant,
+    hass_client: ClientSessionGenerator,
+    mock_config_entry: MockConfigEntry,
+    snapshot: SnapshotAssertion,
+) -> None:
+    """Test an upload adds the backup to the bucket index."""
+
+    client = await hass_client()
+
+    with (
+        patch(
+            "homeassistant.components.backup.manager.BackupManager.async_get_backup",
+            return_value=TEST_AGENT_BACKUP,
+        ),
+        patch(
+            "homeassistant.components.backup.manager.read_backup",
+            return_value=TEST_AGENT_BACKUP,
+        ),
+        patch("pathlib.Path.open") as mocked_open,
+        mock_asyncio_subprocess_run(
+            responses=iter([json.dumps(TEST_INDEX).encode(), b""])
+        ) as subprocess_exec,
+    ):
+        mocked_open.return_value.read = Mock(side_effect=[b"test", b""])
+        resp = await client.post(
+            f"/api/backup/upload?agent_id={DOMAIN}.{mock_config_entry.unique_id}",
+            data={"file": StringIO("test")},
+        )
+        assert resp.status == 201
+
+        assert len(subprocess_exec.mock_calls) == 3
+        written_index = json.loads(subprocess_exec.return_value.communicate_input)
+        assert written_index["backups"]["Test_2025-01-01_01.23_45678000.tar"] == {
+            "size": len(b"test"),
+            "backup": TEST_AGENT_BACKUP.as_dict(),
+        }
+
+
+@pytest.mark.usefixtures("enable_bucket_index")
+async def test_agents_delete_updates_index(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+) -> None:
+    """Test a delete removes the backup from the bucket index."""
+
+    listing = b'{"kind":"OBJ","created":"2025-02-09 20:02:19","size":12,"key":"backup.tar"}\n{"kind":"OBJ","created":"2025-02-09 20:02:19","size":3,"key":"other.txt"}'
+    responses = iter([listing, json.dumps(TEST_INDEX).encode(), b"", b"", b""])
+
+    with mock_asyncio_subprocess_run(
+        responses=responses, returncode=iter([0, 0, 0, 1])
+    ) as subprocess_exec:
+        client = await hass_ws_client(hass)
+        await client.send_json_auto_id(
+            {"type": "backup/delete", "backup_id": TEST_AGENT_BACKUP.backup_id}
+        )
+        response = await client.receive_json()
+
+        assert response["success"]
+        assert response["result"] == {"agent_errors": {}}
+        # The index couldn't be read back, so it is left for the next listing.
+        assert len(subprocess_exec.mock_calls) == 4
+
+
 @pytest.mark.parametrize(
     ("backup_id", "expected_result"),
     [
@@ -299,7 +892,7 @@ async def test_agents_delete_fail(
     )
 
     with mock_asyncio_subprocess_run(
-        responses=responses, returncode=iter([0, 1])
+        responses=responses, returncode=iter([0, 0, 1])
     ) as subprocess_exec:
         client = await hass_ws_client(hass)
         await client.send_json_auto_id(
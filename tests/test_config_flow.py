@@ -2,9 +2,36 @@
 
 from unittest.mock import AsyncMock, patch
 
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
 from homeassistant import config_entries
 from custom_components.storj.config_flow import CannotConnect, InvalidAuth
-from custom_components.storj.const import DOMAIN, CONF_ACCESS_GRANT, CONF_BUCKET_NAME
+from custom_components.storj.const import (
+    DOMAIN,
+    CONF_ACCESS_GRANT,
+    CONF_BUCKET_INDEX,
+    CONF_BUCKET_NAME,
+    CONF_COMPRESSION,
+    CONF_COMPRESSION_LEVEL,
+    CONF_DEDUPLICATION,
+    CONF_DOWNLOAD_LIMIT,
+    CONF_HEDGED_READS,
+    CONF_MAX_CONCURRENT_PIECES,
+    CONF_METADATA_CONCURRENCY,
+    CONF_RESUMABLE_UPLOADS,
+    CONF_S3_ACCESS_KEY_ID,
+    CONF_S3_ENDPOINT,
+    CONF_S3_SECRET_ACCESS_KEY,
+    CONF_STALE_UPLOAD_HOURS,
+    CONF_TIMING_SPANS,
+    CONF_TRANSPORT,
+    CONF_UPLOAD_LIMIT,
+    CONF_UPLOAD_PARALLELISM,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_S3_ENDPOINT,
+    TRANSPORT_LIBUPLINK,
+    TRANSPORT_S3,
+)
 from homeassistant.core import HomeAssistant
 from homeassistant.data_entry_flow import FlowResultType
 
@@ -134,3 +161,124 @@ async def test_form_cannot_connect(
         CONF_BUCKET_NAME: "my-backups",
     }
     assert len(mock_setup_entry.mock_calls) == 1
+
+
+async def test_options_flow(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    mock_setup_entry: AsyncMock,
+) -> None:
+    """Test the options flow."""
+    mock_config_entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(mock_config_entry.entry_id)
+    assert result["type"] is FlowResultType.FORM
+    assert result["step_id"] == "init"
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {
+            CONF_METADATA_CONCURRENCY: 4,
+            CONF_BUCKET_INDEX: True,
+            CONF_UPLOAD_PARALLELISM: 0,
+            CONF_MAX_CONCURRENT_PIECES: 0,
+            CONF_RESUMABLE_UPLOADS: True,
+            CONF_STALE_UPLOAD_HOURS: 12,
+            CONF_TRANSPORT: TRANSPORT_LIBUPLINK,
+            CONF_DEDUPLICATION: True,
+        },
+    )
+
+    assert result["type"] is FlowResultType.CREATE_ENTRY
+    assert mock_config_entry.options == {
+        CONF_METADATA_CONCURRENCY: 4,
+        CONF_BUCKET_INDEX: True,
+        CONF_UPLOAD_PARALLELISM: 0,
+        CONF_MAX_CONCURRENT_PIECES: 0,
+        CONF_RESUMABLE_UPLOADS: True,
+        CONF_STALE_UPLOAD_HOURS: 12,
+        CONF_TRANSPORT: TRANSPORT_LIBUPLINK,
+        CONF_S3_ENDPOINT: DEFAULT_S3_ENDPOINT,
+        CONF_COMPRESSION: False,
+        CONF_COMPRESSION_LEVEL: DEFAULT_COMPRESSION_LEVEL,
+        CONF_DEDUPLICATION: True,
+        CONF_UPLOAD_LIMIT: 0,
+        CONF_DOWNLOAD_LIMIT: 0,
+        CONF_HEDGED_READS: False,
+        CONF_TIMING_SPANS: False,
+    }
+
+
+async def test_options_flow_s3_credentials(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    mock_setup_entry: AsyncMock,
+) -> None:
+    """Test the s3 transport requires S3 credentials."""
+    mock_config_entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(mock_config_entry.entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], {CONF_TRANSPORT: TRANSPORT_S3}
+    )
+
+    assert result["type"] is FlowResultType.FORM
+    assert result["errors"] == {"base": "s3_credentials_required"}
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {
+            CONF_TRANSPORT: TRANSPORT_S3,
+            CONF_S3_ACCESS_KEY_ID: "access",
+            CONF_S3_SECRET_ACCESS_KEY: "secret",
+        },
+    )
+
+    assert result["type"] is FlowResultType.CREATE_ENTRY
+    assert mock_config_entry.options[CONF_S3_ACCESS_KEY_ID] == "access"
+
+
+async def test_options_flow_keeps_s3_secret(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    mock_setup_entry: AsyncMock,
+) -> None:
+    """Test the stored S3 secret isn't shown again and is kept when left empty."""
+    mock_config_entry.add_to_hass(hass)
+    hass.config_entries.async_update_entry(
+        mock_config_entry,
+        options={
+            CONF_TRANSPORT: TRANSPORT_S3,
+            CONF_S3_ACCESS_KEY_ID: "access",
+            CONF_S3_SECRET_ACCESS_KEY: "secret",
+        },
+    )
+
+    result = await hass.config_entries.options.async_init(mock_config_entry.entry_id)
+    suggested = {
+        key.schema: key.description["suggested_value"]
+        for key in result["data_schema"].schema
+        if key.description and "suggested_value" in key.description
+    }
+    assert suggested[CONF_S3_ACCESS_KEY_ID] == "access"
+    assert CONF_S3_SECRET_ACCESS_KEY not in suggested
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {CONF_TRANSPORT: TRANSPORT_S3, CONF_S3_ACCESS_KEY_ID: "access"},
+    )
+
+    assert result["type"] is FlowResultType.CREATE_ENTRY
+    assert mock_config_entry.options[CONF_S3_SECRET_ACCESS_KEY] == "secret"
+
+    result = await hass.config_entries.options.async_init(mock_config_entry.entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {
+            CONF_TRANSPORT: TRANSPORT_S3,
+            CONF_S3_ACCESS_KEY_ID: "access",
+            CONF_S3_SECRET_ACCESS_KEY: "new-secret",
+        },
+    )
+
+    assert mock_config_entry.options[CONF_S3_SECRET_ACCESS_KEY] == "new-secret"
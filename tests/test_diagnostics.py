@@ -0,0 +1,102 @@
+"""Test the Storj diagnostics."""
+
+from freezegun.api import FrozenDateTimeFactory
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.storj.const import (
+    CONF_DOWNLOAD_LIMIT,
+    CONF_LIMIT_END,
+    CONF_LIMIT_START,
+    CONF_S3_ACCESS_KEY_ID,
+    CONF_S3_SECRET_ACCESS_KEY,
+    CONF_UPLOAD_LIMIT,
+)
+from custom_components.storj.diagnostics import async_get_config_entry_diagnostics
+
+from .conftest import TEST_ACCESS_GRANT, FakeUplink
+
+
+async def test_diagnostics(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test diagnostics redact credentials and report the bandwidth limits."""
+    await hass.config.async_set_time_zone("UTC")
+    freezer.move_to("2025-01-01 12:00:00+00:00")
+    mock_config_entry.add_to_hass(hass)
+    hass.config_entries.async_update_entry(
+        mock_config_entry,
+        options={
+            CONF_UPLOAD_LIMIT: 5,
+            CONF_DOWNLOAD_LIMIT: 0,
+            CONF_LIMIT_START: "08:00:00",
+            CONF_LIMIT_END: "22:00:00",
+            CONF_S3_ACCESS_KEY_ID: "s3-access-key",
+            CONF_S3_SECRET_ACCESS_KEY: "s3-secret-key",
+        },
+    )
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, mock_config_entry)
+
+    assert TEST_ACCESS_GRANT not in str(diagnostics)
+    assert "s3-access-key" not in str(diagnostics)
+    assert "s3-secret-key" not in str(diagnostics)
+    assert diagnostics["data"]["bucket_name"] == "ha-backups"
+    assert diagnostics["bandwidth"] == {
+        "upload_limit": "5 Mbit/s",
+        "download_limit": "unlimited",
+        "schedule": {
+            "upload": "5 Mbit/s",
+            "download": "unlimited",
+            "start": "08:00:00",
+            "end": "22:00:00",
+        },
+    }
+
+    freezer.move_to("2025-01-01 23:00:00+00:00")
+    diagnostics = await async_get_config_entry_diagnostics(hass, mock_config_entry)
+    assert diagnostics["bandwidth"]["upload_limit"] == "unlimited"
+
+
+async def test_diagnostics_without_limits(
+    hass: HomeAssistant, mock_config_entry: MockConfigEntry
+) -> None:
+    """Test diagnostics of an entry without bandwidth limits."""
+    mock_config_entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, mock_config_entry)
+
+    assert mock_config_entry.runtime_data.throttle is None
+    assert diagnostics["bandwidth"]["upload_limit"] == "unlimited"
+    assert set(diagnostics["scheduler"]) == {"interactive", "transfer"}
+    assert diagnostics["scheduler"]["transfer"]["queued"] == 0
+    assert diagnostics["deadlines"] == {}
+    assert diagnostics["circuit_breaker"]["state"] == "closed"
+
+
+async def test_diagnostics_traces(
+    hass: HomeAssistant, mock_config_entry: MockConfigEntry, fake_uplink: FakeUplink
+) -> None:
+    """Test diagnostics include the traced operations but not the access grant."""
+    mock_config_entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+    client = mock_config_entry.runtime_data
+    assert await client.authenticate(TEST_ACCESS_GRANT)
+    assert await client.async_list_backups() == []
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, mock_config_entry)
+
+    assert TEST_ACCESS_GRANT not in str(diagnostics)
+    assert [(trace["operation"], trace["key"]) for trace in diagnostics["traces"]] == [
+        ("authenticate", None),
+        ("list", "backups/"),
+    ]
+    assert diagnostics["deadlines"]["list"]["samples"] == 1
+    assert diagnostics["deadlines"]["list"]["deadline"] == 120
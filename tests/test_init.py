@@ -12,3 +12,35 @@
 # )
 # from homeassistant.exceptions import ConfigEntryNotReady
 # from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.storj.const import DOMAIN
+
+from .conftest import FakeUplink
+
+
+async def test_remove_entry(
+    hass: HomeAssistant,
+    mock_config_entry: MockConfigEntry,
+    fake_uplink: FakeUplink,
+    hass_storage: dict[str, Any],
+) -> None:
+    """Test removing an entry removes the data it stored."""
+    keys = [
+        f"{DOMAIN}.{mock_config_entry.entry_id}.{name}"
+        for name in ("metadata", "uploads", "chunks")
+    ]
+    for key in keys:
+        hass_storage[key] = {"version": 1, "minor_version": 1, "key": key, "data": {}}
+    mock_config_entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    await hass.config_entries.async_remove(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert not any(key in hass_storage for key in keys)
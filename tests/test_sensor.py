@@ -0,0 +1,102 @@
+"""Test the Storj sensors."""
+
+from unittest.mock import Mock, patch
+
+from homeassistant.core import HomeAssistant
+from homeassistant.const import STATE_UNKNOWN
+from homeassistant.helpers import entity_registry as er
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+import pytest
+
+from custom_components.storj.api import UplinkError
+
+from .conftest import FakeUplink
+from .test_api import TEST_BACKUP, TEST_CONTENT, _open_stream, _read_all
+
+
+def _state(hass: HomeAssistant, entry: MockConfigEntry, key: str) -> str:
+    entity_id = er.async_get(hass).async_get_entity_id(
+        "sensor", "storj", f"{entry.entry_id}_{key}"
+    )
+    assert entity_id
+    return hass.states.get(entity_id).state
+
+
+def _clock(*readings: float):
+    """Patch the client's clock to return readings, in order."""
+    return patch(
+        "custom_components.storj.api.time", Mock(monotonic=Mock(side_effect=readings))
+    )
+
+
+async def test_sensors(
+    hass: HomeAssistant, mock_config_entry: MockConfigEntry, fake_uplink: FakeUplink
+) -> None:
+    """Test the sensors follow the client's transfers and listings."""
+    mock_config_entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+    client = mock_config_entry.runtime_data
+
+    assert _state(hass, mock_config_entry, "backups") == STATE_UNKNOWN
+    assert _state(hass, mock_config_entry, "upload_throughput") == STATE_UNKNOWN
+    assert _state(hass, mock_config_entry, "list_errors") == "0"
+
+    with _clock(10.0, 10.25):
+        assert await client.async_list_backups() == []
+    assert float(_state(hass, mock_config_entry, "list_latency")) == 250
+    assert _state(hass, mock_config_entry, "backups") == "0"
+
+    with _clock(0.0, 2.0):
+        await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    assert float(_state(hass, mock_config_entry, "upload_duration")) == 2
+    # 5 bytes per second, in Mbit/s.
+    assert float(_state(hass, mock_config_entry, "upload_throughput")) == pytest.approx(
+        0.00004
+    )
+    assert _state(hass, mock_config_entry, "backups") == "1"
+    assert float(_state(hass, mock_config_entry, "backups_size")) == pytest.approx(
+        10 / 1024**3
+    )
+
+    with _clock(0.0, 4.0):
+        stream = await client.async_download_backup(TEST_BACKUP.backup_id)
+        assert await _read_all(stream) == TEST_CONTENT
+    assert float(_state(hass, mock_config_entry, "download_duration")) == 4
+    assert _state(hass, mock_config_entry, "download_errors") == "0"
+
+    fake_uplink.fail = lambda args: args[1] == "ls"
+    with pytest.raises(UplinkError):
+        await client.async_list_backups()
+    assert _state(hass, mock_config_entry, "list_errors") == "1"
+
+    fake_uplink.fail = lambda args: False
+    await client.async_delete_backup(TEST_BACKUP.backup_id)
+    assert _state(hass, mock_config_entry, "backups") == "0"
+    assert _state(hass, mock_config_entry, "delete_errors") == "0"
+
+
+async def test_sensors_count_transfer_errors(
+    hass: HomeAssistant, mock_config_entry: MockConfigEntry, fake_uplink: FakeUplink
+) -> None:
+    """Test failed uploads and downloads are counted and leave the last figures."""
+    mock_config_entry.add_to_hass(hass)
+    await hass.config_entries.async_setup(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+    client = mock_config_entry.runtime_data
+    await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    duration = _state(hass, mock_config_entry, "upload_duration")
+
+    fake_uplink.fail = lambda args: args[1] == "cp"
+    with pytest.raises(UplinkError):
+        await client.async_upload_backup(_open_stream(TEST_CONTENT), TEST_BACKUP)
+    with (
+        patch("custom_components.storj.api.DOWNLOAD_RETRY_DELAY", 0),
+        pytest.raises(UplinkError),
+    ):
+        await _read_all(await client.async_download_backup(TEST_BACKUP.backup_id))
+
+    assert _state(hass, mock_config_entry, "upload_errors") == "1"
+    assert _state(hass, mock_config_entry, "download_errors") == "1"
+    assert _state(hass, mock_config_entry, "upload_duration") == duration
+    assert _state(hass, mock_config_entry, "download_duration") == STATE_UNKNOWN